@@ -4,10 +4,22 @@ Property matching algorithm using weighted scoring system.
 This module implements the core business logic for matching properties
 with search requirements based on distance, budget, bedrooms, and bathrooms.
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 from dataclasses import dataclass
-from apiservices.core.RealState import MOCK_DATA
-from apiservices.core.RealState.utils import distance
+
+import numpy as np
+
+from apiservices.core.RealState.requirement import (
+    CompiledRequirement, RoomScore, compile_requirement
+)
+from apiservices.core.RealState.rescoring import ComponentVectors, vector_key
+from apiservices.core.RealState.shards import ShardedInventory
+from apiservices.core.RealState.sources import InventorySource
+from apiservices.core.RealState.store import PropertyStore
+from apiservices.core.RealState.utils import distance_from_vectors, unit_vector
+from apiservices.core.RealState.vectorized import (
+    ComponentScores, property_columns, score_columns, top_k
+)
 
 
 @dataclass
@@ -41,163 +53,116 @@ class MatchThresholds:
 WEIGHTS = MatchWeights()
 THRESHOLDS = MatchThresholds()
 
+Inventory = Union[PropertyStore, List[Dict], InventorySource, ShardedInventory]
+Requirement = Union[CompiledRequirement, Dict]
+
+_default_store: Optional[PropertyStore] = None
+
+
+def default_store() -> PropertyStore:
+    """
+    Inventory used when none is given: the mock listings, imported and
+    parsed on first use only.
+    """
+    global _default_store
+    if _default_store is None:
+        from apiservices.core.RealState import MOCK_DATA
+        _default_store = PropertyStore.from_records(MOCK_DATA.DATA)
+    return _default_store
+
 
 class PropertyMatcher:
     """Property matching service with improved algorithms and caching."""
     
-    def __init__(self, weights: MatchWeights = None, thresholds: MatchThresholds = None):
+    def __init__(self, weights: MatchWeights = None, thresholds: MatchThresholds = None,
+                 inventory: Inventory = None, vector_cache=None):
+        """
+        ``vector_cache`` (any object with ``get(key)``, ``set(key, value,
+        nbytes)`` and ``fits(nbytes)``, such as a ``LocalCache``) keeps the
+        component vectors of each requirement searched in a ``PropertyStore``,
+        so searching it again with other weights or match percentages skips
+        the scan. Stores whose vectors would not fit are searched without.
+        """
         self.weights = weights or WEIGHTS
         self.thresholds = thresholds or THRESHOLDS
+        # Searched when find_matches is given no inventory
+        self.inventory = inventory
+        self.vector_cache = vector_cache
+
+    def compile(self, requirement: Dict) -> CompiledRequirement:
+        """Normalize ``requirement`` once so every scoring path only does arithmetic."""
+        return compile_requirement(requirement, self.thresholds)
 
+    def _compiled(self, requirement: Requirement) -> CompiledRequirement:
+        if not isinstance(requirement, CompiledRequirement):
+            return self.compile(requirement)
+        if requirement.thresholds is not self.thresholds and \
+                requirement.thresholds != self.thresholds:
+            raise ValueError('Requirement was compiled with different thresholds')
+        return requirement
 
-    def calculate_distance_match(self, requirement: Dict, property_data: Dict) -> float:
+    def calculate_distance_match(self, requirement: Requirement, property_data: Dict) -> float:
         """Calculate distance match score between requirement and property."""
-        lat1 = requirement['lat']
-        lon1 = requirement['lon']
-        lat2 = property_data['lat']
-        lon2 = property_data['lon']
-        
-        distance_miles = distance(lat1, lon1, lat2, lon2)
-        
-        if distance_miles <= self.thresholds.distance_perfect:
-            return 100.0
-        elif distance_miles <= self.thresholds.distance_max:
-            # Linear interpolation between perfect and max distance
-            score_range = self.thresholds.max_match_percentage - self.thresholds.min_match_percentage
-            distance_range = self.thresholds.distance_max - self.thresholds.distance_perfect
-            score = self.thresholds.max_match_percentage - (
-                (distance_miles - self.thresholds.distance_perfect) / distance_range * score_range
-            )
-            return max(score, self.thresholds.min_match_percentage)
-        
-        return 0.0
+        compiled = self._compiled(requirement)
+        if compiled.lat is None:
+            return 0.0
 
+        try:
+            lat2 = float(property_data['lat'])
+            lon2 = float(property_data['lon'])
+        except (KeyError, ValueError, TypeError):
+            return 0.0
 
-    def calculate_budget_match(self, requirement: Dict, property_data: Dict) -> float:
+        distance_miles = distance_from_vectors(
+            compiled.x, compiled.y, compiled.z, *unit_vector(lat2, lon2)
+        )
+        return compiled.distance_score(distance_miles)
+
+
+    def calculate_budget_match(self, requirement: Requirement, property_data: Dict) -> float:
         """Calculate budget match score between requirement and property."""
-        budget_max = requirement.get('maxBudget')
-        budget_min = requirement.get('minBudget')
-        
-        if not budget_max and not budget_min:
+        compiled = self._compiled(requirement)
+        if compiled.budget is None:
             return 0.0
-            
-        # Handle cases where only one bound is provided
-        if not budget_max:
-            budget_max = budget_min
-        if not budget_min:
-            budget_min = budget_max
-            
+
         try:
-            budget_max = float(budget_max) if budget_max else 0
-            budget_min = float(budget_min) if budget_min else 0
             property_price = float(property_data['price'])
-        except (ValueError, TypeError):
+        except (KeyError, ValueError, TypeError):
             return 0.0
-            
-        avg_budget = (budget_max + budget_min) / 2.0
-        
-        # Perfect match range (within 10% of average)
-        perfect_range_min = budget_min - (avg_budget * self.thresholds.budget_perfect) / 100
-        perfect_range_max = budget_max + (avg_budget * self.thresholds.budget_perfect) / 100
-        perfect_range_min = max(perfect_range_min, 0)
-        
-        if perfect_range_min <= property_price <= perfect_range_max:
-            return 100.0
-            
-        # Acceptable range (within 25% of average)
-        acceptable_range_min = budget_min - (avg_budget * self.thresholds.budget_max) / 100
-        acceptable_range_max = budget_max + (avg_budget * self.thresholds.budget_max) / 100
-        acceptable_range_min = max(acceptable_range_min, 0)
-        
-        if property_price > perfect_range_max and property_price <= acceptable_range_max:
-            # Linear interpolation for higher prices
-            price_diff = property_price - perfect_range_max
-            max_diff = acceptable_range_max - perfect_range_max
-            score = 100 - (price_diff / max_diff) * (100 - self.thresholds.min_match_percentage)
-            return max(score, self.thresholds.min_match_percentage)
-            
-        elif property_price < perfect_range_min and property_price >= acceptable_range_min:
-            # Linear interpolation for lower prices
-            price_diff = perfect_range_min - property_price
-            max_diff = perfect_range_min - acceptable_range_min
-            score = 100 - (price_diff / max_diff) * (100 - self.thresholds.min_match_percentage)
-            return max(score, self.thresholds.min_match_percentage)
-            
-        return 0.0
-
-
-    def calculate_bedroom_match(self, requirement: Dict, property_data: Dict) -> float:
+
+        return compiled.budget.score(property_price)
+
+
+    def calculate_bedroom_match(self, requirement: Requirement, property_data: Dict) -> float:
         """Calculate bedroom match score between requirement and property."""
         return self._calculate_room_match(
-            requirement, property_data, 'Bedrooms', 'bedrooms'
+            self._compiled(requirement).bedrooms, property_data, 'bedrooms'
         )
 
 
-    def calculate_bathroom_match(self, requirement: Dict, property_data: Dict) -> float:
+    def calculate_bathroom_match(self, requirement: Requirement, property_data: Dict) -> float:
         """Calculate bathroom match score between requirement and property."""
         return self._calculate_room_match(
-            requirement, property_data, 'Bathrooms', 'bathrooms'
+            self._compiled(requirement).bathrooms, property_data, 'bathrooms'
         )
     
-    def _calculate_room_match(self, requirement: Dict, property_data: Dict, 
-                             room_type_cap: str, room_type_lower: str) -> float:
+    def _calculate_room_match(self, room_score: Optional[RoomScore], property_data: Dict,
+                              room_type_lower: str) -> float:
         """Generic room count matching logic for bedrooms and bathrooms."""
-        max_key = f'max{room_type_cap}'
-        min_key = f'min{room_type_cap}'
-        
-        room_max = requirement.get(max_key)
-        room_min = requirement.get(min_key)
-        
-        if not room_max and not room_min:
+        if room_score is None:
             return 0.0
-            
-        # Handle cases where only one bound is provided
-        if not room_max:
-            room_max = room_min
-        if not room_min:
-            room_min = room_max
-            
+
         try:
-            room_max = int(room_max)
-            room_min = int(room_min)
             property_rooms = int(property_data[room_type_lower])
-        except (ValueError, TypeError):
+        except (KeyError, ValueError, TypeError):
             return 0.0
-            
-        # Perfect match range
-        perfect_min = max(room_min - self.thresholds.rooms_perfect, 0)
-        perfect_max = room_max + self.thresholds.rooms_perfect
-        
-        if perfect_min <= property_rooms <= perfect_max:
-            return 100.0
-            
-        # Acceptable range
-        acceptable_min = max(room_min - self.thresholds.rooms_max, 0)
-        acceptable_max = room_max + self.thresholds.rooms_max
-        
-        if property_rooms > perfect_max and property_rooms <= acceptable_max:
-            # Linear interpolation for higher room counts
-            room_diff = property_rooms - perfect_max
-            max_diff = acceptable_max - perfect_max
-            if max_diff == 0:
-                return 100.0
-            score = 100 - (room_diff / max_diff) * (100 - self.thresholds.min_match_percentage)
-            return max(score, self.thresholds.min_match_percentage)
-            
-        elif property_rooms < perfect_min and property_rooms >= acceptable_min:
-            # Linear interpolation for lower room counts
-            room_diff = perfect_min - property_rooms
-            max_diff = perfect_min - acceptable_min
-            if max_diff == 0:
-                return 100.0
-            score = 100 - (room_diff / max_diff) * (100 - self.thresholds.min_match_percentage)
-            return max(score, self.thresholds.min_match_percentage)
-            
-        return 0.0
-
-
-    def calculate_overall_match(self, requirement: Dict, property_data: Dict) -> Dict:
+
+        return room_score.score(property_rooms)
+
+
+    def calculate_overall_match(self, requirement: Requirement, property_data: Dict) -> Dict:
         """Calculate overall match score and individual component scores."""
+        requirement = self._compiled(requirement)
         distance_score = self.calculate_distance_match(requirement, property_data)
         budget_score = self.calculate_budget_match(requirement, property_data)
         bedroom_score = self.calculate_bedroom_match(requirement, property_data)
@@ -218,42 +183,139 @@ class PropertyMatcher:
             'bathroom_score': round(bathroom_score, 2),
         }
     
-    def find_matches(self, requirement: Dict, property_list: List[Dict] = None, 
-                    limit: int = 10) -> List[Dict]:
-        """Find matching properties for a given requirement."""
+    def score_batch(self, requirement: Requirement, property_list: Inventory) -> ComponentScores:
+        """Score every property in ``property_list`` at once with array operations."""
+        if isinstance(property_list, PropertyStore):
+            return score_columns(
+                property_list.columns(), self._compiled(requirement), self.weights,
+                geo_index=property_list.geo_index()
+            )
+        return score_columns(
+            property_columns(property_list), self._compiled(requirement), self.weights
+        )
+
+    def find_matches(self, requirement: Requirement, property_list: Inventory = None, 
+                    limit: Optional[int] = 10, scan_limit: Optional[int] = None,
+                    prune: bool = False) -> List[Dict]:
+        """
+        Find the best ``limit`` matching properties for a given requirement.
+
+        ``limit`` caps the number of results, not the number of properties
+        looked at; pass None to get every match. ``scan_limit`` restricts the
+        search to the first properties of the inventory. With ``prune`` a
+        ``PropertyStore`` is searched through its partition index, skipping
+        partitions that cannot contain a result; the matches are the same.
+        An ``InventorySource`` is scored chunk by chunk, and a
+        ``ShardedInventory`` shard by shard (``scan_limit`` does not apply).
+        """
+        compiled = self._compiled(requirement)
         if property_list is None:
-            property_list = MOCK_DATA.DATA
-            
+            property_list = self.inventory if self.inventory is not None else default_store()
+        if isinstance(property_list, InventorySource):
+            return self._find_in_source(compiled, property_list, limit, scan_limit)
+        if isinstance(property_list, ShardedInventory):
+            if scan_limit:
+                raise ValueError('scan_limit does not apply to a sharded inventory')
+            shards, rows, scores = property_list.search(
+                compiled, self.weights, limit, self.thresholds.min_match_percentage
+            )
+            return self._build_matches(
+                property_list.records(shards, rows), np.arange(len(rows)), scores
+            )
+        if scan_limit and scan_limit < len(property_list):
+            if isinstance(property_list, PropertyStore):
+                property_list = property_list.take(slice(0, scan_limit))
+            else:
+                property_list = property_list[:scan_limit]
+        if not len(property_list):
+            return []
+
+        rows, scores = self.rank(compiled, property_list, limit, prune)
+        return self._build_matches(property_list, rows, scores)
+
+    def _find_in_source(self, compiled: CompiledRequirement, source: InventorySource,
+                        limit: Optional[int], scan_limit: Optional[int]) -> List[Dict]:
+        """``find_matches`` over a source, keeping only the best matches between chunks."""
         matches = []
-        processed_count = 0
-        
-        for property_data in property_list:
-            if limit and processed_count >= limit:
+        scanned = 0
+        for chunk in source.chunks():
+            if scan_limit and scanned + len(chunk) > scan_limit:
+                chunk = chunk.take(slice(0, scan_limit - scanned))
+            scanned += len(chunk)
+            if len(chunk):
+                rows, scores = self.rank(compiled, chunk, limit)
+                # Stable sort: on equal scores earlier chunks stay first
+                matches = sorted(
+                    matches + self._build_matches(chunk, rows, scores),
+                    key=lambda match: -match['match']
+                )[:limit or None]
+            if scan_limit and scanned >= scan_limit:
                 break
-                
-            match_result = self.calculate_overall_match(requirement, property_data)
-            
-            if match_result['overall_score'] >= self.thresholds.min_match_percentage:
-                property_match = property_data.copy()
-                property_match.update({
-                    'match': match_result['overall_score'],
-                    'distance_score': match_result['distance_score'],
-                    'budget_score': match_result['budget_score'],
-                    'bedroom_score': match_result['bedroom_score'],
-                    'bathroom_score': match_result['bathroom_score'],
-                })
-                matches.append(property_match)
-            
-            processed_count += 1
-            
-        # Sort by match score (descending)
-        matches.sort(key=lambda x: x['match'], reverse=True)
         return matches
 
+    def rank(self, requirement: Requirement, property_list: Inventory,
+             limit: Optional[int] = 10, prune: bool = False) -> Tuple[np.ndarray, ComponentScores]:
+        """
+        Rows of the best ``limit`` matches in ``property_list`` and their
+        scores, best first; ``find_matches`` without building result dicts.
+        """
+        compiled = self._compiled(requirement)
+        if self._keeps_vectors(property_list):
+            scores = self.component_vectors(compiled, property_list).scores(
+                self.weights, self.thresholds
+            )
+        elif prune and isinstance(property_list, PropertyStore):
+            return property_list.partitions().search(
+                compiled, self.weights, limit, self.thresholds.min_match_percentage
+            )
+        else:
+            scores = self.score_batch(compiled, property_list)
+        ranked = top_k(
+            np.round(scores.overall, 2), limit, self.thresholds.min_match_percentage
+        )
+        return ranked, scores.take(ranked)
 
-# Legacy function compatibility
-_default_matcher = PropertyMatcher()
+    def _keeps_vectors(self, property_list: Inventory) -> bool:
+        return (
+            self.vector_cache is not None and isinstance(property_list, PropertyStore) and
+            self.vector_cache.fits(ComponentVectors.estimate_nbytes(len(property_list)))
+        )
+
+    def component_vectors(self, requirement: Requirement,
+                          store: PropertyStore) -> ComponentVectors:
+        """Component vectors of ``requirement`` over ``store``, from ``vector_cache`` if there."""
+        compiled = self._compiled(requirement)
+        key = vector_key(store, compiled)
+        vectors = self.vector_cache.get(key) if self.vector_cache is not None else None
+        if vectors is None:
+            vectors = ComponentVectors.build(store, compiled)
+            if self.vector_cache is not None:
+                self.vector_cache.set(key, vectors, vectors.nbytes)
+        return vectors
 
+    @staticmethod
+    def _build_matches(property_list: Inventory, rows: np.ndarray,
+                       scores: ComponentScores) -> List[Dict]:
+        """Turn ranked rows and their scores into result dicts."""
+        matches = []
+        for i, row in enumerate(rows):
+            if isinstance(property_list, PropertyStore):
+                property_match = property_list.record(row)
+            else:
+                property_match = property_list[row].copy()
+            property_match.update({
+                'match': round(float(scores.overall[i]), 2),
+                'distance_score': round(float(scores.distance[i]), 2),
+                'budget_score': round(float(scores.budget[i]), 2),
+                'bedroom_score': round(float(scores.bedrooms[i]), 2),
+                'bathroom_score': round(float(scores.bathrooms[i]), 2),
+            })
+            matches.append(property_match)
+
+        return matches
+
+
+# Legacy function compatibility
 def getTopMatches(req_data):
     """Legacy function for backward compatibility."""
-    return _default_matcher.find_matches(req_data)
+    return PropertyMatcher().find_matches(req_data)
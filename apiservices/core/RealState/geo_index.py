@@ -0,0 +1,125 @@
+"""
+Fixed-size latitude/longitude grid index.
+
+The distance component is 0 beyond ``MatchThresholds.distance_max``, so
+only properties near the requirement need the haversine at all.
+``GeoIndex`` buckets points into a fixed grid of ``cell_degrees`` cells
+(stored CSR-style: rows sorted by cell plus one offset per cell) and
+``radius_search`` returns the rows of every cell that can hold a point
+within the radius, wrapping across the antimeridian and widening to
+every longitude when the circle contains a pole.
+"""
+from math import asin, ceil, cos, degrees, radians, sin
+from typing import List, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.utils import EARTH_DIAMETER_MILES
+
+EARTH_RADIUS_MILES = EARTH_DIAMETER_MILES / 2
+
+# Widen search boxes slightly so rounding never drops a boundary point
+_MARGIN = 1e-9
+
+
+def bounding_box(lat: float, lon: float, miles: float
+                 ) -> Tuple[float, float, List[Tuple[float, float]]]:
+    """
+    Latitude range and longitude ranges enclosing a circle of ``miles``.
+
+    Longitude ranges never cross the antimeridian; a circle crossing it is
+    split in two, and one containing a pole covers every longitude.
+    """
+    lon = (lon + 180.0) % 360.0 - 180.0
+    angle = miles / EARTH_RADIUS_MILES * (1 + _MARGIN) + _MARGIN
+    lat_min = lat - degrees(angle)
+    lat_max = lat + degrees(angle)
+
+    if lat_min <= -90.0 or lat_max >= 90.0 or angle >= radians(90.0):
+        return max(lat_min, -90.0), min(lat_max, 90.0), [(-180.0, 180.0)]
+
+    # Widest longitude offset reached by any point of the circle
+    lon_span = degrees(asin(min(sin(angle) / cos(radians(lat)), 1.0))) + _MARGIN
+    lon_min = lon - lon_span
+    lon_max = lon + lon_span
+
+    if lon_max - lon_min >= 360.0:
+        lon_ranges = [(-180.0, 180.0)]
+    elif lon_min < -180.0:
+        lon_ranges = [(lon_min + 360.0, 180.0), (-180.0, lon_max)]
+    elif lon_max > 180.0:
+        lon_ranges = [(lon_min, 180.0), (-180.0, lon_max - 360.0)]
+    else:
+        lon_ranges = [(lon_min, lon_max)]
+    return lat_min, lat_max, lon_ranges
+
+
+class GeoGrid:
+    """Fixed-size grid of ``cell_degrees`` x ``cell_degrees`` cells."""
+
+    def __init__(self, cell_degrees: float = 0.5):
+        self.cell_degrees = cell_degrees
+        self.n_lat = int(ceil(180.0 / cell_degrees))
+        self.n_lon = int(ceil(360.0 / cell_degrees))
+
+    def __len__(self) -> int:
+        return self.n_lat * self.n_lon
+
+    def lat_cell(self, lat):
+        """Row of the grid holding ``lat`` (clamped at the poles)."""
+        return np.clip(np.floor((np.asarray(lat) + 90.0) / self.cell_degrees),
+                       0, self.n_lat - 1).astype(np.int64)
+
+    def lon_cell(self, lon):
+        """Column of the grid holding ``lon`` (wrapped around the antimeridian)."""
+        return np.clip(np.floor(((np.asarray(lon) + 180.0) % 360.0) / self.cell_degrees),
+                       0, self.n_lon - 1).astype(np.int64)
+
+    def cell_of(self, lat, lon):
+        """Cell number of each point; scalars give a scalar."""
+        return self.lat_cell(lat) * self.n_lon + self.lon_cell(lon)
+
+
+class GeoIndex(GeoGrid):
+    """Rows of a set of points bucketed by grid cell."""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_degrees: float = 0.5):
+        super().__init__(cell_degrees)
+        cells = self.cell_of(lat, lon)
+        self.rows = np.argsort(cells, kind='stable')
+        self.offsets = np.concatenate([
+            [0], np.cumsum(np.bincount(cells, minlength=len(self)))
+        ]).astype(np.int64)
+
+    def radius_search(self, lat: float, lon: float, miles: float) -> np.ndarray:
+        """
+        Rows of every point that may lie within ``miles`` of ``(lat, lon)``.
+
+        The result is a superset: it holds whole cells, so callers still
+        compute the exact distance for the rows returned. Everything not
+        returned is guaranteed to be farther away than ``miles``.
+        """
+        lat_min, lat_max, lon_ranges = bounding_box(lat, lon, miles)
+        first_row, last_row = int(self.lat_cell(lat_min)), int(self.lat_cell(lat_max))
+
+        spans = []
+        for lon_min, lon_max in lon_ranges:
+            first_col = int(self.lon_cell(lon_min))
+            last_col = int(self.lon_cell(lon_max)) if lon_max < 180.0 else self.n_lon - 1
+            for grid_row in range(first_row, last_row + 1):
+                spans.append((int(self.offsets[grid_row * self.n_lon + first_col]),
+                              int(self.offsets[grid_row * self.n_lon + last_col + 1])))
+
+        # Two longitude ranges may share a cell: merge overlapping row spans
+        # so every row is returned once
+        chunks = []
+        end = 0
+        for span_start, span_end in sorted(spans):
+            span_start = max(span_start, end)
+            if span_start < span_end:
+                chunks.append(self.rows[span_start:span_end])
+                end = span_end
+
+        if not chunks:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(chunks))
@@ -0,0 +1,246 @@
+"""
+Exact branch-and-bound search over a partitioned inventory.
+
+A large distance does not rule a property out: one 500 miles away can
+still reach 70% on budget and rooms. Instead of filtering on a radius,
+``PartitionIndex`` groups the rows of a ``PropertyStore`` into partitions
+(geo cell x price band x bedroom bucket) and records the extent of every
+hot column inside each one. From those extents it derives, per
+partition, an upper bound on every component score and hence on the
+weighted score, and only scans partitions whose bound can still beat
+``min_match_percentage`` and the current k-th best result.
+
+Results are identical to a full scan: the bounds never underestimate,
+and partitions are only skipped when even their bound would be reported
+below the cut-off.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.geo_index import GeoGrid
+from apiservices.core.RealState.requirement import CompiledRequirement, RangeScore
+from apiservices.core.RealState.utils import EARTH_DIAMETER_MILES
+from apiservices.core.RealState.vectorized import (
+    SCORE_TOLERANCE, ComponentScores, score_columns
+)
+
+# Scores are compared after rounding to two decimals, so a raw bound this
+# far below the cut-off may still produce a reported score that reaches it.
+ROUNDING_SLACK = 0.005 + SCORE_TOLERANCE
+
+# Rows scored per vectorized batch while walking partitions
+BATCH_ROWS = 4096
+
+
+class ExtentBounds:
+    """
+    Upper bounds of the weighted score over groups of rows, from the extent
+    of each hot column inside every group.
+
+    Subclasses set ``lat_min`` ... ``bathrooms_max``: one entry per group.
+    """
+
+    def upper_bounds(self, requirement: CompiledRequirement, weights) -> np.ndarray:
+        """Upper bound of the weighted score of any row in each group."""
+        return (
+            self._distance_bounds(requirement) * weights.distance +
+            _range_bounds(requirement.budget, self.price_min, self.price_max) * weights.budget +
+            _range_bounds(requirement.bedrooms, self.bedrooms_min, self.bedrooms_max) *
+            weights.bedrooms +
+            _range_bounds(requirement.bathrooms, self.bathrooms_min, self.bathrooms_max) *
+            weights.bathrooms
+        )
+
+    def _distance_bounds(self, requirement: CompiledRequirement) -> np.ndarray:
+        if requirement.lat is None:
+            return np.zeros(self.lat_min.shape)
+
+        # Smallest latitude and (circular) longitude separation to each box
+        dlat = np.maximum.reduce([
+            self.lat_min - requirement.lat,
+            requirement.lat - self.lat_max,
+            np.zeros(self.lat_min.shape),
+        ])
+        to_min = np.abs(requirement.lon - self.lon_min) % 360.0
+        to_max = np.abs(requirement.lon - self.lon_max) % 360.0
+        dlon = np.minimum(
+            np.minimum(to_min, 360.0 - to_min), np.minimum(to_max, 360.0 - to_max)
+        )
+        inside = (self.lon_min <= requirement.lon) & (requirement.lon <= self.lon_max)
+        dlon = np.where(inside, 0.0, dlon)
+        cos_min = np.minimum(
+            np.cos(np.radians(self.lat_min)), np.cos(np.radians(self.lat_max))
+        )
+
+        # Haversine terms are monotonic in each separation, giving a lower
+        # bound on the distance to every point of the box.
+        a = np.sin(np.radians(dlat) / 2) ** 2 + \
+            requirement.cos_lat * np.maximum(cos_min, 0.0) * np.sin(np.radians(dlon) / 2) ** 2
+        miles = EARTH_DIAMETER_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        miles = np.maximum(miles * (1 - 1e-9) - 1e-9, 0.0)
+
+        scores = np.maximum(
+            requirement.distance_top -
+            (miles - requirement.distance_perfect) * requirement.distance_slope,
+            requirement.distance_floor
+        )
+        return np.where(
+            miles <= requirement.distance_perfect, 100.0,
+            np.where(miles <= requirement.distance_max, scores, 0.0)
+        )
+
+
+class PartitionIndex(ExtentBounds):
+    """Rows of a store grouped into partitions with per-partition column extents."""
+
+    def __init__(self, store, cell_degrees: float = 1.0, price_bands: int = 4,
+                 room_bucket_width: int = 2, max_room_bucket: int = 4):
+        self.store = store
+
+        cells = GeoGrid(cell_degrees).cell_of(store.lat, store.lon)
+
+        if len(store):
+            edges = np.quantile(store.price, np.linspace(0, 1, price_bands + 1)[1:-1])
+        else:
+            edges = np.empty(0)
+        bands = np.searchsorted(edges, store.price, side='right')
+        buckets = np.clip(store.bedrooms // room_bucket_width, 0, max_room_bucket)
+
+        # Group rows by partition; the stable sort keeps row order inside each one
+        self.rows = np.lexsort((buckets, bands, cells))
+        keys = np.stack([cells[self.rows], bands[self.rows], buckets[self.rows]])
+        changes = np.flatnonzero((keys[:, 1:] != keys[:, :-1]).any(axis=0)) + 1
+        self.starts = np.concatenate([[0], changes]).astype(np.intp)
+        self.ends = np.concatenate([changes, [len(self.rows)]]).astype(np.intp)
+
+        self.lat_min, self.lat_max = self._extent(store.lat)
+        self.lon_min, self.lon_max = self._extent(store.lon)
+        self.price_min, self.price_max = self._extent(store.price)
+        self.bedrooms_min, self.bedrooms_max = self._extent(store.bedrooms)
+        self.bathrooms_min, self.bathrooms_max = self._extent(store.bathrooms)
+
+    def _extent(self, column: np.ndarray):
+        if not len(self.rows):
+            return np.empty(0, column.dtype), np.empty(0, column.dtype)
+        grouped = column[self.rows]
+        return (np.minimum.reduceat(grouped, self.starts),
+                np.maximum.reduceat(grouped, self.starts))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def search(self, requirement: CompiledRequirement, weights, k: Optional[int],
+               min_score: float) -> Tuple[np.ndarray, ComponentScores]:
+        """
+        Rows of the ``k`` best matches reaching ``min_score`` and their
+        scores, best first.
+
+        Partitions are visited in decreasing order of their bound and the
+        walk stops as soon as no remaining partition can qualify. Ties keep
+        inventory order, exactly like ``top_k`` over a full scan.
+        """
+        bounds = self.upper_bounds(requirement, weights) + ROUNDING_SLACK
+        visit = np.argsort(-bounds, kind='stable')
+        visit = visit[bounds[visit] >= min_score]
+
+        columns = self.store.columns()
+
+        if not k:
+            # Without a k-th best to raise the cut-off, visiting in order gains
+            # nothing: score every partition that can qualify in one batch.
+            if (self.ends - self.starts)[visit].sum() * 2 > len(self.store):
+                # Most rows can qualify: a plain scan with the geo index is cheaper
+                rows = np.arange(len(self.store))
+                scores = score_columns(columns, requirement, weights, self.store.geo_index())
+            else:
+                rows = np.sort(self._gather(visit))
+                scores = score_columns(
+                    {name: column[rows] for name, column in columns.items()},
+                    requirement, weights
+                )
+            overall = np.round(scores.overall, 2)
+            keep = np.flatnonzero(overall >= min_score)
+            ranked = keep[np.lexsort((rows[keep], -overall[keep]))]
+            return rows[ranked], scores.take(ranked)
+
+        best_rows = np.empty(0, dtype=np.intp)
+        best_scores = np.empty(0)
+
+        scanned = np.cumsum((self.ends - self.starts)[visit])
+        position = 0
+        while position < len(visit):
+            cut_off = min_score
+            if k and len(best_rows) >= k:
+                cut_off = max(cut_off, best_scores[k - 1])
+
+            # Take whole partitions, best bound first, until the batch is large
+            # enough; stop at the first one that can no longer qualify.
+            already = scanned[position - 1] if position else 0
+            end = min(int(np.searchsorted(scanned, already + BATCH_ROWS)) + 1, len(visit))
+            end = position + int(np.searchsorted(
+                -bounds[visit[position:end]], -cut_off, side='right'
+            ))
+            if end == position:
+                break
+
+            rows = self._gather(visit[position:end])
+            position = end
+
+            scores = score_columns(
+                {name: column[rows] for name, column in columns.items()},
+                requirement, weights
+            )
+            overall = np.round(scores.overall, 2)
+            keep = overall >= min_score
+
+            best_rows = np.concatenate([best_rows, rows[keep]])
+            best_scores = np.concatenate([best_scores, overall[keep]])
+            order = np.lexsort((best_rows, -best_scores))
+            if k:
+                order = order[:k]
+            best_rows, best_scores = best_rows[order], best_scores[order]
+
+        return best_rows, score_columns(
+            {name: column[best_rows] for name, column in columns.items()}, requirement, weights
+        )
+
+    def _gather(self, partitions: np.ndarray) -> np.ndarray:
+        """Concatenated rows of ``partitions`` without a Python-level loop."""
+        starts = self.starts[partitions]
+        lengths = self.ends[partitions] - starts
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return self.rows[offsets + np.arange(lengths.sum())]
+
+
+def _range_bounds(range_score: Optional[RangeScore], low: np.ndarray,
+                  high: np.ndarray) -> np.ndarray:
+    """
+    Upper bound of ``range_scores`` over each ``[low, high]``.
+
+    The score is 100 on the perfect range, falls from ``perfect_max`` up to
+    ``acceptable_max`` and from ``perfect_min`` down to ``acceptable_min``.
+    Each piece is bounded at its point closest to where it peaks, so the
+    bound also holds for inverted ranges (``perfect_min > perfect_max``),
+    where the pieces overlap and the score does not peak on one interval.
+    """
+    if range_score is None:
+        return np.zeros(low.shape)
+    perfect = (range_score.perfect_min <= range_score.perfect_max) & \
+        (low <= range_score.perfect_max) & (high >= range_score.perfect_min)
+
+    above = np.maximum(low, range_score.perfect_max)
+    upper = np.where(
+        above <= np.minimum(high, range_score.acceptable_max),
+        np.maximum(100 - (above - range_score.perfect_max) * range_score.upper_slope,
+                   range_score.floor),
+        0.0,
+    )
+    below = np.minimum(high, range_score.perfect_min)
+    lower = np.where(
+        below >= np.maximum(low, range_score.acceptable_min),
+        np.maximum(100 - (range_score.perfect_min - below) * range_score.lower_slope,
+                   range_score.floor),
+        0.0,
+    )
+    return np.where(perfect, 100.0, np.maximum(upper, lower))
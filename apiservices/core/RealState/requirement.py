@@ -0,0 +1,264 @@
+"""
+Compiled search requirements.
+
+A requirement arrives as a loosely typed dict (strings, missing bounds,
+camelCase keys). ``compile_requirement`` normalizes it once per query into
+an immutable ``CompiledRequirement`` holding everything the scorers need
+(range edges, interpolation slopes, trigonometric terms), so scoring a
+property is plain arithmetic.
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from math import cos, radians, sin
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from apiservices.core.RealState.driver import MatchThresholds
+
+# Room counts with a precomputed score; the models validate 1-20 rooms,
+# anything outside the table falls back to the range arithmetic.
+ROOM_TABLE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class RangeScore:
+    """
+    Piecewise-linear score over a value range.
+
+    Values inside ``[perfect_min, perfect_max]`` score 100, values inside
+    the acceptable range fall linearly from 100 towards ``floor`` and
+    everything else scores 0. Used for the budget and room components.
+    """
+    perfect_min: float
+    perfect_max: float
+    acceptable_min: float
+    acceptable_max: float
+    upper_slope: float
+    lower_slope: float
+    floor: float
+
+    @classmethod
+    def build(cls, perfect_min: float, perfect_max: float, acceptable_min: float,
+              acceptable_max: float, floor: float) -> 'RangeScore':
+        """Precompute the interpolation slopes for the given range edges."""
+        upper_diff = acceptable_max - perfect_max
+        lower_diff = perfect_min - acceptable_min
+        return cls(
+            perfect_min=perfect_min,
+            perfect_max=perfect_max,
+            acceptable_min=acceptable_min,
+            acceptable_max=acceptable_max,
+            upper_slope=(100 - floor) / upper_diff if upper_diff else 0.0,
+            lower_slope=(100 - floor) / lower_diff if lower_diff else 0.0,
+            floor=floor,
+        )
+
+    def support(self) -> Tuple[float, float]:
+        """
+        ``(low, high)`` outside which the score is 0. A minimum above the
+        maximum gives an inverted perfect range, still scored by ``score``,
+        so the bounds span all four edges instead of assuming their order.
+        Works on array fields too, with NaN for missing ranges.
+        """
+        edges = (self.perfect_min, self.perfect_max, self.acceptable_min, self.acceptable_max)
+        return np.minimum.reduce(edges), np.maximum.reduce(edges)
+
+    def score(self, value: float) -> float:
+        """Score a single value."""
+        if self.perfect_min <= value <= self.perfect_max:
+            return 100.0
+        if self.perfect_max < value <= self.acceptable_max:
+            return max(100 - (value - self.perfect_max) * self.upper_slope, self.floor)
+        if self.acceptable_min <= value < self.perfect_min:
+            return max(100 - (self.perfect_min - value) * self.lower_slope, self.floor)
+        return 0.0
+
+    def scores(self, values: np.ndarray) -> np.ndarray:
+        """``score`` of every element of ``values``."""
+        upper = np.maximum(100 - (values - self.perfect_max) * self.upper_slope, self.floor)
+        lower = np.maximum(100 - (self.perfect_min - values) * self.lower_slope, self.floor)
+
+        return np.select(
+            [
+                (values >= self.perfect_min) & (values <= self.perfect_max),
+                (values > self.perfect_max) & (values <= self.acceptable_max),
+                (values < self.perfect_min) & (values >= self.acceptable_min),
+            ],
+            [100.0, upper, lower],
+            default=0.0,
+        )
+
+
+@dataclass(frozen=True)
+class RoomScore(RangeScore):
+    """
+    ``RangeScore`` for room counts. ``table`` holds the score of every small
+    count, so scoring a column of room counts is a single gather; it is
+    built on first use, as scoring single counts never needs it.
+    """
+
+    @cached_property
+    def table(self) -> np.ndarray:
+        """Score of every room count below ``ROOM_TABLE_SIZE``."""
+        table = self.scores(np.arange(ROOM_TABLE_SIZE, dtype=np.float64))
+        table.setflags(write=False)
+        return table
+
+
+@dataclass(frozen=True)
+class CompiledRequirement:
+    """
+    A requirement normalized against a ``MatchThresholds`` instance.
+
+    ``lat``/``lon`` are None when the requirement has no usable location,
+    and ``budget``/``bedrooms``/``bathrooms`` are None when the matching
+    bounds are missing; those components then score 0.
+    """
+    lat: Optional[float]
+    lon: Optional[float]
+    cos_lat: float
+    x: float
+    y: float
+    z: float
+
+    distance_perfect: float
+    distance_max: float
+    distance_top: float
+    distance_slope: float
+    distance_floor: float
+
+    budget: Optional[RangeScore]
+    bedrooms: Optional[RoomScore]
+    bathrooms: Optional[RoomScore]
+
+    thresholds: 'MatchThresholds'
+
+    def distance_score(self, distance_miles: float) -> float:
+        """Score a distance in miles."""
+        if distance_miles <= self.distance_perfect:
+            return 100.0
+        if distance_miles <= self.distance_max:
+            return max(
+                self.distance_top - (distance_miles - self.distance_perfect) * self.distance_slope,
+                self.distance_floor
+            )
+        return 0.0
+
+
+def normalize_requirement(requirement: Dict) -> Tuple:
+    """
+    ``(location, budget, bedrooms, bathrooms)`` of ``requirement`` as typed
+    tuples (None where unusable): everything its scores depend on, so two
+    requirements with equal normal forms score every property the same.
+    """
+    return (
+        _location(requirement),
+        _budget_bounds(requirement),
+        _room_bounds(requirement, 'Bedrooms'),
+        _room_bounds(requirement, 'Bathrooms'),
+    )
+
+
+def compile_requirement(requirement: Dict,
+                        thresholds: 'MatchThresholds') -> CompiledRequirement:
+    """Normalize ``requirement`` and precompute its scoring terms."""
+    location, budget, bedrooms, bathrooms = normalize_requirement(requirement)
+    lat, lon = location if location else (None, None)
+    lat_rad = radians(lat) if location else 0.0
+    lon_rad = radians(lon) if location else 0.0
+
+    return CompiledRequirement(
+        lat=lat,
+        lon=lon,
+        cos_lat=cos(lat_rad),
+        x=cos(lat_rad) * cos(lon_rad),
+        y=cos(lat_rad) * sin(lon_rad),
+        z=sin(lat_rad),
+        distance_perfect=thresholds.distance_perfect,
+        distance_max=thresholds.distance_max,
+        distance_top=thresholds.max_match_percentage,
+        distance_slope=(
+            (thresholds.max_match_percentage - thresholds.min_match_percentage) /
+            (thresholds.distance_max - thresholds.distance_perfect)
+        ),
+        distance_floor=thresholds.min_match_percentage,
+        budget=_budget_score(budget, thresholds) if budget else None,
+        bedrooms=_room_score(bedrooms, thresholds) if bedrooms else None,
+        bathrooms=_room_score(bathrooms, thresholds) if bathrooms else None,
+        thresholds=thresholds,
+    )
+
+
+def _location(requirement: Dict) -> Optional[Tuple[float, float]]:
+    try:
+        return float(requirement['lat']), float(requirement['lon'])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def _budget_bounds(requirement: Dict) -> Optional[Tuple[float, float]]:
+    """Normalize the requirement's budget to ``(min, max)``, or None if unusable."""
+    budget_max = requirement.get('maxBudget')
+    budget_min = requirement.get('minBudget')
+
+    if not budget_max and not budget_min:
+        return None
+
+    # Handle cases where only one bound is provided
+    if not budget_max:
+        budget_max = budget_min
+    if not budget_min:
+        budget_min = budget_max
+
+    try:
+        return float(budget_min), float(budget_max)
+    except (ValueError, TypeError):
+        return None
+
+
+def _room_bounds(requirement: Dict, room_type_cap: str) -> Optional[Tuple[int, int]]:
+    """Normalize a room range to ``(min, max)``, or None if unusable."""
+    room_max = requirement.get(f'max{room_type_cap}')
+    room_min = requirement.get(f'min{room_type_cap}')
+
+    if not room_max and not room_min:
+        return None
+
+    # Handle cases where only one bound is provided
+    if not room_max:
+        room_max = room_min
+    if not room_min:
+        room_min = room_max
+
+    try:
+        return int(room_min), int(room_max)
+    except (ValueError, TypeError):
+        return None
+
+
+def _budget_score(budget: Tuple[float, float], thresholds) -> RangeScore:
+    budget_min, budget_max = budget
+    avg_budget = (budget_max + budget_min) / 2.0
+
+    # Perfect match range (within budget_perfect % of the average) and
+    # acceptable range (within budget_max %)
+    return RangeScore.build(
+        perfect_min=max(budget_min - (avg_budget * thresholds.budget_perfect) / 100, 0),
+        perfect_max=budget_max + (avg_budget * thresholds.budget_perfect) / 100,
+        acceptable_min=max(budget_min - (avg_budget * thresholds.budget_max) / 100, 0),
+        acceptable_max=budget_max + (avg_budget * thresholds.budget_max) / 100,
+        floor=thresholds.min_match_percentage,
+    )
+
+
+def _room_score(rooms: Tuple[int, int], thresholds) -> RoomScore:
+    room_min, room_max = rooms
+    return RoomScore.build(
+        perfect_min=max(room_min - thresholds.rooms_perfect, 0),
+        perfect_max=room_max + thresholds.rooms_perfect,
+        acceptable_min=max(room_min - thresholds.rooms_max, 0),
+        acceptable_max=room_max + thresholds.rooms_max,
+        floor=thresholds.min_match_percentage,
+    )
@@ -0,0 +1,293 @@
+"""
+Reverse matching: every requirement a property matches.
+
+A new listing has to be checked against every open requirement, and
+scoring them one by one is a full table scan. ``RequirementIndex`` keeps
+one structure per component that answers "which requirements can score
+above 0 for this value":
+
+* distance: a ``GeoIndex`` over requirement centers, searched within
+  ``distance_max`` of the property;
+* budget: scoring ranges bucketed on a logarithmic price grid, with the
+  few ranges spanning too many buckets kept on a list checked every time;
+* bedrooms/bathrooms: one posting list of requirements per room count.
+
+A requirement can only reach ``min_match_percentage`` if the weights of
+the components it scores on add up to it, so only those candidates are
+scored, with the same rules as ``PropertyMatcher.calculate_overall_match``.
+"""
+from dataclasses import fields
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.geo_index import GeoIndex
+from apiservices.core.RealState.partitions import ROUNDING_SLACK
+from apiservices.core.RealState.requirement import (
+    ROOM_TABLE_SIZE, RangeScore, normalize_requirement
+)
+from apiservices.core.RealState.utils import unit_vectors
+from apiservices.core.RealState.vectorized import (
+    distance_scores, property_columns, range_scores, top_k
+)
+
+# Budget buckets: four per doubling of the price, prices below 1 share bucket 0
+BUDGET_BUCKETS_PER_OCTAVE = 4
+BUDGET_BUCKETS = 64 * BUDGET_BUCKETS_PER_OCTAVE
+
+# Budget ranges covering more buckets than this are checked on every query
+MAX_BUDGET_SPAN = 32
+
+
+class RequirementIndex:
+    """Active requirements indexed by the property values they can score on."""
+
+    def __init__(self, ids, lat, lon, budget_min, budget_max, bedrooms_min, bedrooms_max,
+                 bathrooms_min, bathrooms_max, matcher: Optional[PropertyMatcher] = None):
+        """
+        Index normalized requirement columns; NaN marks a missing location
+        or range, which then scores 0 like in ``compile_requirement``.
+        """
+        self.matcher = matcher or PropertyMatcher()
+        thresholds = self.matcher.thresholds
+
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        lat = np.ascontiguousarray(lat, dtype=np.float64)
+        lon = np.ascontiguousarray(lon, dtype=np.float64)
+        x, y, z = unit_vectors(lat, lon)
+        self.columns = {'lat': lat, 'lon': lon, 'x': x, 'y': y, 'z': z}
+
+        budget_min = np.asarray(budget_min, dtype=np.float64)
+        budget_max = np.asarray(budget_max, dtype=np.float64)
+        avg_budget = (budget_max + budget_min) / 2.0
+        self.budget = _range_arrays(
+            budget_min, budget_max,
+            (avg_budget * thresholds.budget_perfect) / 100,
+            (avg_budget * thresholds.budget_max) / 100,
+            thresholds.min_match_percentage,
+        )
+        self.bedrooms = _range_arrays(
+            np.asarray(bedrooms_min, dtype=np.float64), np.asarray(bedrooms_max, dtype=np.float64),
+            thresholds.rooms_perfect, thresholds.rooms_max, thresholds.min_match_percentage,
+        )
+        self.bathrooms = _range_arrays(
+            np.asarray(bathrooms_min, dtype=np.float64), np.asarray(bathrooms_max, dtype=np.float64),
+            thresholds.rooms_perfect, thresholds.rooms_max, thresholds.min_match_percentage,
+        )
+
+        # Distance: centers on the grid; latitudes the grid can't place are always checked
+        located = np.isfinite(lat) & np.isfinite(lon)
+        on_grid = located & (np.abs(lat) <= 90.0)
+        self._gridded = np.flatnonzero(on_grid)
+        self._off_grid = np.flatnonzero(located & ~on_grid)
+        self._geo_index = GeoIndex(lat[self._gridded], lon[self._gridded])
+
+        # Budget: each scoring range registered in every bucket it overlaps
+        low, high = self.budget.support()
+        first, last = _budget_bucket(low), _budget_bucket(high)
+        valid = np.isfinite(low) & np.isfinite(high)
+        narrow = valid & (last - first < MAX_BUDGET_SPAN)
+        self._wide_budgets = np.flatnonzero(valid & ~narrow)
+        rows = np.flatnonzero(narrow)
+        spans = (last - first + 1)[rows]
+        self._budget_rows, self._budget_offsets = _postings(
+            np.repeat(rows, spans),
+            np.repeat(first[rows], spans) + _ramp(spans),
+            BUDGET_BUCKETS,
+        )
+
+        # Rooms: a posting list per count of the rows scoring above 0 on it
+        self._room_postings = {
+            name: _postings(*_room_pairs(getattr(self, name)), ROOM_TABLE_SIZE)
+            for name in ('bedrooms', 'bathrooms')
+        }
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict],
+                     matcher: Optional[PropertyMatcher] = None) -> 'RequirementIndex':
+        """Index requirement dicts (the ``find_matches`` shape plus an ``id``)."""
+        ids, locations, budgets, bedrooms, bathrooms = [], [], [], [], []
+        missing = (np.nan, np.nan)
+
+        for record in records:
+            ids.append(int(record['id']))
+            location, budget, bedroom_bounds, bathroom_bounds = normalize_requirement(record)
+            locations.append(location or missing)
+            budgets.append(budget or missing)
+            bedrooms.append(bedroom_bounds or missing)
+            bathrooms.append(bathroom_bounds or missing)
+
+        def split(pairs: List[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+            pairs = np.array(pairs, dtype=np.float64).reshape(-1, 2)
+            return pairs[:, 0], pairs[:, 1]
+
+        return cls(ids, *split(locations), *split(budgets), *split(bedrooms),
+                   *split(bathrooms), matcher=matcher)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def match_property(self, property_data: Dict) -> List[Dict]:
+        """
+        Every requirement ``property_data`` matches, best first.
+
+        Returns dicts with the requirement ``id`` and the same ``match`` and
+        component scores ``find_matches`` reports; ties keep index order.
+        """
+        weights = self.matcher.weights
+        min_score = self.matcher.thresholds.min_match_percentage
+        listing = property_columns([property_data])
+
+        if min_score > ROUNDING_SLACK:
+            candidates, bounds = _sum_by_row([
+                (self._near(listing), weights.distance),
+                (self._budget_candidates(listing['price'][0]), weights.budget),
+                (self._room_candidates('bedrooms', listing['bedrooms'][0]), weights.bedrooms),
+                (self._room_candidates('bathrooms', listing['bathrooms'][0]), weights.bathrooms),
+            ])
+            candidates = candidates[bounds * 100 + ROUNDING_SLACK >= min_score]
+        else:
+            candidates = np.arange(len(self))
+
+        scores = self._score(candidates, listing)
+        ranked = top_k(np.round(scores['overall'], 2), None, min_score)
+        return [
+            {
+                'id': int(self.ids[candidates[row]]),
+                'match': round(float(scores['overall'][row]), 2),
+                'distance_score': round(float(scores['distance'][row]), 2),
+                'budget_score': round(float(scores['budget'][row]), 2),
+                'bedroom_score': round(float(scores['bedrooms'][row]), 2),
+                'bathroom_score': round(float(scores['bathrooms'][row]), 2),
+            }
+            for row in ranked
+        ]
+
+    def _near(self, listing: Dict[str, np.ndarray]) -> np.ndarray:
+        lat, lon = listing['lat'][0], listing['lon'][0]
+        if not (np.isfinite(lat) and np.isfinite(lon)):
+            return np.empty(0, dtype=np.intp)
+        near = self._gridded[self._geo_index.radius_search(
+            lat, lon, self.matcher.thresholds.distance_max
+        )]
+        return np.concatenate([near, self._off_grid])
+
+    def _budget_candidates(self, price: float) -> np.ndarray:
+        if np.isnan(price):
+            return np.empty(0, dtype=np.intp)
+        bucket = int(_budget_bucket(price))
+        rows = np.concatenate([
+            self._budget_rows[self._budget_offsets[bucket]:self._budget_offsets[bucket + 1]],
+            self._wide_budgets,
+        ])
+        low, high = _take(self.budget, rows).support()
+        return rows[(low <= price) & (price <= high)]
+
+    def _room_candidates(self, name: str, rooms: float) -> np.ndarray:
+        if np.isnan(rooms):
+            return np.empty(0, dtype=np.intp)
+        if 0 <= rooms < ROOM_TABLE_SIZE:
+            rows, offsets = self._room_postings[name]
+            return rows[offsets[int(rooms)]:offsets[int(rooms) + 1]]
+        # Counts beyond the posting lists: check every range
+        return np.flatnonzero(range_scores(np.full(len(self), rooms), getattr(self, name)) > 0)
+
+    def _score(self, rows: np.ndarray, listing: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Component and weighted scores of requirement ``rows`` for one listing."""
+        weights = self.matcher.weights
+
+        # Distance is symmetric, so score the requirement centers around the listing
+        center = self.matcher.compile({'lat': listing['lat'][0], 'lon': listing['lon'][0]})
+        distance = distance_scores(
+            {name: self.columns[name][rows] for name in ('lat', 'x', 'y', 'z')}, center
+        )
+        budget = range_scores(np.full(len(rows), listing['price'][0]), _take(self.budget, rows))
+        bedrooms = range_scores(np.full(len(rows), listing['bedrooms'][0]),
+                                _take(self.bedrooms, rows))
+        bathrooms = range_scores(np.full(len(rows), listing['bathrooms'][0]),
+                                 _take(self.bathrooms, rows))
+
+        return {
+            'distance': distance,
+            'budget': budget,
+            'bedrooms': bedrooms,
+            'bathrooms': bathrooms,
+            'overall': (
+                distance * weights.distance +
+                budget * weights.budget +
+                bedrooms * weights.bedrooms +
+                bathrooms * weights.bathrooms
+            ),
+        }
+
+
+def _range_arrays(low: np.ndarray, high: np.ndarray, perfect_margin, acceptable_margin,
+                  floor_score: float) -> RangeScore:
+    """``RangeScore`` whose fields are arrays, one entry per requirement."""
+    perfect_min = np.maximum(low - perfect_margin, 0)
+    perfect_max = high + perfect_margin
+    acceptable_min = np.maximum(low - acceptable_margin, 0)
+    acceptable_max = high + acceptable_margin
+
+    upper_diff = acceptable_max - perfect_max
+    lower_diff = perfect_min - acceptable_min
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upper_slope = np.where(upper_diff != 0, (100 - floor_score) / upper_diff, 0.0)
+        lower_slope = np.where(lower_diff != 0, (100 - floor_score) / lower_diff, 0.0)
+
+    return RangeScore(
+        perfect_min=perfect_min,
+        perfect_max=perfect_max,
+        acceptable_min=acceptable_min,
+        acceptable_max=acceptable_max,
+        upper_slope=upper_slope,
+        lower_slope=lower_slope,
+        floor=floor_score,
+    )
+
+
+def _take(range_score: RangeScore, rows: np.ndarray) -> RangeScore:
+    return RangeScore(**{
+        f.name: value[rows] if isinstance(value, np.ndarray) else value
+        for f in fields(range_score)
+        for value in [getattr(range_score, f.name)]
+    })
+
+
+def _budget_bucket(price):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bucket = np.floor(np.log2(np.maximum(price, 1.0)) * BUDGET_BUCKETS_PER_OCTAVE)
+    return np.clip(np.nan_to_num(bucket), 0, BUDGET_BUCKETS - 1).astype(np.int64)
+
+
+def _ramp(lengths: np.ndarray) -> np.ndarray:
+    """``[0, 1, ..., n - 1]`` for every ``n`` in ``lengths``, concatenated."""
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths, lengths)
+
+
+def _postings(rows: np.ndarray, keys: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """``rows`` grouped by ``keys`` (CSR-style), keeping row order inside each key."""
+    order = np.argsort(keys, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=size))])
+    return rows[order], offsets.astype(np.int64)
+
+
+def _room_pairs(range_score: RangeScore) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, count) for every room count in the table a row scores above 0 on."""
+    rows, counts = [], []
+    for count in range(ROOM_TABLE_SIZE):
+        scoring = np.flatnonzero(range_scores(np.full(len(range_score.perfect_min), count),
+                                              range_score) > 0)
+        rows.append(scoring)
+        counts.append(np.full(len(scoring), count, dtype=np.int64))
+    return np.concatenate(rows), np.concatenate(counts)
+
+
+def _sum_by_row(weighted: List[Tuple[np.ndarray, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct rows across the lists and the summed weight of the lists holding each."""
+    rows = np.concatenate([candidates for candidates, _ in weighted])
+    weight = np.concatenate([np.full(len(candidates), w) for candidates, w in weighted])
+    distinct, inverse = np.unique(rows, return_inverse=True)
+    return distinct, np.bincount(inverse, weights=weight, minlength=len(distinct))
@@ -0,0 +1,173 @@
+"""
+Component score vectors kept for re-ranking a requirement.
+
+Once a property's distance, price and room counts have been placed on a
+requirement's ranges, neither the weights nor ``min_match_percentage``
+(nor ``max_match_percentage``) change where they fall: each component
+scores 100, 0, or ``max(top - offset * slope, floor)``, where only the
+slope, top and floor depend on those settings. ``ComponentVectors``
+keeps which case applies to every property and its offset, so scoring
+the same requirement under other weights or match percentages is a
+handful of array operations, with no distances or ranges evaluated.
+
+The arithmetic is the one ``score_columns`` does, on the same operands,
+so the scores (and the rankings built from them) are identical to a
+fresh scan. The component scores for the last match percentages used
+are kept too, so a re-ranking under new weights alone is one weighted
+sum and a top k: well under a millisecond for tens of thousands of
+properties, and linear in the inventory size beyond that.
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.geo_index import GeoIndex
+from apiservices.core.RealState.requirement import CompiledRequirement, RangeScore
+from apiservices.core.RealState.store import PropertyStore
+from apiservices.core.RealState.utils import distances_from_vectors
+from apiservices.core.RealState.vectorized import ComponentScores
+
+# Where a value falls relative to a component's ranges
+PERFECT, ABOVE, BELOW, OUTSIDE = range(4)
+
+# Case, offset and kept score of each of the four components
+BYTES_PER_ROW = 4 * (1 + 8 + 8)
+
+
+@dataclass
+class ComponentVector:
+    """Case and interpolation offset of one component, per property."""
+    cases: np.ndarray
+    offsets: np.ndarray
+    # Lengths of the ranges the score falls over above and below perfect
+    spans: Tuple[float, float]
+
+    @property
+    def nbytes(self) -> int:
+        return self.cases.nbytes + self.offsets.nbytes
+
+    def scores(self, floor: float, top: float = 100) -> np.ndarray:
+        """Scores with ``floor`` as the minimum match and ``top`` as the interpolation start."""
+        above, below = self.spans
+        slopes = np.array([
+            0.0,
+            (top - floor) / above if above else 0.0,
+            (top - floor) / below if below else 0.0,
+            0.0,
+        ])
+        interpolated = np.maximum(top - self.offsets * slopes[self.cases], floor)
+        return np.select([self.cases == PERFECT, self.cases == OUTSIDE], [100.0, 0.0],
+                         interpolated)
+
+
+def _range_vector(values: np.ndarray, range_score: Optional[RangeScore]) -> ComponentVector:
+    """``ComponentVector`` of ``range_scores`` (budget and room counts)."""
+    if range_score is None:
+        return ComponentVector(np.full(values.shape, OUTSIDE, np.int8),
+                               np.zeros(values.shape), (0.0, 0.0))
+    cases = np.select(
+        [
+            (values >= range_score.perfect_min) & (values <= range_score.perfect_max),
+            (values > range_score.perfect_max) & (values <= range_score.acceptable_max),
+            (values < range_score.perfect_min) & (values >= range_score.acceptable_min),
+        ],
+        [PERFECT, ABOVE, BELOW],
+        default=OUTSIDE,
+    ).astype(np.int8)
+    offsets = np.where(cases == BELOW, range_score.perfect_min - values,
+                       values - range_score.perfect_max).astype(np.float64)
+    return ComponentVector(cases, offsets, (
+        range_score.acceptable_max - range_score.perfect_max,
+        range_score.perfect_min - range_score.acceptable_min,
+    ))
+
+
+def _distance_vector(store: PropertyStore, requirement: CompiledRequirement,
+                     geo_index: GeoIndex) -> ComponentVector:
+    """``ComponentVector`` of ``distance_scores``."""
+    cases = np.full(len(store), OUTSIDE, np.int8)
+    offsets = np.zeros(len(store))
+    spans = (requirement.distance_max - requirement.distance_perfect, 0.0)
+    if requirement.lat is None:
+        return ComponentVector(cases, offsets, spans)
+
+    # Rows outside every cell within distance_max score 0, as with the geo index
+    rows = geo_index.radius_search(requirement.lat, requirement.lon, requirement.distance_max)
+    miles = distances_from_vectors(
+        requirement.x, requirement.y, requirement.z,
+        store.x[rows], store.y[rows], store.z[rows]
+    )
+    cases[rows] = np.where(miles <= requirement.distance_perfect, PERFECT,
+                           np.where(miles <= requirement.distance_max, ABOVE, OUTSIDE))
+    offsets[rows] = miles - requirement.distance_perfect
+    return ComponentVector(cases, offsets, spans)
+
+
+@dataclass
+class ComponentVectors:
+    """The four component vectors of one requirement over one store."""
+    distance: ComponentVector
+    budget: ComponentVector
+    bedrooms: ComponentVector
+    bathrooms: ComponentVector
+    # ((min, max match percentage), component scores) of the last scoring
+    _last: Optional[Tuple] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def build(cls, store: PropertyStore, requirement: CompiledRequirement) -> 'ComponentVectors':
+        return cls(
+            distance=_distance_vector(store, requirement, store.geo_index()),
+            budget=_range_vector(store.price, requirement.budget),
+            bedrooms=_range_vector(store.bedrooms, requirement.bedrooms),
+            bathrooms=_range_vector(store.bathrooms, requirement.bathrooms),
+        )
+
+    @staticmethod
+    def estimate_nbytes(rows: int) -> int:
+        """``nbytes`` of the vectors of a store of ``rows`` properties."""
+        return rows * BYTES_PER_ROW
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held, counting the component scores kept from the last scoring."""
+        vectors = (self.distance, self.budget, self.bedrooms, self.bathrooms)
+        return sum(vector.nbytes + vector.offsets.nbytes for vector in vectors)
+
+    def scores(self, weights, thresholds) -> ComponentScores:
+        """Component and weighted scores under ``weights`` and ``thresholds``."""
+        percentages = (thresholds.min_match_percentage, thresholds.max_match_percentage)
+        last = self._last
+        if last is None or last[0] != percentages:
+            floor, top = percentages
+            last = self._last = (percentages, (
+                self.distance.scores(floor, top), self.budget.scores(floor),
+                self.bedrooms.scores(floor), self.bathrooms.scores(floor),
+            ))
+        distance, budget, bedrooms, bathrooms = last[1]
+
+        # The sum score_columns computes, in the same order, without temporaries
+        overall = np.multiply(distance, weights.distance)
+        term = np.empty_like(overall)
+        for scores, weight in ((budget, weights.budget), (bedrooms, weights.bedrooms),
+                               (bathrooms, weights.bathrooms)):
+            overall += np.multiply(scores, weight, out=term)
+        return ComponentScores(distance, budget, bedrooms, bathrooms, overall)
+
+
+def vector_key(store: PropertyStore, requirement: CompiledRequirement) -> Tuple:
+    """
+    What the vectors of ``requirement`` over ``store`` depend on: the store,
+    the requirement's location and ranges, and the distance thresholds.
+    """
+    def edges(range_score):
+        if range_score is None:
+            return None
+        return (range_score.perfect_min, range_score.perfect_max,
+                range_score.acceptable_min, range_score.acceptable_max)
+
+    return (
+        store.serial, requirement.lat, requirement.lon,
+        requirement.distance_perfect, requirement.distance_max,
+        edges(requirement.budget), edges(requirement.bedrooms), edges(requirement.bathrooms),
+    )
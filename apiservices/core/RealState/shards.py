@@ -0,0 +1,281 @@
+"""
+Geographic shards of a property inventory.
+
+``ShardedInventory`` splits an inventory into shards of nearby listings:
+rows are ordered along a Z-order (Morton) curve over a ``GeoGrid``, on
+which every square block of cells is a contiguous range, and a block
+holding more than ``shard_rows`` rows is split into its four quarters
+until each one fits, so a shard covers a compact area. Every shard has
+its own ``PropertyStore`` and the extents of its hot columns
+(``ShardStats``), from which the same upper bounds as ``PartitionIndex``
+rule whole shards out before any of their rows are read.
+
+A search ranks each shard that can qualify on its own, through the
+shard's partition index, and merges the per-shard top k. Shards can be
+ranked on several threads or processes through an executor, and a
+sharded inventory saved to a directory is opened from its manifest
+alone: a shard's files are only mapped once a search needs them.
+Results are identical to searching the unsharded store.
+"""
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.geo_index import GeoGrid
+from apiservices.core.RealState.partitions import ROUNDING_SLACK, ExtentBounds
+from apiservices.core.RealState.requirement import CompiledRequirement
+from apiservices.core.RealState.snapshot import load_snapshot, write_snapshot
+from apiservices.core.RealState.store import PropertyStore
+from apiservices.core.RealState.vectorized import ComponentScores
+
+DEFAULT_SHARD_ROWS = 50000
+DEFAULT_CELL_DEGREES = 0.5
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ShardStats:
+    """Row count and hot column extents of one shard."""
+    size: int
+    lat_min: float
+    lat_max: float
+    lon_min: float
+    lon_max: float
+    price_min: float
+    price_max: float
+    bedrooms_min: int
+    bedrooms_max: int
+    bathrooms_min: int
+    bathrooms_max: int
+
+    @classmethod
+    def of(cls, store: PropertyStore) -> 'ShardStats':
+        """Statistics of a non-empty store."""
+        return cls(
+            len(store),
+            float(store.lat.min()), float(store.lat.max()),
+            float(store.lon.min()), float(store.lon.max()),
+            float(store.price.min()), float(store.price.max()),
+            int(store.bedrooms.min()), int(store.bedrooms.max()),
+            int(store.bathrooms.min()), int(store.bathrooms.max()),
+        )
+
+
+class InventoryShard:
+    """
+    One shard: its statistics, its store and the row of the full inventory
+    each of its rows came from (ascending, so ties keep inventory order).
+
+    A shard opened from a directory maps its files on first use, and is
+    pickled without them, so a worker process maps them itself.
+    """
+
+    def __init__(self, stats: ShardStats, store: Optional[PropertyStore] = None,
+                 rows: Optional[np.ndarray] = None, path: Optional[str] = None):
+        self.stats = stats
+        self.path = path
+        self._store = store
+        self._rows = rows
+
+    @property
+    def store(self) -> PropertyStore:
+        if self._store is None:
+            self._store = load_snapshot(self.path + '.snapshot')
+        return self._store
+
+    @property
+    def rows(self) -> np.ndarray:
+        if self._rows is None:
+            self._rows = np.load(self.path + '.rows.npy', mmap_mode='r')
+        return self._rows
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the store has been read (always, for an in-memory shard)."""
+        return self._store is not None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        if self.path is not None:
+            state['_store'] = state['_rows'] = None
+        return state
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Put the low 32 bits of each value on the even bits of a uint64."""
+    spread = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                        (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333),
+                        (1, 0x5555555555555555)):
+        spread = (spread | (spread << np.uint64(shift))) & np.uint64(mask)
+    return spread
+
+
+def morton_keys(lat: np.ndarray, lon: np.ndarray, cell_degrees: float) -> np.ndarray:
+    """Position of each point's grid cell along a Z-order curve."""
+    grid = GeoGrid(cell_degrees)
+    return (_spread_bits(grid.lat_cell(lat)) << np.uint64(1)) | _spread_bits(grid.lon_cell(lon))
+
+
+def _block_ranges(keys: np.ndarray, shard_rows: int, bits: int) -> List[Tuple[int, int]]:
+    """
+    ``[start, end)`` ranges of the sorted Morton ``keys`` holding at most
+    ``shard_rows`` rows each, from splitting blocks of ``2 ** bits`` keys
+    into quarters; a single cell holding more rows is cut by row count.
+    """
+    ranges = []
+    pending = [(0, len(keys), bits)]
+    while pending:
+        start, end, level = pending.pop()
+        if end - start <= shard_rows or level == 0:
+            ranges.extend((first, min(first + shard_rows, end))
+                          for first in range(start, end, shard_rows))
+            continue
+        base = int(keys[start]) >> level << level
+        quarter = 1 << (level - 2)
+        bounds = start + np.searchsorted(
+            keys[start:end], np.array([base + quarter * i for i in (1, 2, 3)], dtype=np.uint64)
+        )
+        edges = [start, *map(int, bounds), end]
+        # Pushed last quarter first, so ranges come out in curve order
+        quarters = [(low, high) for low, high in zip(edges, edges[1:]) if low < high]
+        pending.extend((low, high, level - 2) for low, high in reversed(quarters))
+    return ranges
+
+
+def _rank_shard(shard: InventoryShard, requirement: CompiledRequirement, weights,
+                k: Optional[int], min_score: float) -> Tuple[np.ndarray, ComponentScores]:
+    return shard.store.partitions().search(requirement, weights, k, min_score)
+
+
+class ShardedInventory(ExtentBounds):
+    """An inventory split into geographic shards, searched shard by shard."""
+
+    def __init__(self, shards: List[InventoryShard], executor=None):
+        """
+        ``executor`` (a ``concurrent.futures`` executor) ranks shards in
+        parallel; without one they are ranked in turn.
+        """
+        self.shards = shards
+        self.executor = executor
+        for field in fields(ShardStats)[1:]:
+            setattr(self, field.name, np.array(
+                [getattr(shard.stats, field.name) for shard in shards], dtype=np.float64
+            ))
+
+    @classmethod
+    def from_store(cls, store: PropertyStore, shard_rows: int = DEFAULT_SHARD_ROWS,
+                   cell_degrees: float = DEFAULT_CELL_DEGREES,
+                   executor=None) -> 'ShardedInventory':
+        """Shard ``store`` into blocks of grid cells of at most ``shard_rows`` rows."""
+        keys = morton_keys(store.lat, store.lon, cell_degrees)
+        order = np.argsort(keys, kind='stable')
+        grid = GeoGrid(cell_degrees)
+        bits = 2 * max(grid.n_lat - 1, grid.n_lon - 1).bit_length()
+
+        shards = []
+        for start, end in _block_ranges(keys[order], shard_rows, bits):
+            rows = np.sort(order[start:end])
+            shard_store = store.take(rows)
+            shards.append(InventoryShard(ShardStats.of(shard_store), shard_store, rows))
+        return cls(shards, executor)
+
+    def __len__(self) -> int:
+        return sum(shard.stats.size for shard in self.shards)
+
+    def search(self, requirement: CompiledRequirement, weights, k: Optional[int],
+               min_score: float) -> Tuple[np.ndarray, np.ndarray, ComponentScores]:
+        """
+        Shard numbers and rows within those shards of the ``k`` best matches
+        reaching ``min_score``, and their scores, best first.
+
+        Shards are ranked in decreasing order of their bound, stopping once
+        no remaining shard can beat the k-th best match found; with an
+        executor every shard that can reach ``min_score`` is ranked at once.
+        Ties keep inventory order, exactly like ``top_k`` over a full scan.
+        """
+        bounds = self.upper_bounds(requirement, weights) + ROUNDING_SLACK
+        visit = np.argsort(-bounds, kind='stable')
+        visit = visit[bounds[visit] >= min_score]
+        rank = partial(_rank_shard, requirement=requirement, weights=weights,
+                       k=k, min_score=min_score)
+
+        if self.executor is not None:
+            ranked = list(zip(visit, self.executor.map(rank, [self.shards[i] for i in visit])))
+        else:
+            ranked = []
+            best = np.empty(0)
+            for index in visit:
+                if k and len(best) >= k and bounds[index] < best[k - 1]:
+                    break
+                rows, scores = rank(self.shards[index])
+                ranked.append((index, (rows, scores)))
+                if k:
+                    best = np.sort(np.concatenate([best, np.round(scores.overall, 2)]))[::-1][:k]
+
+        if not ranked:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, ComponentScores.concatenate([])
+
+        shard_numbers = np.concatenate([np.full(len(rows), index) for index, (rows, _) in ranked])
+        rows = np.concatenate([rows for _, (rows, _) in ranked])
+        scores = ComponentScores.concatenate([scores for _, (_, scores) in ranked])
+        inventory_rows = np.concatenate([
+            self.shards[index].rows[shard_rows] for index, (shard_rows, _) in ranked
+        ])
+
+        order = np.lexsort((inventory_rows, -np.round(scores.overall, 2)))
+        if k:
+            order = order[:k]
+        return shard_numbers[order], rows[order], scores.take(order)
+
+    def records(self, shard_numbers: np.ndarray, rows: np.ndarray) -> List[Dict]:
+        """Property dicts of ``rows`` of the given shards."""
+        return [
+            self.shards[number].store.record(row) for number, row in zip(shard_numbers, rows)
+        ]
+
+    def save(self, directory: str, generation: int = 0):
+        """
+        Write every shard and a manifest of their statistics to a new
+        ``directory``; the manifest is written last, so a directory can
+        only be opened once complete.
+        """
+        manifest_path = os.path.join(directory, MANIFEST)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(manifest_path):
+            raise FileExistsError(f'{directory} already holds a sharded inventory')
+
+        entries = []
+        for number, shard in enumerate(self.shards):
+            name = f'shard-{number:05d}'
+            path = os.path.join(directory, name)
+            write_snapshot(shard.store, path + '.snapshot', generation)
+            np.save(path + '.rows.npy', np.ascontiguousarray(shard.rows, dtype='<i8'))
+            entries.append({'name': name, **asdict(shard.stats)})
+
+        temporary = manifest_path + '.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'version': MANIFEST_VERSION, 'generation': generation,
+                       'shards': entries}, handle)
+        os.replace(temporary, manifest_path)
+
+    @classmethod
+    def open(cls, directory: str, executor=None) -> 'ShardedInventory':
+        """Sharded inventory saved in ``directory``; no shard is read yet."""
+        with open(os.path.join(directory, MANIFEST)) as handle:
+            manifest = json.load(handle)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f'{directory} has shard manifest version '
+                             f'{manifest.get("version")}, expected {MANIFEST_VERSION}')
+        shards = []
+        for entry in manifest['shards']:
+            path = os.path.join(directory, entry.pop('name'))
+            shards.append(InventoryShard(ShardStats(**entry), path=path))
+        return cls(shards, executor)
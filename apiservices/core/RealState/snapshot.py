@@ -0,0 +1,223 @@
+"""
+Binary snapshots of a ``PropertyStore``, loaded by memory-mapping.
+
+A snapshot holds the hot columns, the unit vectors and the id index of a
+store as fixed-width little-endian arrays, so loading one parses nothing:
+each array is a read-only view of a single ``mmap`` of the file. Every
+process that loads the same file (e.g. each gunicorn worker) shares one
+copy of it in the page cache instead of holding a private copy.
+
+Layout::
+
+    header        magic, format version, column count, row count, created at,
+                  inventory generation
+    column table  name, dtype, offset, size and CRC32 of each column
+    header CRC32  over the header and the column table
+    columns       each aligned to ALIGNMENT bytes
+
+The header checksum is checked on every load; the column checksums only
+with ``verify=True``, since that reads the whole file. Snapshots are
+written to a temporary file and renamed into place, so a reader never
+sees a partially written one.
+"""
+import os
+import struct
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.store import PropertyStore
+
+MAGIC = b'RSSTORE\x00'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+
+HEADER = struct.Struct('<8sIIQdQ')
+COLUMN = struct.Struct('<16s8sQQI4x')
+CHECKSUM = struct.Struct('<I')
+
+# Column name → on-disk dtype, in file order
+SNAPSHOT_COLUMNS = {
+    'ids': '<i8',
+    'lat': '<f8',
+    'lon': '<f8',
+    'price': '<f8',
+    'bedrooms': '<i2',
+    'bathrooms': '<i2',
+    'x': '<f8',
+    'y': '<f8',
+    'z': '<f8',
+    'id_order': '<i8',
+    'sorted_ids': '<i8',
+}
+
+
+@dataclass
+class SnapshotColumn:
+    """Where one column lives in the file."""
+    dtype: str
+    offset: int
+    nbytes: int
+    checksum: int
+
+
+@dataclass
+class SnapshotHeader:
+    """Decoded header and column table of a snapshot."""
+    format_version: int
+    rows: int
+    created_at: float
+    generation: int
+    columns: Dict[str, SnapshotColumn]
+    nbytes: int
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _store_arrays(store: PropertyStore) -> Dict[str, np.ndarray]:
+    id_order, sorted_ids = store.id_index()
+    arrays = {
+        'ids': store.ids, 'lat': store.lat, 'lon': store.lon, 'price': store.price,
+        'bedrooms': store.bedrooms, 'bathrooms': store.bathrooms,
+        'x': store.x, 'y': store.y, 'z': store.z,
+        'id_order': id_order, 'sorted_ids': sorted_ids,
+    }
+    return {
+        name: np.ascontiguousarray(arrays[name], dtype=dtype)
+        for name, dtype in SNAPSHOT_COLUMNS.items()
+    }
+
+
+def write_snapshot(store: PropertyStore, path: str, generation: int = 0,
+                   verify: bool = False) -> SnapshotHeader:
+    """
+    Write ``store`` to ``path``, atomically replacing any existing file.
+
+    ``generation`` records which inventory generation the store was read at.
+    With ``verify`` the new file is read back, checksums included, before it
+    replaces ``path``, so a bad write leaves the existing snapshot in place.
+    """
+    arrays = _store_arrays(store)
+
+    offset = _aligned(HEADER.size + COLUMN.size * len(arrays) + CHECKSUM.size)
+    columns = {}
+    for name, array in arrays.items():
+        columns[name] = SnapshotColumn(
+            dtype=SNAPSHOT_COLUMNS[name], offset=offset, nbytes=array.nbytes,
+            checksum=zlib.crc32(array.data),
+        )
+        offset = _aligned(offset + array.nbytes)
+
+    header = SnapshotHeader(FORMAT_VERSION, len(store), time.time(), generation, columns, offset)
+    head = HEADER.pack(MAGIC, FORMAT_VERSION, len(columns), header.rows, header.created_at,
+                       generation)
+    head += b''.join(
+        COLUMN.pack(name.encode(), column.dtype.encode(), column.offset, column.nbytes,
+                    column.checksum)
+        for name, column in columns.items()
+    )
+    head += CHECKSUM.pack(zlib.crc32(head))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(head)
+            for name, array in arrays.items():
+                handle.seek(columns[name].offset)
+                handle.write(array.data)
+            handle.truncate(header.nbytes)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.chmod(temporary, 0o644)
+        if verify:
+            map_snapshot(temporary, verify=True)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return header
+
+
+def _read_header(data: np.ndarray, path: str) -> SnapshotHeader:
+    if len(data) < HEADER.size:
+        raise ValueError(f'{path} is not a property snapshot')
+    magic, version, count, rows, created_at, generation = \
+        HEADER.unpack(data[:HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a property snapshot')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'{path} has snapshot format {version}, expected {FORMAT_VERSION}')
+
+    end = HEADER.size + COLUMN.size * count
+    if len(data) < end + CHECKSUM.size:
+        raise ValueError(f'{path} is truncated')
+    (checksum,) = CHECKSUM.unpack(data[end:end + CHECKSUM.size].tobytes())
+    if zlib.crc32(data[:end].tobytes()) != checksum:
+        raise ValueError(f'{path} has a corrupt header')
+
+    columns = {}
+    for position in range(HEADER.size, end, COLUMN.size):
+        name, dtype, offset, nbytes, column_checksum = \
+            COLUMN.unpack(data[position:position + COLUMN.size].tobytes())
+        columns[name.rstrip(b'\x00').decode()] = SnapshotColumn(
+            dtype.rstrip(b'\x00').decode(), offset, nbytes, column_checksum
+        )
+    return SnapshotHeader(version, rows, created_at, generation, columns, len(data))
+
+
+def read_header(path: str) -> SnapshotHeader:
+    """Header of the snapshot at ``path``, without mapping its columns."""
+    with open(path, 'rb') as handle:
+        head = handle.read(HEADER.size)
+        if len(head) == HEADER.size:
+            count = HEADER.unpack(head)[2]
+            head += handle.read(COLUMN.size * count + CHECKSUM.size)
+        size = os.fstat(handle.fileno()).st_size
+    header = _read_header(np.frombuffer(head, dtype=np.uint8), path)
+    header.nbytes = size
+    return header
+
+
+def map_snapshot(path: str, verify: bool = False) -> Tuple[SnapshotHeader, PropertyStore]:
+    """
+    Header of the snapshot at ``path`` and a ``PropertyStore`` whose columns
+    are read-only views of the mapped file.
+
+    Raises ValueError if the file is not a readable snapshot, or with
+    ``verify`` if any column fails its checksum.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header = _read_header(data, path)
+
+    arrays = {}
+    for name, dtype in SNAPSHOT_COLUMNS.items():
+        column = header.columns.get(name)
+        if column is None or column.dtype != dtype:
+            raise ValueError(f'{path} has no {dtype} column {name!r}')
+        if column.nbytes != header.rows * np.dtype(dtype).itemsize or \
+                column.offset + column.nbytes > len(data):
+            raise ValueError(f'{path} is truncated')
+        raw = data[column.offset:column.offset + column.nbytes]
+        if verify and zlib.crc32(raw) != column.checksum:
+            raise ValueError(f'{path} has a corrupt {name!r} column')
+        arrays[name] = raw.view(dtype)
+
+    return header, PropertyStore(
+        arrays['ids'], arrays['lat'], arrays['lon'], arrays['price'],
+        arrays['bedrooms'], arrays['bathrooms'],
+        vectors=(arrays['x'], arrays['y'], arrays['z']),
+        id_index=(arrays['id_order'], arrays['sorted_ids']),
+    )
+
+
+def load_snapshot(path: str, verify: bool = False) -> PropertyStore:
+    """``PropertyStore`` mapped from the snapshot at ``path`` (see ``map_snapshot``)."""
+    return map_snapshot(path, verify)[1]
@@ -0,0 +1,25 @@
+"""
+Pluggable inventory sources.
+
+``find_matches`` scores a ``PropertyStore`` or a list of property dicts
+held in memory, or an ``InventorySource`` that produces the inventory as
+a sequence of ``PropertyStore`` chunks. Chunks are scored one at a time
+and only the running best matches are kept, so memory is bounded by the
+chunk size however large the inventory is.
+"""
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+from apiservices.core.RealState.store import PropertyStore
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class InventorySource(ABC):
+    """An inventory read in chunks; subclasses implement ``chunks``."""
+
+    chunk_size = DEFAULT_CHUNK_SIZE
+
+    @abstractmethod
+    def chunks(self) -> Iterator[PropertyStore]:
+        """Consecutive chunks of the inventory, in inventory order."""
@@ -0,0 +1,181 @@
+"""
+Columnar property inventory for the matching engine.
+
+``PropertyStore`` parses and validates an inventory once, at load time,
+into typed contiguous arrays holding only the fields the matcher scores
+on (the "hot" columns). Everything else about a property (name, email,
+...) is kept apart in ``cold`` and is only touched when a matched row is
+turned back into a dict for the caller.
+"""
+import itertools
+import math
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from apiservices.core.RealState.geo_index import GeoIndex
+from apiservices.core.RealState.utils import unit_vectors
+
+if TYPE_CHECKING:
+    from apiservices.core.RealState.partitions import PartitionIndex
+
+HOT_FIELDS = ('id', 'lat', 'lon', 'price', 'bedrooms', 'bathrooms')
+VECTOR_COLUMNS = ('x', 'y', 'z')
+
+# Room counts are stored as int16
+MAX_ROOMS = np.iinfo(np.int16).max
+
+_serials = itertools.count()
+
+
+class PropertyStore:
+    """Typed, contiguous columns of a property inventory plus an id→row map."""
+
+    def __init__(self, ids, lat, lon, price, bedrooms, bathrooms,
+                 cold: Optional[List[Dict]] = None,
+                 vectors: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                 id_index: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        """
+        ``vectors`` (x, y, z) and ``id_index`` (id order, sorted ids) are
+        derived from the columns; pass them only when they were saved along
+        with the columns, as a snapshot does, to skip recomputing them.
+        """
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.price = np.ascontiguousarray(price, dtype=np.float64)
+        self.bedrooms = np.ascontiguousarray(bedrooms, dtype=np.int16)
+        self.bathrooms = np.ascontiguousarray(bathrooms, dtype=np.int16)
+        self.cold = cold
+        # Unit vectors for the distance component, computed once here instead
+        # of taking sines and cosines of every property on every query
+        if vectors is None:
+            vectors = unit_vectors(self.lat, self.lon)
+        self.x, self.y, self.z = (np.ascontiguousarray(v, dtype=np.float64) for v in vectors)
+        self._partitions = None
+        self._geo_index = None
+        # Distinct for every store made by this process, to key data derived from it
+        self.serial = next(_serials)
+
+        size = len(self.ids)
+        for name in HOT_FIELDS[1:] + VECTOR_COLUMNS:
+            column_size = len(getattr(self, name))
+            if column_size != size:
+                raise ValueError(f'Column {name!r} has {column_size} rows, expected {size}')
+        if cold is not None and len(cold) != size:
+            raise ValueError(f'Cold fields have {len(cold)} rows, expected {size}')
+
+        # id→row map as a sorted index: 16 bytes per row instead of a dict entry
+        if id_index is None:
+            order = np.argsort(self.ids, kind='stable')
+            sorted_ids = self.ids[order]
+            if size > 1 and (sorted_ids[1:] == sorted_ids[:-1]).any():
+                raise ValueError('Property ids must be unique')
+            id_index = (order, sorted_ids)
+        self._id_order, self._sorted_ids = id_index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'PropertyStore':
+        """Parse and validate property dicts (the ``MOCK_DATA.DATA`` shape)."""
+        ids, lat, lon, price, bedrooms, bathrooms, cold = [], [], [], [], [], [], []
+
+        for row, record in enumerate(records):
+            try:
+                ids.append(int(record['id']))
+                lat.append(_checked_float(record['lat'], -90.0, 90.0))
+                lon.append(_checked_float(record['lon'], -180.0, 180.0))
+                price.append(_checked_float(record['price'], 0.0, math.inf))
+                bedrooms.append(_checked_rooms(record['bedrooms']))
+                bathrooms.append(_checked_rooms(record['bathrooms']))
+            except (KeyError, ValueError, TypeError) as e:
+                raise ValueError(f'Invalid property at row {row}: {e!r}') from e
+            cold.append({k: v for k, v in record.items() if k not in HOT_FIELDS})
+
+        return cls(ids, lat, lon, price, bedrooms, bathrooms, cold=cold)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the hot columns, unit vectors and the id index."""
+        columns = ('ids',) + HOT_FIELDS[1:] + VECTOR_COLUMNS
+        return sum(getattr(self, name).nbytes for name in columns) + \
+            self._id_order.nbytes + self._sorted_ids.nbytes
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Hot columns in the layout expected by the vectorized engine."""
+        return {
+            'lat': self.lat,
+            'lon': self.lon,
+            'x': self.x,
+            'y': self.y,
+            'z': self.z,
+            'price': self.price,
+            'bedrooms': self.bedrooms,
+            'bathrooms': self.bathrooms,
+        }
+
+    def id_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The id→row map: rows in id order and the ids in that order."""
+        return self._id_order, self._sorted_ids
+
+    def geo_index(self) -> GeoIndex:
+        """Grid index over the property locations, built on first use."""
+        if self._geo_index is None:
+            self._geo_index = GeoIndex(self.lat, self.lon)
+        return self._geo_index
+
+    def partitions(self) -> 'PartitionIndex':
+        """Partition index used for pruned searches, built on first use."""
+        if self._partitions is None:
+            from apiservices.core.RealState.partitions import PartitionIndex
+            self._partitions = PartitionIndex(self)
+        return self._partitions
+
+    def take(self, rows) -> 'PropertyStore':
+        """New store holding only ``rows`` (a slice or an array of row numbers)."""
+        if isinstance(rows, slice):
+            cold = self.cold[rows] if self.cold is not None else None
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+            cold = [self.cold[row] for row in rows] if self.cold is not None else None
+        return PropertyStore(
+            self.ids[rows], self.lat[rows], self.lon[rows], self.price[rows],
+            self.bedrooms[rows], self.bathrooms[rows], cold=cold
+        )
+
+    def row_of(self, property_id: int) -> Optional[int]:
+        """Row holding ``property_id``, or None if it is not in the store."""
+        position = np.searchsorted(self._sorted_ids, property_id)
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == property_id:
+            return int(self._id_order[position])
+        return None
+
+    def record(self, row: int) -> Dict:
+        """Rebuild the property dict for ``row`` from its hot and cold fields."""
+        record = {'id': int(self.ids[row])}
+        if self.cold is not None:
+            record.update(self.cold[row])
+        record.update({
+            'bedrooms': int(self.bedrooms[row]),
+            'bathrooms': int(self.bathrooms[row]),
+            'lat': float(self.lat[row]),
+            'lon': float(self.lon[row]),
+            'price': float(self.price[row]),
+        })
+        return record
+
+
+def _checked_float(value, low: float, high: float) -> float:
+    number = float(value)
+    if not low <= number <= high:
+        raise ValueError(f'{value!r} is outside [{low}, {high}]')
+    return number
+
+
+def _checked_rooms(value) -> int:
+    rooms = int(value)
+    if not 0 <= rooms <= MAX_ROOMS:
+        raise ValueError(f'{value!r} is not a valid room count')
+    return rooms
@@ -1,4 +1,8 @@
-from math import cos, asin, sqrt
+from math import cos, asin, sin, sqrt
+
+import numpy as np
+
+EARTH_DIAMETER_MILES = 7917.512
 
 
 def distance(lat1, lon1, lat2, lon2):
@@ -6,4 +10,38 @@ def distance(lat1, lon1, lat2, lon2):
     a = 0.5 - cos((lat2 - lat1) * p) / 2 + cos(lat1 * p) * \
         cos(lat2 * p) * (1 - cos((lon2 - lon1) * p)) / 2
     # return 12742 * asin(sqrt(a)) # in kms
-    return 7917.512 * asin(sqrt(a))  # in miles
+    return EARTH_DIAMETER_MILES * asin(sqrt(a))  # in miles
+
+
+def unit_vectors(lat, lon):
+    """Points of the unit sphere at ``lat``/``lon`` degrees; arrays are fine."""
+    p = 0.017453292519943295
+    cos_lat = np.cos(lat * p)
+    return cos_lat * np.cos(lon * p), cos_lat * np.sin(lon * p), np.sin(lat * p)
+
+
+def unit_vector(lat: float, lon: float):
+    """Scalar ``unit_vectors``, with ``math`` instead of numpy's per-call overhead."""
+    p = 0.017453292519943295
+    cos_lat = cos(lat * p)
+    return cos_lat * cos(lon * p), cos_lat * sin(lon * p), sin(lat * p)
+
+
+def distance_from_vectors(x1, y1, z1, x2, y2, z2):
+    """
+    ``distance`` between two points given as precomputed ``unit_vectors``.
+
+    The haversine term equals a quarter of the squared chord between the
+    points, so no trigonometric call is needed per pair. Differencing the
+    coordinates keeps short distances accurate, where ``1 - cos`` forms
+    lose most of their digits.
+    """
+    a = ((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2) / 4
+    # Rounding can push a just above 1 for antipodal points
+    return EARTH_DIAMETER_MILES * asin(sqrt(min(a, 1.0)))  # in miles
+
+
+def distances_from_vectors(x1, y1, z1, x2, y2, z2):
+    """Vectorized form of ``distance_from_vectors``; any argument may be an array."""
+    a = ((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2) / 4
+    return EARTH_DIAMETER_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))  # in miles
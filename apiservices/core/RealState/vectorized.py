@@ -0,0 +1,178 @@
+"""
+Vectorized scoring engine for the property matching algorithm.
+
+Scores a whole inventory against a single requirement with NumPy array
+operations instead of walking it one dict at a time. Every component
+follows the same rules as the scalar methods on ``PropertyMatcher``;
+raw scores agree with them to within ``SCORE_TOLERANCE`` (the order of
+floating point operations is the only difference), so the two-decimal
+scores reported to callers only differ when a raw score lands within
+that tolerance of a rounding boundary.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from apiservices.core.RealState.geo_index import GeoIndex
+from apiservices.core.RealState.requirement import CompiledRequirement, RangeScore, RoomScore
+from apiservices.core.RealState.store import VECTOR_COLUMNS
+from apiservices.core.RealState.utils import distances_from_vectors, unit_vectors
+
+SCORE_TOLERANCE = 1e-9
+
+
+@dataclass
+class ComponentScores:
+    """Component scores and weighted total, one entry per property."""
+    distance: np.ndarray
+    budget: np.ndarray
+    bedrooms: np.ndarray
+    bathrooms: np.ndarray
+    overall: np.ndarray
+
+    def take(self, rows: np.ndarray) -> 'ComponentScores':
+        """Scores of ``rows`` only."""
+        return ComponentScores(
+            distance=self.distance[rows],
+            budget=self.budget[rows],
+            bedrooms=self.bedrooms[rows],
+            bathrooms=self.bathrooms[rows],
+            overall=self.overall[rows],
+        )
+
+    @classmethod
+    def concatenate(cls, parts: List['ComponentScores']) -> 'ComponentScores':
+        """Scores of every row of ``parts``, in order."""
+        return cls(*(
+            np.concatenate([getattr(part, name) for part in parts]) if parts else np.empty(0)
+            for name in ('distance', 'budget', 'bedrooms', 'bathrooms', 'overall')
+        ))
+
+
+def _parse_column(values: List, parse) -> np.ndarray:
+    column = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            column[i] = parse(value)
+        except (ValueError, TypeError):
+            column[i] = np.nan
+    return column
+
+
+def property_columns(property_list: List[Dict]) -> Dict[str, np.ndarray]:
+    """Parse property dicts into float columns; unparseable values become NaN."""
+    lat = _parse_column([p.get('lat') for p in property_list], float)
+    lon = _parse_column([p.get('lon') for p in property_list], float)
+    x, y, z = unit_vectors(lat, lon)
+    return {
+        'lat': lat,
+        'lon': lon,
+        'x': x,
+        'y': y,
+        'z': z,
+        'price': _parse_column([p.get('price') for p in property_list], float),
+        'bedrooms': _parse_column([p.get('bedrooms') for p in property_list], int),
+        'bathrooms': _parse_column([p.get('bathrooms') for p in property_list], int),
+    }
+
+
+def distance_scores(columns: Dict[str, np.ndarray], requirement: CompiledRequirement,
+                    geo_index: Optional[GeoIndex] = None) -> np.ndarray:
+    """
+    Vectorized ``PropertyMatcher.calculate_distance_match``.
+
+    With a ``geo_index`` over the same rows, the haversine only runs for rows
+    in cells within ``distance_max``; every other row scores 0 directly.
+    """
+    if requirement.lat is None:
+        return np.zeros(columns['lat'].shape)
+
+    if geo_index is not None:
+        rows = geo_index.radius_search(requirement.lat, requirement.lon, requirement.distance_max)
+        scores = np.zeros(columns['lat'].shape)
+        scores[rows] = distance_scores(
+            {name: columns[name][rows] for name in ('lat',) + VECTOR_COLUMNS}, requirement
+        )
+        return scores
+
+    distance_miles = distances_from_vectors(
+        requirement.x, requirement.y, requirement.z, columns['x'], columns['y'], columns['z']
+    )
+
+    scores = np.maximum(
+        requirement.distance_top -
+        (distance_miles - requirement.distance_perfect) * requirement.distance_slope,
+        requirement.distance_floor
+    )
+
+    return np.where(
+        distance_miles <= requirement.distance_perfect, 100.0,
+        np.where(distance_miles <= requirement.distance_max, scores, 0.0)
+    )
+
+
+def range_scores(values: np.ndarray, range_score: Optional[RangeScore]) -> np.ndarray:
+    """Vectorized ``RangeScore.score``; a missing range scores 0 everywhere."""
+    if range_score is None:
+        return np.zeros(values.shape)
+
+    return range_score.scores(values)
+
+
+def room_scores(values: np.ndarray, room_score: Optional[RoomScore]) -> np.ndarray:
+    """Vectorized ``RoomScore.score``: one gather from the precomputed table."""
+    if room_score is None:
+        return np.zeros(values.shape)
+
+    # NaN compares False, so unparseable counts take the range arithmetic (0)
+    inside = (values >= 0) & (values < len(room_score.table))
+    if inside.all():
+        return room_score.table[values.astype(np.intp)]
+
+    scores = range_scores(values, room_score)
+    scores[inside] = room_score.table[values[inside].astype(np.intp)]
+    return scores
+
+
+def score_columns(columns: Dict[str, np.ndarray], requirement: CompiledRequirement,
+                  weights, geo_index: Optional[GeoIndex] = None) -> ComponentScores:
+    """Score every row of ``columns`` and combine the components with ``weights``."""
+    distance = distance_scores(columns, requirement, geo_index)
+    budget = range_scores(columns['price'], requirement.budget)
+    bedrooms = room_scores(columns['bedrooms'], requirement.bedrooms)
+    bathrooms = room_scores(columns['bathrooms'], requirement.bathrooms)
+
+    overall = (
+        distance * weights.distance +
+        budget * weights.budget +
+        bedrooms * weights.bedrooms +
+        bathrooms * weights.bathrooms
+    )
+
+    return ComponentScores(
+        distance=distance,
+        budget=budget,
+        bedrooms=bedrooms,
+        bathrooms=bathrooms,
+        overall=overall,
+    )
+
+
+def top_k(scores: np.ndarray, k: Optional[int], min_score: float) -> np.ndarray:
+    """
+    Rows holding the ``k`` best ``scores`` that reach ``min_score``, best first.
+
+    Uses a partial selection to find the k-th best score, so the cost is
+    O(n) plus O(k log k) to order the survivors instead of sorting every
+    qualifying row. Ties keep inventory order, as a stable sort would.
+    A falsy ``k`` returns every qualifying row.
+    """
+    floor = min_score
+    if k and len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        floor = max(floor, kth)
+
+    candidates = np.flatnonzero(scores >= floor)
+    ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return ranked[:k] if k else ranked
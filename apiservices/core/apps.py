@@ -1,5 +1,34 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
-    name = 'core'
+    name = 'apiservices.core'
+
+    def ready(self):
+        # Imported here: the inventory module needs the models to be loaded
+        from django.db.models.signals import post_delete, post_save
+
+        from apiservices.core import generation, inventory, match_updates
+        from apiservices.core.models import Property, PropertyRequirement
+        from apiservices.core.signals import inventory_changed
+
+        post_save.connect(generation.inventory_modified, sender=Property,
+                          dispatch_uid='generation_save')
+        post_delete.connect(generation.inventory_modified, sender=Property,
+                            dispatch_uid='generation_delete')
+        inventory_changed.connect(generation.inventory_modified,
+                                  dispatch_uid='generation_load')
+        post_save.connect(generation.requirements_modified, sender=PropertyRequirement,
+                          dispatch_uid='requirement_generation_save')
+        post_delete.connect(generation.requirements_modified, sender=PropertyRequirement,
+                            dispatch_uid='requirement_generation_delete')
+        if settings.INCREMENTAL_MATCHING:
+            post_save.connect(match_updates.property_saved, sender=Property,
+                              dispatch_uid='property_matches')
+            post_save.connect(match_updates.requirement_saved, sender=PropertyRequirement,
+                              dispatch_uid='requirement_matches')
+            inventory_changed.connect(match_updates.inventory_loaded,
+                                      dispatch_uid='loaded_property_matches')
+        if settings.INVENTORY_WARMUP:
+            inventory.warm_up()
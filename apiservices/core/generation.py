@@ -0,0 +1,113 @@
+"""
+Generations: counters bumped after every change to a table.
+
+Anything derived from the inventory (cached results, a loaded store, a
+snapshot) records the generation it was built from and is stale once the
+current generation differs; the ``RequirementIndex`` kept for incremental
+matching does the same with the generation of the requirements. Each
+counter is a row of ``InventoryGeneration``; workers read a copy from the
+shared cache, written while the counter row is locked so copies are set
+in increment order. The copy expires after ``GENERATION_TIMEOUT``
+seconds, which bounds how long a bump made during a cache outage can go
+unseen. Each worker reuses its last reading for
+``INVENTORY_GENERATION_POLL`` seconds, so checking a generation on every
+request costs no round trip.
+
+Saves and deletes of ``Property`` rows and ``inventory_changed`` bump the
+inventory generation, and saves and deletes of ``PropertyRequirement``
+rows the requirement generation, once the transaction commits, once per
+transaction however many rows changed. ``QuerySet.update()`` sends no
+signal; call ``bump_generation()`` (or ``requirements.bump()``) after
+using it. Inside ``Generation.deferred()`` blocks the bump waits for the
+outermost block to exit, so a command committing many transactions bumps
+once.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from apiservices.core.models import InventoryGeneration
+from apiservices.core.shared_cache import shared_cache
+
+GENERATION_KEY = 'inventory:generation'
+REQUIREMENT_GENERATION_KEY = 'requirements:generation'
+GENERATION_TIMEOUT = 60
+
+
+class Generation:
+    """One counter: its ``InventoryGeneration`` row and shared cache copy."""
+
+    def __init__(self, key: str, pk: int):
+        self.key = key
+        self.pk = pk
+        # (generation, monotonic time read) last seen by this process
+        self.last_read = None
+        self._pending = threading.local()
+
+    def _stored(self) -> int:
+        row, _ = InventoryGeneration.objects.get_or_create(pk=self.pk)
+        return row.value
+
+    def current(self) -> int:
+        """The current generation, from the shared cache when it has it."""
+        last_read = self.last_read
+        if last_read is not None and \
+                time.monotonic() - last_read[1] < settings.INVENTORY_GENERATION_POLL:
+            return last_read[0]
+
+        value = shared_cache.get(self.key)
+        if value is None:
+            value = self._stored()
+            shared_cache.add(self.key, value, timeout=GENERATION_TIMEOUT)
+        self.last_read = (value, time.monotonic())
+        return value
+
+    def bump(self) -> int:
+        """Advance the generation; returns the new value."""
+        self._stored()
+        with transaction.atomic():
+            InventoryGeneration.objects.filter(pk=self.pk).update(value=F('value') + 1)
+            value = InventoryGeneration.objects.values_list('value', flat=True).get(pk=self.pk)
+            # Still holding the row lock: concurrent bumps set the copy in order
+            shared_cache.set(self.key, value, timeout=GENERATION_TIMEOUT)
+        self.last_read = (value, time.monotonic())
+        return value
+
+    def pending(self) -> bool:
+        """Whether this thread changed rows that have not bumped the generation yet."""
+        return getattr(self._pending, 'changed', False)
+
+    def _bump_pending(self):
+        if self.pending() and not getattr(self._pending, 'deferred', 0):
+            self._pending.changed = False
+            self.bump()
+
+    @contextmanager
+    def deferred(self):
+        """Hold back this thread's bumps until the outermost block exits, then bump once."""
+        self._pending.deferred = getattr(self._pending, 'deferred', 0) + 1
+        try:
+            yield
+        finally:
+            self._pending.deferred -= 1
+            transaction.on_commit(self._bump_pending)
+
+    def modified(self, sender, **kwargs):
+        """Receiver for any change to the table: bump after commit."""
+        # Every change registers a callback and the first one to run bumps,
+        # so a transaction saving many rows bumps once
+        self._pending.changed = True
+        transaction.on_commit(self._bump_pending)
+
+
+inventory = Generation(GENERATION_KEY, pk=1)
+requirements = Generation(REQUIREMENT_GENERATION_KEY, pk=2)
+
+current_generation = inventory.current
+bump_generation = inventory.bump
+inventory_modified = inventory.modified
+requirements_modified = requirements.modified
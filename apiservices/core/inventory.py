@@ -0,0 +1,348 @@
+"""
+Property inventories backed by the database.
+
+Rows are read with ``values_list`` as plain tuples and turned into typed
+``PropertyStore`` columns, converting every ``Decimal`` to a float once;
+no model instance is ever built. ``PrefilteredSource`` additionally pushes
+a condition implied by ``min_match_percentage`` into SQL, so only rows
+that can match a requirement are read.
+
+``get_inventory`` returns the inventory selected by the
+``INVENTORY_SOURCE`` setting, loaded on first use and kept until the
+inventory generation (or the snapshot file) changes. The newer inventory
+is then read by a background thread while requests keep searching the
+loaded one, so no request waits for a reload.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import reduce
+from itertools import combinations, islice
+from math import ceil, floor
+from operator import and_, or_
+from typing import Hashable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+from apiservices.core.generation import current_generation
+from apiservices.core.models import Property
+from apiservices.core.RealState.geo_index import bounding_box
+from apiservices.core.RealState.partitions import ROUNDING_SLACK
+from apiservices.core.RealState.requirement import CompiledRequirement, RangeScore
+from apiservices.core.RealState.snapshot import map_snapshot
+from apiservices.core.RealState.sources import DEFAULT_CHUNK_SIZE, InventorySource
+from apiservices.core.RealState.store import PropertyStore
+
+PROPERTY_FIELDS = ('id', 'latitude', 'longitude', 'price', 'bedrooms', 'bathrooms')
+
+INVENTORY_SOURCES = ('mock', 'database', 'snapshot')
+
+logger = logging.getLogger(__name__)
+
+_inventory: Optional['LoadedInventory'] = None
+_inventory_lock = threading.Lock()
+
+# Held while a thread reloads a stale inventory, so only one does
+_reload_lock = threading.Lock()
+_reloader: Optional[threading.Thread] = None
+
+# (inventory generation, active properties) last counted by this process
+_active_count = None
+
+
+def _row_columns(rows: Sequence[Sequence]) -> List[np.ndarray]:
+    columns = list(zip(*rows)) if rows else [()] * len(PROPERTY_FIELDS)
+    return [np.array(column, dtype=np.float64) for column in columns]
+
+
+def store_from_rows(rows: Sequence[Sequence]) -> PropertyStore:
+    """``PropertyStore`` from ``values_list(*PROPERTY_FIELDS)`` rows."""
+    return PropertyStore(*_row_columns(rows))
+
+
+class DatabaseSource(InventorySource):
+    """Active ``Property`` rows streamed from the database in id order."""
+
+    def __init__(self, queryset: Optional[QuerySet] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if queryset is None:
+            queryset = Property.objects.filter(is_active=True)
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+
+    def rows(self) -> Iterator[tuple]:
+        """Property tuples, fetched ``chunk_size`` per database round trip."""
+        return self.queryset.order_by('id').values_list(*PROPERTY_FIELDS) \
+            .iterator(chunk_size=self.chunk_size)
+
+    def column_chunks(self) -> Iterator[List[np.ndarray]]:
+        """Columns of ``chunk_size`` rows at a time, in ``PROPERTY_FIELDS`` order."""
+        rows = self.rows()
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield _row_columns(chunk)
+
+    def chunks(self) -> Iterator[PropertyStore]:
+        for columns in self.column_chunks():
+            yield PropertyStore(*columns)
+
+    def store(self) -> PropertyStore:
+        """
+        Every row in one ``PropertyStore``. Only a chunk of rows is held as
+        tuples at a time; the columns are joined once all are read.
+        """
+        parts = list(zip(*self.column_chunks()))
+        if not parts:
+            return store_from_rows([])
+        return PropertyStore(*(np.concatenate(column) for column in parts))
+
+
+def prefilter(requirement: CompiledRequirement, weights) -> Optional[Q]:
+    """
+    SQL condition every property scoring ``min_match_percentage`` satisfies,
+    or None when it would not exclude anything.
+
+    A component only scores above 0 inside its support (the bounding box of
+    ``distance_max`` for distance, the scoring range for budget and rooms),
+    so a property can only reach the threshold if it lies inside the
+    supports of a set of components whose weights add up to it. The
+    condition is the disjunction, over the smallest such sets, of the
+    conjunction of their supports; each support is a range lookup on an
+    indexed column.
+    """
+    min_score = requirement.thresholds.min_match_percentage
+    if min_score <= ROUNDING_SLACK:
+        return None
+
+    supports = [
+        (weights.distance, _location_support(requirement)),
+        (weights.budget, _range_support('price', requirement.budget)),
+        (weights.bedrooms, _range_support('bedrooms', requirement.bedrooms)),
+        (weights.bathrooms, _range_support('bathrooms', requirement.bathrooms)),
+    ]
+    usable = [(weight, q) for weight, q in supports if q is not None and weight > 0]
+
+    minimal = []
+    for size in range(len(usable) + 1):
+        for subset in combinations(range(len(usable)), size):
+            reaches = sum(usable[i][0] for i in subset) * 100 + ROUNDING_SLACK >= min_score
+            if reaches and not any(set(smaller) <= set(subset) for smaller in minimal):
+                minimal.append(subset)
+
+    if () in minimal:
+        return None
+    if not minimal:
+        # Nothing can reach the threshold
+        return Q(pk__in=[])
+    return reduce(or_, (reduce(and_, (usable[i][1] for i in subset)) for subset in minimal))
+
+
+def _location_support(requirement: CompiledRequirement) -> Optional[Q]:
+    if requirement.lat is None:
+        return None
+    lat_min, lat_max, lon_ranges = bounding_box(
+        requirement.lat, requirement.lon, requirement.distance_max
+    )
+    longitude = reduce(or_, (
+        Q(longitude__gte=lon_min, longitude__lte=lon_max) for lon_min, lon_max in lon_ranges
+    ))
+    # Coordinates outside the usual ranges are rare but still scored: keep them
+    return (Q(latitude__gte=lat_min, latitude__lte=lat_max) & longitude) | \
+        Q(latitude__lt=-90) | Q(latitude__gt=90) | \
+        Q(longitude__lt=-180) | Q(longitude__gt=180)
+
+
+def _range_support(field: str, range_score: Optional[RangeScore]) -> Optional[Q]:
+    if range_score is None:
+        return None
+    low, high = (float(edge) for edge in range_score.support())
+    if field != 'price':
+        low, high = ceil(low), floor(high)
+    return Q(**{f'{field}__gte': low, f'{field}__lte': high})
+
+
+class PrefilteredSource(DatabaseSource):
+    """
+    ``DatabaseSource`` reading only the rows that can match ``requirement``.
+
+    Falls back to reading every row when the prefilter would keep more than
+    ``max_fraction`` of the table, where a plain scan is cheaper than
+    reading through the indexes. The table size is ``size`` if given, else
+    ``active_property_count()`` for the default queryset; only the filtered
+    rows are counted, and no further than the cap.
+    """
+
+    def __init__(self, requirement: CompiledRequirement, weights,
+                 queryset: Optional[QuerySet] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_fraction: float = 0.5, size: Optional[int] = None):
+        super().__init__(queryset, chunk_size)
+        self.condition = prefilter(requirement, weights)
+        self.max_fraction = max_fraction
+        self.size = size
+        self.custom_queryset = queryset is not None
+
+    def _size(self) -> int:
+        if self.size is not None:
+            return self.size
+        if self.custom_queryset:
+            return self.queryset.count()
+        return active_property_count()
+
+    def is_selective(self) -> bool:
+        """Whether the prefilter keeps at most ``max_fraction`` of the rows."""
+        if self.condition is None:
+            return False
+        cap = int(self._size() * self.max_fraction)
+        return self.queryset.filter(self.condition)[:cap + 1].count() <= cap
+
+    def rows(self) -> Iterator[tuple]:
+        if self.is_selective():
+            return self.queryset.filter(self.condition).order_by('id') \
+                .values_list(*PROPERTY_FIELDS).iterator(chunk_size=self.chunk_size)
+        return super().rows()
+
+
+@dataclass
+class LoadedInventory:
+    """An inventory held by this process and what it was loaded from."""
+    source: str
+    store: PropertyStore
+    # Inventory generation the store reflects
+    version: int
+    # Changes when the source has something newer to load
+    stamp: Hashable
+
+
+def _stamp(source: str) -> Hashable:
+    if source == 'database':
+        return current_generation()
+    if source == 'snapshot':
+        # build_snapshot replaces the file, so a new inode means a new snapshot
+        try:
+            stat = os.stat(settings.INVENTORY_SNAPSHOT_PATH)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    return None
+
+
+def load_inventory(source: Optional[str] = None) -> LoadedInventory:
+    """
+    Read the inventory named by ``source`` (default: the ``INVENTORY_SOURCE``
+    setting): the bundled mock listings, the active ``Property`` rows, or
+    the snapshot at ``INVENTORY_SNAPSHOT_PATH``.
+    """
+    source = source or settings.INVENTORY_SOURCE
+    # Taken before reading, so a change made meanwhile triggers another load
+    stamp = _stamp(source)
+    if source == 'database':
+        store = DatabaseSource().store()
+        return LoadedInventory(source, store, stamp, stamp)
+    if source == 'snapshot':
+        header, store = map_snapshot(settings.INVENTORY_SNAPSHOT_PATH)
+        return LoadedInventory(source, store, header.generation, stamp)
+    if source == 'mock':
+        # Only this source imports the mock data module
+        from apiservices.core.RealState.driver import default_store
+        return LoadedInventory(source, default_store(), 0, stamp)
+    raise ImproperlyConfigured(
+        f'INVENTORY_SOURCE must be one of {", ".join(INVENTORY_SOURCES)}, not {source!r}'
+    )
+
+
+def active_property_count() -> int:
+    """
+    Number of active properties: the size of the loaded database inventory
+    while it is current, otherwise counted once per inventory generation.
+    """
+    global _active_count
+    generation = current_generation()
+    inventory = _inventory
+    if inventory is not None and inventory.source == 'database' and \
+            inventory.version == generation:
+        return len(inventory.store)
+    counted = _active_count
+    if counted is None or counted[0] != generation:
+        counted = _active_count = (generation, Property.objects.filter(is_active=True).count())
+    return counted[1]
+
+
+def current_inventory() -> LoadedInventory:
+    """
+    The configured inventory, loaded by the first caller in this process.
+    Once the database's inventory generation or the snapshot file changes,
+    the loaded inventory is still returned while a background thread reads
+    the new one, which replaces it when complete.
+    """
+    global _inventory
+    source = settings.INVENTORY_SOURCE
+    inventory = _inventory
+    if inventory is None or inventory.source != source:
+        with _inventory_lock:
+            inventory = _inventory
+            if inventory is None or inventory.source != source:
+                inventory = _inventory = load_inventory(source)
+    elif inventory.stamp != _stamp(source):
+        _start_reload(inventory)
+    return inventory
+
+
+def _start_reload(stale: LoadedInventory):
+    global _reloader
+    if not _reload_lock.acquire(blocking=False):
+        # Another thread is already reading the new inventory
+        return
+    try:
+        _reloader = threading.Thread(target=_reload, args=(stale,), name='inventory-reload',
+                                     daemon=True)
+        _reloader.start()
+    except BaseException:
+        _reload_lock.release()
+        raise
+
+
+def _reload(stale: LoadedInventory):
+    """Replace ``stale`` with a fresh load, unless it was replaced or reset meanwhile."""
+    global _inventory
+    try:
+        if stale.stamp == _stamp(stale.source):
+            return
+        loaded = load_inventory(stale.source)
+        with _inventory_lock:
+            if _inventory is stale:
+                _inventory = loaded
+    except Exception:
+        # The stale inventory stays in use; the next access tries again
+        logger.exception('Reloading the %s inventory failed', stale.source)
+    finally:
+        # This thread's database connection is never reused
+        connections.close_all()
+        _reload_lock.release()
+
+
+def get_inventory() -> PropertyStore:
+    """The store of ``current_inventory()``."""
+    return current_inventory().store
+
+
+def reset_inventory(**kwargs):
+    """Drop the loaded inventory (and its count) so the next access reads it again."""
+    global _inventory, _active_count
+    with _inventory_lock:
+        _inventory = None
+        _active_count = None
+
+
+def warm_up() -> PropertyStore:
+    """Load the configured inventory and build its indexes ahead of the first request."""
+    inventory = get_inventory()
+    inventory.geo_index()
+    inventory.partitions()
+    return inventory
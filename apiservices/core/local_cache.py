@@ -0,0 +1,106 @@
+"""
+Per-process LRU cache bounded by bytes and age.
+
+``LocalCache`` keeps the most recently used entries of one worker in
+memory, evicting the least recently used ones once the sizes given for
+the entries add up to more than ``max_bytes``, and dropping entries older
+than ``timeout`` seconds when they are next read. A cache given a
+``version`` is emptied whenever it is asked for a different one, so
+entries derived from an older inventory are never returned.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Hashable, Optional
+
+# Rough per-entry cost of the dict node, key tuple and bookkeeping
+ENTRY_OVERHEAD = 200
+
+
+@dataclass
+class LocalCacheStats:
+    """Counters and current size of a ``LocalCache``."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+class LocalCache:
+    """Thread-safe LRU mapping limited to ``max_bytes`` of entries."""
+
+    def __init__(self, max_bytes: int, timeout: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.version = None
+        self._entries = OrderedDict()
+        self._stats = LocalCacheStats()
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self._entries.clear()
+        self._stats.entries = self._stats.bytes = 0
+
+    def check_version(self, version: Hashable):
+        """Empty the cache if its entries were made for another ``version``."""
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    if self._entries:
+                        self._stats.invalidations += 1
+                    self._clear()
+                    self.version = version
+
+    def get(self, key: Hashable, default=None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return default
+            value, nbytes, expires = entry
+            if expires is not None and time.monotonic() >= expires:
+                self._remove(key)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def fits(self, nbytes: int) -> bool:
+        """Whether an entry of ``nbytes`` would be stored at all."""
+        return nbytes + ENTRY_OVERHEAD <= self.max_bytes
+
+    def set(self, key: Hashable, value, nbytes: int):
+        """Store ``value``, accounted as ``nbytes`` plus the entry overhead."""
+        if not self.fits(nbytes):
+            return
+        nbytes += ENTRY_OVERHEAD
+        expires = time.monotonic() + self.timeout if self.timeout else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, expires)
+            self._stats.entries += 1
+            self._stats.bytes += nbytes
+            while self._stats.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, nbytes, _ = self._entries.pop(key)
+        self._stats.entries -= 1
+        self._stats.bytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Current counters, for monitoring."""
+        with self._lock:
+            return asdict(self._stats)
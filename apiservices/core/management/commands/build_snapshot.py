@@ -0,0 +1,38 @@
+"""
+Write the active properties to a binary snapshot that workers memory-map.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apiservices.core.generation import current_generation
+from apiservices.core.matching import active_property_store
+from apiservices.core.RealState.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the active properties to a memory-mappable snapshot file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot file to write (replaced atomically)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.monotonic()
+
+        # Read first: a change made while the table is read makes the
+        # snapshot look older than it is, never newer
+        generation = current_generation()
+        store = active_property_store()
+        loaded = time.monotonic()
+        try:
+            # Read back once, checksums included, before workers can pick it up
+            header = write_snapshot(store, path, generation, verify=True)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot write snapshot {path}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {header.rows} properties of generation {generation} '
+            f'({header.nbytes / 2 ** 20:.1f} MiB) to {path}: '
+            f'{loaded - started:.1f}s reading, {time.monotonic() - loaded:.1f}s writing'
+        ))
@@ -0,0 +1,203 @@
+"""
+Stream a CSV or JSONL listing feed into the ``Property`` table.
+
+Each batch is written in its own transaction and announced with
+``inventory_changed`` once it commits, naming the rows it wrote, so only
+counters are kept across batches and memory does not grow with the feed.
+The inventory generation is bumped once, when the whole feed is loaded,
+so workers reload their inventory once per command rather than per batch.
+"""
+import csv
+import json
+import time
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+
+from apiservices.core import generation
+from apiservices.core.models import Property
+from apiservices.core.signals import inventory_changed
+
+# Input columns accepted for each model field, in order of preference
+# (``lat``/``lon`` is the MOCK_DATA shape)
+FIELD_ALIASES = {
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon'),
+    'price': ('price',),
+    'bedrooms': ('bedrooms',),
+    'bathrooms': ('bathrooms',),
+}
+
+# Coordinates must also be on the globe, as the matcher expects
+GEO_RANGES = {'latitude': (-90.0, 90.0), 'longitude': (-180.0, 180.0)}
+
+UPDATE_FIELDS = ['latitude', 'longitude', 'price', 'bedrooms', 'bathrooms', 'is_active',
+                 'updated_at']
+
+# Invalid rows reported individually before only counting them
+MAX_REPORTED_ERRORS = 20
+
+
+def field_ranges() -> Dict[str, Tuple[float, float]]:
+    """Closed value range of every loaded field, from the model's validators and digits."""
+    ranges = {}
+    for name in FIELD_ALIASES:
+        field = Property._meta.get_field(name)
+        low, high = -np.inf, np.inf
+        if getattr(field, 'max_digits', None) is not None:
+            high = 10.0 ** (field.max_digits - field.decimal_places) - 10.0 ** -field.decimal_places
+            low = -high
+        for validator in field.validators:
+            if isinstance(validator, MinValueValidator):
+                low = max(low, float(validator.limit_value))
+            elif isinstance(validator, MaxValueValidator):
+                high = min(high, float(validator.limit_value))
+        if name in GEO_RANGES:
+            low, high = max(low, GEO_RANGES[name][0]), min(high, GEO_RANGES[name][1])
+        ranges[name] = (low, high)
+    return ranges
+
+
+def read_csv(handle) -> Iterator[Dict]:
+    return csv.DictReader(handle)
+
+
+def read_jsonl(handle) -> Iterator[Dict]:
+    for line in handle:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = 'Load properties from a CSV or JSONL file, upserting by external id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV file with a header row, or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--external-id-field', default='external_id',
+                            help='Input column holding the external id used for upserts')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows validated and written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        self.ranges = field_ranges()
+        self.id_field = options['external_id_field']
+        self.errors = 0
+        started = time.monotonic()
+        rows = written = 0
+
+        try:
+            handle = open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+        with handle, generation.inventory.deferred():
+            records = read_csv(handle) if file_format == 'csv' else read_jsonl(handle)
+            numbered = enumerate(records, start=1)
+            while True:
+                try:
+                    batch = list(islice(numbered, options['batch_size']))
+                except (ValueError, csv.Error) as e:
+                    raise CommandError(f'Cannot parse {path} after row {rows}: {e}')
+                if not batch:
+                    break
+                rows += len(batch)
+                written += self._load(batch)
+                elapsed = max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'{rows} rows read, {written} written, '
+                                  f'{self.errors} invalid, {rows / elapsed:.0f} rows/s')
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {written} of {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s); '
+            f'{self.errors} invalid rows skipped'
+        ))
+
+    def _load(self, batch: List[Tuple[int, Dict]]) -> int:
+        """Validate a batch and write its valid rows in one transaction."""
+        valid = self._validate(batch)
+
+        # Upserts by external id; the last row wins when an id repeats in a batch
+        keyed, unkeyed = {}, []
+        for record, values in valid:
+            external_id = record.get(self.id_field)
+            listing = Property(
+                external_id=str(external_id) if external_id not in (None, '') else None,
+                is_active=True, **values
+            )
+            if listing.external_id is None:
+                unkeyed.append(listing)
+            else:
+                keyed[listing.external_id] = listing
+
+        with transaction.atomic():
+            if keyed:
+                Property.objects.bulk_create(
+                    list(keyed.values()), update_conflicts=True,
+                    unique_fields=['external_id'], update_fields=UPDATE_FIELDS,
+                )
+            Property.objects.bulk_create(unkeyed)
+            written_ids = list(
+                Property.objects.filter(external_id__in=list(keyed))
+                .values_list('id', flat=True)
+            )
+            written_ids.extend(listing.pk for listing in unkeyed)
+            if written_ids:
+                # Receivers defer their work to the commit of this batch
+                inventory_changed.send(sender=Property, property_ids=written_ids)
+        return len(keyed) + len(unkeyed)
+
+    def _validate(self, batch: List[Tuple[int, Dict]]) -> List[Tuple[Dict, Dict]]:
+        """Rows of ``batch`` within the model's ranges, as (record, field values)."""
+        columns = {}
+        for name, aliases in FIELD_ALIASES.items():
+            column = np.full(len(batch), np.nan)
+            for i, (_, record) in enumerate(batch):
+                value = next((record[key] for key in aliases if key in record), None)
+                try:
+                    column[i] = float(value)
+                except (TypeError, ValueError):
+                    pass
+            columns[name] = column
+
+        ok = np.ones(len(batch), dtype=bool)
+        for name, column in columns.items():
+            low, high = self.ranges[name]
+            # NaN (missing or unparseable) fails both comparisons
+            ok &= (column >= low) & (column <= high)
+            if isinstance(Property._meta.get_field(name), models.IntegerField):
+                ok &= column == np.floor(column)
+
+        for i in np.flatnonzero(~ok):
+            self.errors += 1
+            if self.errors <= MAX_REPORTED_ERRORS:
+                line, record = batch[i]
+                self.stderr.write(f'Row {line}: invalid property {record!r}')
+
+        return [
+            (batch[i][1], {
+                'latitude': _decimal(columns['latitude'][i], 'latitude'),
+                'longitude': _decimal(columns['longitude'][i], 'longitude'),
+                'price': _decimal(columns['price'][i], 'price'),
+                'bedrooms': int(columns['bedrooms'][i]),
+                'bathrooms': int(columns['bathrooms'][i]),
+            })
+            for i in np.flatnonzero(ok)
+        ]
+
+
+def _decimal(value: float, name: str) -> Decimal:
+    """``value`` rounded to the decimal places of the model field."""
+    places = Property._meta.get_field(name).decimal_places
+    return Decimal(repr(float(value))).quantize(Decimal(1).scaleb(-places))
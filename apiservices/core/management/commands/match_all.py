@@ -0,0 +1,128 @@
+"""
+Compute every property x requirement match above the threshold and store
+it in ``PropertyMatch``.
+"""
+import time
+from multiprocessing import get_context
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apiservices.core.matching import (
+    CHUNK_SIZE, REQUIREMENT_FIELDS, WRITE_BATCH_SIZE, active_property_store,
+    match_requirements, replace_matches, requirement_record, score_rows
+)
+from apiservices.core.models import PropertyMatch, PropertyRequirement
+from apiservices.core.RealState.driver import PropertyMatcher
+
+# Inventory shared with forked workers; set before the pool starts
+_shared = {}
+
+
+def _match_tile(records: List[Dict]) -> List:
+    return list(match_requirements(records, _shared['store'], _shared['matcher']))
+
+
+class Command(BaseCommand):
+    help = 'Match every active requirement against every active property'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-id', type=int, default=None,
+                            help='First requirement id to match (to resume a run)')
+        parser.add_argument('--end-id', type=int, default=None,
+                            help='Last requirement id to match')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes scoring requirements in parallel')
+        parser.add_argument('--tile-size', type=int, default=256,
+                            help='Requirements scored and written per unit of work')
+        parser.add_argument('--batch-size', type=int, default=WRITE_BATCH_SIZE,
+                            help='Rows per bulk insert statement')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['tile_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers, --tile-size and --batch-size must be positive')
+        self.batch_size = options['batch_size']
+
+        requirements = PropertyRequirement.objects.filter(is_active=True).order_by('id')
+        if options['start_id'] is not None:
+            requirements = requirements.filter(id__gte=options['start_id'])
+        if options['end_id'] is not None:
+            requirements = requirements.filter(id__lte=options['end_id'])
+        total = requirements.count()
+
+        store = active_property_store()
+        matcher = PropertyMatcher()
+        # Build the partition index once, before workers fork and share it
+        store.partitions()
+        self.stdout.write(f'Matching {total} requirements against {len(store)} properties')
+
+        _shared.update(store=store, matcher=matcher)
+        pool = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            pool = get_context('fork').Pool(options['workers'])
+
+        started = time.monotonic()
+        done = matches = 0
+        try:
+            window = []
+            tiles = self._tiles(requirements, options['tile_size'])
+            for tile in tiles:
+                window.append(tile)
+                if len(window) < options['workers'] * 2:
+                    continue
+                done, matches = self._run(pool, window, done, matches, total, started)
+                window = []
+            if window:
+                done, matches = self._run(pool, window, done, matches, total, started)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _shared.clear()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {matches} matches for {done} requirements '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
+
+    @staticmethod
+    def _tiles(requirements, tile_size: int):
+        tile = []
+        for row in requirements.values_list(*REQUIREMENT_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+            tile.append(requirement_record(row))
+            if len(tile) == tile_size:
+                yield tile
+                tile = []
+        if tile:
+            yield tile
+
+    def _run(self, pool, window: List[List[Dict]], done: int, matches: int, total: int,
+             started: float):
+        results = pool.map(_match_tile, window) if pool else map(_match_tile, window)
+        for tile, tile_results in zip(window, results):
+            matches += self._write(tile_results)
+            done += len(tile)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f'{done}/{total} requirements (up to id {tile[-1]["id"]}), '
+                f'{matches} matches, {done / elapsed:.1f} requirements/s'
+            )
+        return done, matches
+
+    def _write(self, tile_results) -> int:
+        """Replace the stored matches of a tile's requirements; returns rows written."""
+        # Pairs that no longer qualify are dropped with the rest of the tile's rows
+        return replace_matches(
+            PropertyMatch.objects.filter(
+                requirement_id__in=[requirement_id for requirement_id, _, _ in tile_results]
+            ),
+            [
+                row
+                for requirement_id, property_ids, scores in tile_results
+                for row in score_rows(requirement_id, property_ids, scores)
+            ],
+            batch_size=self.batch_size,
+        )
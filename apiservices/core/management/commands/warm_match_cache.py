@@ -0,0 +1,99 @@
+"""
+Fill the match result cache with the results of the active requirements,
+most recently created first.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apiservices.core.inventory import current_inventory
+from apiservices.core.match_cache import warm_matches
+from apiservices.core.matching import CHUNK_SIZE, REQUIREMENT_FIELDS, requirement_record
+from apiservices.core.models import PropertyRequirement
+from apiservices.core.shared_cache import shared_cache
+
+
+class Command(BaseCommand):
+    help = 'Precompute the cached matches of active requirements, newest first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Matches cached per requirement, as searches request them')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads computing batches in parallel')
+        parser.add_argument('--batch-size', type=int, default=64,
+                            help='Requirements looked up and computed per unit of work')
+        parser.add_argument('--time-budget', type=float, default=None,
+                            help='Seconds after which no new batch is started')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1 or options['limit'] < 1:
+            raise CommandError('--limit, --workers and --batch-size must be positive')
+        if not settings.MATCH_CACHE_TIMEOUT:
+            raise CommandError('The match cache is disabled (MATCH_CACHE_TIMEOUT is 0)')
+
+        inventory = current_inventory()
+        # A failed read marks the cache unavailable
+        shared_cache.get('warm_match_cache')
+        if not shared_cache.available:
+            raise CommandError('The shared cache is unreachable')
+        self.stdout.write(
+            f'Warming against {len(inventory.store)} properties '
+            f'({inventory.source}, version {inventory.version})'
+        )
+
+        budget = options['time_budget']
+        started = time.monotonic()
+        deadline = started + budget if budget else None
+        computed = cached = 0
+        stopped = False
+
+        with ThreadPoolExecutor(options['workers']) as executor:
+            pending = set()
+            for batch in self._batches(options['batch_size']):
+                if deadline is not None and time.monotonic() >= deadline:
+                    stopped = True
+                    break
+                # Keep a bounded window of batches in flight
+                if len(pending) >= options['workers'] * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    computed, cached = self._tally(finished, computed, cached, started)
+                pending.add(executor.submit(
+                    warm_matches, batch, inventory, options['limit']
+                ))
+            computed, cached = self._tally(pending, computed, cached, started)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {computed} requirements ({cached} already cached) in {elapsed:.1f}s, '
+            f'{computed / elapsed:.1f} entries/s'
+            + (' (stopped at the time budget)' if stopped else '')
+        ))
+
+    @staticmethod
+    def _batches(batch_size: int) -> Iterator[List[Dict]]:
+        requirements = PropertyRequirement.objects.filter(is_active=True) \
+            .order_by('-created_at', '-id').values_list(*REQUIREMENT_FIELDS)
+        batch = []
+        for row in requirements.iterator(chunk_size=CHUNK_SIZE):
+            batch.append(requirement_record(row))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _tally(self, finished, computed: int, cached: int, started: float):
+        for future in finished:
+            batch_computed, batch_cached = future.result()
+            computed += batch_computed
+            cached += batch_cached
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f'{computed + cached} requirements, {computed} computed, '
+            f'{computed / elapsed:.1f} entries/s'
+        )
+        return computed, cached
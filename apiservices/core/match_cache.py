@@ -0,0 +1,261 @@
+"""
+Shared cache of ``find_matches`` results over the configured inventory.
+
+Results are cached under a hash of everything they depend on: the
+normalized requirement (so ``'1500'`` and ``1500.0`` share an entry), the
+matcher's weights and thresholds, the limit and the version of the
+inventory searched. A new inventory generation therefore makes older
+entries unreachable without deleting them; they expire after
+``MATCH_CACHE_TIMEOUT`` seconds (0 disables the cache).
+
+An entry holds each match's property id and scores in basis points,
+18 bytes a match; the property fields are read back from the inventory,
+which holds the same rows at that version. An unreachable cache counts
+as a miss and searches carry on without it.
+
+In front of the shared cache, each worker keeps recent entries and
+compiled requirements in ``LocalCache`` tiers bounded by
+``MATCH_LOCAL_CACHE_BYTES``, so a hot search is answered without a round
+trip to Redis. The local entries are dropped when the inventory version
+changes. Matchers from ``rescoring_matcher``, for callers that re-run a
+search under other weights or match percentages, also keep each
+requirement's component score vectors in ``score_vectors``, within
+``MATCH_SCORE_VECTOR_BYTES``, so the re-runs are ranked without a scan.
+
+Identical searches that miss at the same time are computed once: threads
+of a worker wait for the one already computing (``SingleFlight``), and
+with ``MATCH_LOCK_TIMEOUT`` set, workers take a lock in the shared cache
+and the others poll for the entry the holder stores, computing it
+themselves only if the lock times out first.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from dataclasses import astuple, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apiservices.core.inventory import LoadedInventory, current_inventory
+from apiservices.core.local_cache import LocalCache
+from apiservices.core.models import basis_points
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.requirement import CompiledRequirement, normalize_requirement
+from apiservices.core.shared_cache import shared_cache
+from apiservices.core.single_flight import SingleFlight
+
+KEY_PREFIX = 'matches:'
+LOCK_PREFIX = 'matches-lock:'
+
+# Seconds between checks for the entry of a search another worker computes
+LOCK_POLL_SECONDS = 0.02
+
+ENCODING_VERSION = b'\x01'
+MATCH_RECORD = np.dtype([
+    ('id', '<i8'), ('match', '<u2'), ('distance_score', '<u2'), ('budget_score', '<u2'),
+    ('bedroom_score', '<u2'), ('bathroom_score', '<u2'),
+])
+SCORE_KEYS = MATCH_RECORD.names[1:]
+
+# Approximate size of a CompiledRequirement, room score tables included
+COMPILED_REQUIREMENT_BYTES = 3000
+
+
+@dataclass
+class CacheStats:
+    """Search counts of this process."""
+    hits: int = 0
+    misses: int = 0
+    # Searches that shared a computation of another thread or worker
+    coalesced: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+stats = CacheStats()
+flights = SingleFlight()
+
+local_results = LocalCache(settings.MATCH_LOCAL_CACHE_BYTES, settings.MATCH_LOCAL_CACHE_TIMEOUT)
+local_requirements = LocalCache(settings.MATCH_LOCAL_CACHE_BYTES // 8)
+score_vectors = LocalCache(settings.MATCH_SCORE_VECTOR_BYTES)
+
+
+def _floats(config) -> tuple:
+    return tuple(float(value) for value in astuple(config))
+
+
+def cache_key(requirement: Dict, matcher: PropertyMatcher, limit: Optional[int],
+              inventory: LoadedInventory) -> str:
+    """Key of the results of ``matcher`` for ``requirement`` over ``inventory``."""
+    canonical = repr((
+        normalize_requirement(requirement), _floats(matcher.weights),
+        _floats(matcher.thresholds), limit, inventory.source, inventory.version,
+    ))
+    return KEY_PREFIX + hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def encode_matches(matches: List[Dict]) -> bytes:
+    """Property ids and basis point scores of ``matches``."""
+    records = np.array([
+        (match['id'], *(basis_points(match[key]) for key in SCORE_KEYS)) for match in matches
+    ], dtype=MATCH_RECORD)
+    return ENCODING_VERSION + records.tobytes()
+
+
+def decode_matches(data: bytes, inventory: LoadedInventory) -> Optional[List[Dict]]:
+    """
+    Result dicts of encoded ``data``, with the property fields read from
+    ``inventory``; None if a property is no longer in it.
+    """
+    if not data.startswith(ENCODING_VERSION):
+        return None
+    matches = []
+    for record in np.frombuffer(data, dtype=MATCH_RECORD, offset=len(ENCODING_VERSION)):
+        row = inventory.store.row_of(int(record['id']))
+        if row is None:
+            return None
+        match = inventory.store.record(row)
+        match.update({key: int(record[key]) / 100 for key in SCORE_KEYS})
+        matches.append(match)
+    return matches
+
+
+def compiled_requirement(requirement: Dict, matcher: PropertyMatcher) -> CompiledRequirement:
+    """``matcher.compile(requirement)``, reused across equal requirements."""
+    key = (normalize_requirement(requirement), _floats(matcher.thresholds))
+    compiled = local_requirements.get(key)
+    if compiled is None or compiled.thresholds != matcher.thresholds:
+        compiled = matcher.compile(requirement)
+        local_requirements.set(key, compiled, COMPILED_REQUIREMENT_BYTES)
+    return compiled
+
+
+def rescoring_matcher(weights=None, thresholds=None) -> PropertyMatcher:
+    """``PropertyMatcher`` keeping component vectors in ``score_vectors``, if enabled."""
+    return PropertyMatcher(weights, thresholds, vector_cache=(
+        score_vectors if settings.MATCH_SCORE_VECTOR_BYTES else None
+    ))
+
+
+def _cached_data(key: str) -> Optional[bytes]:
+    data = local_results.get(key)
+    if data is None:
+        data = shared_cache.get(key)
+        if data is not None:
+            local_results.set(key, data, len(data) + len(key))
+    return data
+
+
+def cached_matches(requirement: Dict, limit: Optional[int] = 10,
+                   matcher: Optional[PropertyMatcher] = None) -> List[Dict]:
+    """``find_matches`` over the configured inventory, through the shared cache."""
+    matcher = matcher or PropertyMatcher()
+    inventory = current_inventory()
+    if matcher.vector_cache is score_vectors:
+        score_vectors.check_version((inventory.source, inventory.version))
+    timeout = settings.MATCH_CACHE_TIMEOUT
+    if not timeout:
+        return matcher.find_matches(requirement, inventory.store, limit=limit)
+
+    key = cache_key(requirement, matcher, limit, inventory)
+    local_results.check_version((inventory.source, inventory.version))
+    data = _cached_data(key)
+    if data is not None:
+        matches = decode_matches(data, inventory)
+        if matches is not None:
+            stats.count('hits')
+            return matches
+
+    matches, computed = flights.do(
+        key, lambda: _compute(key, requirement, limit, matcher, inventory, timeout)
+    )
+    if not computed:
+        stats.count('coalesced')
+        # Callers own their results: give each its own dicts
+        matches = [dict(match) for match in matches]
+    return matches
+
+
+def _compute(key: str, requirement: Dict, limit: Optional[int], matcher: PropertyMatcher,
+             inventory: LoadedInventory, timeout: int) -> List[Dict]:
+    lock_timeout = settings.MATCH_LOCK_TIMEOUT
+    token = uuid.uuid4().hex
+    if lock_timeout and not shared_cache.add(LOCK_PREFIX + key, token, timeout=lock_timeout):
+        matches = _await_entry(key, inventory, lock_timeout)
+        if matches is not None:
+            stats.count('coalesced')
+            return matches
+
+    stats.count('misses')
+    try:
+        matches = matcher.find_matches(
+            compiled_requirement(requirement, matcher), inventory.store, limit=limit
+        )
+        data = encode_matches(matches)
+        shared_cache.set(key, data, timeout=timeout)
+        local_results.set(key, data, len(data) + len(key))
+    finally:
+        # Best effort: a lock held longer than its timeout may be another
+        # worker's by now, and only expiry releases it then
+        if lock_timeout and shared_cache.get(LOCK_PREFIX + key) == token:
+            shared_cache.delete(LOCK_PREFIX + key)
+    return matches
+
+
+def _await_entry(key: str, inventory: LoadedInventory, lock_timeout: float
+                 ) -> Optional[List[Dict]]:
+    """Matches stored under ``key`` by the worker holding its lock, if it does in time."""
+    deadline = time.monotonic() + lock_timeout
+    while shared_cache.available and time.monotonic() < deadline:
+        data = shared_cache.get(key)
+        if data is not None:
+            local_results.set(key, data, len(data) + len(key))
+            return decode_matches(data, inventory)
+        time.sleep(LOCK_POLL_SECONDS)
+    return None
+
+
+def warm_matches(requirements: List[Dict], inventory: LoadedInventory,
+                 limit: Optional[int] = 10, matcher: Optional[PropertyMatcher] = None
+                 ) -> Tuple[int, int]:
+    """
+    Store the results of every requirement missing from the shared cache;
+    returns how many were computed and how many were already cached.
+
+    The cached keys are read in one round trip, and each search goes
+    through the same coalescing as live searches, so warming alongside
+    traffic never computes a result twice.
+    """
+    matcher = matcher or PropertyMatcher()
+    keys = {cache_key(requirement, matcher, limit, inventory): requirement
+            for requirement in requirements}
+    cached = shared_cache.get_many(keys)
+    computed = 0
+    for key, requirement in keys.items():
+        if key not in cached:
+            _, ran = flights.do(key, lambda: _compute(
+                key, requirement, limit, matcher, inventory, settings.MATCH_CACHE_TIMEOUT
+            ))
+            computed += ran
+    return computed, len(keys) - computed
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """Counters of every tier of this process, for monitoring."""
+    return {
+        'matches': {'hits': stats.hits, 'misses': stats.misses, 'coalesced': stats.coalesced,
+                    'hit_rate': stats.hit_rate, 'in_flight': flights.in_flight()},
+        'local_results': local_results.stats(),
+        'local_requirements': local_requirements.stats(),
+        'score_vectors': score_vectors.stats(),
+    }
@@ -0,0 +1,248 @@
+"""
+Incremental maintenance of ``PropertyMatch``.
+
+Saving a ``Property`` or a ``PropertyRequirement`` only marks it dirty.
+Dirty rows are recomputed together once the surrounding transaction
+commits (immediately in autocommit mode), or when the outermost
+``deferred_match_updates()`` block exits, so a feed that saves 10k
+listings in one transaction triggers one batched recompute:
+
+* a dirty property is matched against a ``RequirementIndex`` of the
+  active requirements, kept by the process until the requirement
+  generation changes (see ``generation``);
+* a dirty requirement is matched against the active properties, reading
+  only prefiltered rows when few requirements changed.
+
+The stored matches of every dirty row are then replaced in bulk, which
+also drops pairs that no longer qualify (e.g. of a deactivated listing),
+and requirements are trimmed to ``MATCH_RETENTION_LIMIT`` matches.
+Dirty sets are kept per thread, like the transactions they follow.
+
+A failed recompute never reaches the code that saved: it is logged, and
+its rows stay dirty so the next flush retries them.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import astuple
+from typing import Iterable, List, Optional, Set
+
+from django.db import transaction
+from django.db.models import Count
+
+from apiservices.core import generation
+from apiservices.core.inventory import PROPERTY_FIELDS, DatabaseSource, store_from_rows
+from apiservices.core.matching import (
+    CHUNK_SIZE, REQUIREMENT_FIELDS, active_requirement_index, best_matches,
+    find_database_matches, match_requirements, match_row, replace_matches, requirement_record,
+    retention_limit, score_rows, trim_matches
+)
+from apiservices.core.models import Property, PropertyMatch, PropertyRequirement
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.requirement_index import RequirementIndex
+
+# Dirty rows recomputed and written per transaction
+FLUSH_BATCH_SIZE = 2000
+
+# Above this many dirty requirements, score them against the whole active
+# inventory read once instead of a prefiltered read per requirement
+PREFILTER_MAX_REQUIREMENTS = 32
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+# ((requirement generation, weights, thresholds), RequirementIndex) of this process
+_index = None
+_index_lock = threading.Lock()
+
+
+def _dirty():
+    if not hasattr(_state, 'properties'):
+        _state.properties = set()
+        _state.requirements = set()
+        _state.deferred = 0
+    return _state
+
+
+def mark_properties(ids: Iterable[int]):
+    """Recompute the matches of these properties at the next flush."""
+    _dirty().properties.update(ids)
+    _schedule()
+
+
+def mark_requirements(ids: Iterable[int]):
+    """Recompute the matches of these requirements at the next flush."""
+    _dirty().requirements.update(ids)
+    _schedule()
+
+
+def _schedule():
+    # Every mark registers a callback; the first one to run flushes
+    # everything, so a rolled back transaction can't leave a stale flag
+    if not _dirty().deferred:
+        # Robust: the save has committed, an error here is only logged
+        transaction.on_commit(flush, robust=True)
+
+
+@contextmanager
+def deferred_match_updates():
+    """Coalesce every change made in the block into one flush at its end."""
+    state = _dirty()
+    state.deferred += 1
+    try:
+        yield
+    finally:
+        state.deferred -= 1
+    if not state.deferred:
+        try:
+            flush()
+        except Exception:
+            logger.exception('Deferred match update failed')
+
+
+def flush(matcher: Optional[PropertyMatcher] = None):
+    """
+    Recompute and store the matches of every dirty property and requirement.
+
+    If that fails, the rows are marked dirty again before the error is
+    raised: replacing matches is idempotent, so the next flush recomputes
+    them all, including batches already written.
+    """
+    state = _dirty()
+    properties, requirements = state.properties, state.requirements
+    state.properties, state.requirements = set(), set()
+    matcher = matcher or PropertyMatcher()
+
+    try:
+        if properties:
+            requirements = requirements | update_property_matches(sorted(properties), matcher)
+        if requirements:
+            update_requirement_matches(sorted(requirements), matcher)
+    except Exception:
+        state.properties |= properties
+        state.requirements |= requirements
+        raise
+
+
+def requirement_index(matcher: PropertyMatcher) -> RequirementIndex:
+    """
+    ``active_requirement_index(matcher)``, reused until the requirement
+    generation changes. While this thread has requirement changes that
+    have not committed, the index is read afresh and not kept.
+    """
+    global _index
+    if generation.requirements.pending():
+        return active_requirement_index(matcher)
+    # Taken before reading, so a change made meanwhile triggers another build
+    key = (generation.requirements.current(), astuple(matcher.weights),
+           astuple(matcher.thresholds))
+    index = _index
+    if index is None or index[0] != key:
+        with _index_lock:
+            index = _index
+            if index is None or index[0] != key:
+                index = _index = (key, active_requirement_index(matcher))
+    return index[1]
+
+
+def reset_requirement_index():
+    """Drop the kept index so the next flush reads the requirements again."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def update_property_matches(ids: List[int], matcher: PropertyMatcher) -> Set[int]:
+    """
+    Replace the stored matches of the properties ``ids``.
+
+    With a retention limit, requirements pushed over it are trimmed; the
+    ones that were full and lost or lowered a match may now miss a listing
+    that was trimmed earlier, and are returned to be recomputed.
+    """
+    index = requirement_index(matcher)
+    limit = retention_limit()
+    refill = set()
+    for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+        batch = ids[start:start + FLUSH_BATCH_SIZE]
+        listings = Property.objects.filter(id__in=batch, is_active=True) \
+            .values_list(*PROPERTY_FIELDS)
+        store = store_from_rows(list(listings))
+        rows = [
+            match_row(int(store.ids[row]), match['id'], match)
+            for row in range(len(store))
+            for match in index.match_property(store.record(row))
+        ]
+        rows = best_matches(rows, limit)
+        stale = PropertyMatch.objects.filter(property_id__in=batch)
+        if limit:
+            # A full requirement whose match got worse or went away may have
+            # trimmed a listing that now belongs in its top matches
+            full = _full_requirements(stale.values_list('requirement_id', flat=True), limit)
+            scores = {(row.requirement_id, row.property_id): row.match_bp for row in rows}
+            refill.update(
+                requirement_id for requirement_id, property_id, match_bp in
+                stale.filter(requirement_id__in=full)
+                .values_list('requirement_id', 'property_id', 'match_bp')
+                if scores.get((requirement_id, property_id), -1) < match_bp
+            )
+        replace_matches(stale, rows)
+        if limit:
+            trim_matches({row.requirement_id for row in rows}, limit)
+    return refill
+
+
+def _full_requirements(requirement_ids: Iterable[int], limit: Optional[int]) -> Set[int]:
+    """Requirements among ``requirement_ids`` storing ``limit`` matches."""
+    if not limit:
+        return set()
+    return set(
+        PropertyMatch.objects.filter(requirement_id__in=list(requirement_ids))
+        .values('requirement_id').annotate(count=Count('id')).filter(count__gte=limit)
+        .values_list('requirement_id', flat=True)
+    )
+
+
+def update_requirement_matches(ids: List[int], matcher: PropertyMatcher):
+    """Replace the stored matches of the requirements ``ids``."""
+    store = None
+    if len(ids) > PREFILTER_MAX_REQUIREMENTS:
+        store = DatabaseSource(chunk_size=CHUNK_SIZE).store()
+
+    for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+        batch = ids[start:start + FLUSH_BATCH_SIZE]
+        records = [
+            requirement_record(row) for row in
+            PropertyRequirement.objects.filter(id__in=batch, is_active=True)
+            .values_list(*REQUIREMENT_FIELDS)
+        ]
+        if store is None:
+            rows = [
+                match_row(match['id'], record['id'], match)
+                for record in records
+                for match in find_database_matches(record, limit=None, matcher=matcher)
+            ]
+        else:
+            rows = [
+                row
+                for requirement_id, property_ids, scores in
+                match_requirements(records, store, matcher)
+                for row in score_rows(requirement_id, property_ids, scores)
+            ]
+        replace_matches(PropertyMatch.objects.filter(requirement_id__in=batch), rows)
+
+
+def property_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_properties([instance.pk])
+
+
+def requirement_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_requirements([instance.pk])
+
+
+def inventory_loaded(sender, property_ids=None, **kwargs):
+    if property_ids:
+        mark_properties(property_ids)
@@ -0,0 +1,279 @@
+"""
+Database-backed entry points for the matching engine.
+
+The engine in ``RealState`` works on plain dicts in the matcher's format
+(``lat``/``lon``, ``minBudget``, ...); this module reads model rows into
+that format without instantiating models.
+"""
+import base64
+import binascii
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, QuerySet
+
+from apiservices.core.inventory import PROPERTY_FIELDS, DatabaseSource, PrefilteredSource
+from apiservices.core.match_cache import cached_matches
+from apiservices.core.models import Property, PropertyMatch, PropertyRequirement, basis_points
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.requirement_index import RequirementIndex
+from apiservices.core.RealState.store import PropertyStore
+from apiservices.core.RealState.vectorized import ComponentScores
+
+REQUIREMENT_FIELDS = (
+    'id', 'latitude', 'longitude', 'min_budget', 'max_budget',
+    'min_bedrooms', 'max_bedrooms', 'min_bathrooms', 'max_bathrooms',
+)
+
+SCORE_FIELDS = ('match_bp', 'distance_bp', 'budget_bp', 'bedroom_bp', 'bathroom_bp')
+
+# Rows fetched per database round trip when streaming a table
+CHUNK_SIZE = 2000
+
+# Rows per bulk insert statement when storing matches
+WRITE_BATCH_SIZE = 5000
+
+# Stored order of a requirement's matches, as covered by its index
+MATCH_ORDER = ('-match_bp', 'property_id')
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def requirement_record(row: Sequence) -> Dict:
+    """Requirement dict from a ``values_list(*REQUIREMENT_FIELDS)`` row."""
+    (pk, latitude, longitude, min_budget, max_budget,
+     min_bedrooms, max_bedrooms, min_bathrooms, max_bathrooms) = row
+    return {
+        'id': pk,
+        'lat': _number(latitude),
+        'lon': _number(longitude),
+        'minBudget': _number(min_budget),
+        'maxBudget': _number(max_budget),
+        'minBedrooms': min_bedrooms,
+        'maxBedrooms': max_bedrooms,
+        'minBathrooms': min_bathrooms,
+        'maxBathrooms': max_bathrooms,
+    }
+
+
+def property_record(listing: Property) -> Dict:
+    """Property dict in the matcher's format."""
+    return {
+        'id': listing.pk,
+        'lat': _number(listing.latitude),
+        'lon': _number(listing.longitude),
+        'price': _number(listing.price),
+        'bedrooms': listing.bedrooms,
+        'bathrooms': listing.bathrooms,
+    }
+
+
+def active_requirement_index(matcher: Optional[PropertyMatcher] = None) -> RequirementIndex:
+    """``RequirementIndex`` over every active ``PropertyRequirement``."""
+    rows = PropertyRequirement.objects.filter(is_active=True).order_by('id') \
+        .values_list(*REQUIREMENT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    return RequirementIndex.from_records(map(requirement_record, rows), matcher)
+
+
+def active_property_store() -> PropertyStore:
+    """``PropertyStore`` of every active ``Property``, read in chunks."""
+    return DatabaseSource(chunk_size=CHUNK_SIZE).store()
+
+
+def find_inventory_matches(requirement: Dict, limit: Optional[int] = 10,
+                           matcher: Optional[PropertyMatcher] = None) -> List[Dict]:
+    """
+    ``find_matches`` over the inventory selected by the ``INVENTORY_SOURCE``
+    setting, answered from the match cache when it can be.
+    """
+    return cached_matches(requirement, limit, matcher)
+
+
+def find_database_matches(requirement: Dict, limit: Optional[int] = 10,
+                          matcher: Optional[PropertyMatcher] = None) -> List[Dict]:
+    """``find_matches`` over active properties, reading only rows that can match."""
+    matcher = matcher or PropertyMatcher()
+    compiled = matcher.compile(requirement)
+    return matcher.find_matches(compiled, PrefilteredSource(compiled, matcher.weights),
+                                limit=limit)
+
+
+def match_requirements(records: Iterable[Dict], store: PropertyStore,
+                       matcher: PropertyMatcher
+                       ) -> Iterator[Tuple[int, np.ndarray, ComponentScores]]:
+    """
+    Every match of each requirement in ``store``, as
+    ``(requirement id, property ids, scores)``, best first.
+
+    Uses the store's partition index, so only the blocks of the inventory
+    that can reach the threshold are scored for each requirement.
+    """
+    for record in records:
+        rows, scores = matcher.rank(record, store, limit=None, prune=True)
+        yield record['id'], store.ids[rows], scores
+
+
+def match_row(property_id: int, requirement_id: int, match: Dict) -> PropertyMatch:
+    """Unsaved ``PropertyMatch`` from a result dict with ``match`` and component scores."""
+    return PropertyMatch(
+        property_id=property_id,
+        requirement_id=requirement_id,
+        match_bp=basis_points(match['match']),
+        distance_bp=basis_points(match['distance_score']),
+        budget_bp=basis_points(match['budget_score']),
+        bedroom_bp=basis_points(match['bedroom_score']),
+        bathroom_bp=basis_points(match['bathroom_score']),
+    )
+
+
+def score_rows(requirement_id: int, property_ids: np.ndarray,
+               scores: ComponentScores) -> Iterator[PropertyMatch]:
+    """Unsaved ``PropertyMatch`` rows from one ``match_requirements`` result."""
+    for i in range(len(property_ids)):
+        yield PropertyMatch(
+            property_id=int(property_ids[i]),
+            requirement_id=requirement_id,
+            match_bp=basis_points(float(scores.overall[i])),
+            distance_bp=basis_points(float(scores.distance[i])),
+            budget_bp=basis_points(float(scores.budget[i])),
+            bedroom_bp=basis_points(float(scores.bedrooms[i])),
+            bathroom_bp=basis_points(float(scores.bathrooms[i])),
+        )
+
+
+def retention_limit() -> Optional[int]:
+    """Matches kept per requirement (the ``MATCH_RETENTION_LIMIT`` setting), or None for all."""
+    return settings.MATCH_RETENTION_LIMIT or None
+
+
+def best_matches(matches: Iterable[PropertyMatch], limit: Optional[int]) -> List[PropertyMatch]:
+    """The best ``limit`` matches of each requirement in ``matches``, in storage order."""
+    matches = list(matches)
+    if not limit:
+        return matches
+    kept = defaultdict(list)
+    for match in matches:
+        kept[match.requirement_id].append(match)
+    return [
+        match
+        for requirement_matches in kept.values()
+        for match in sorted(requirement_matches,
+                            key=lambda match: (-match.match_bp, match.property_id))[:limit]
+    ]
+
+
+def upsert_matches(matches: List[PropertyMatch], batch_size: int = WRITE_BATCH_SIZE):
+    """Insert ``matches``, updating the scores of (property, requirement) pairs already stored."""
+    PropertyMatch.objects.bulk_create(
+        matches, batch_size=batch_size, update_conflicts=True,
+        unique_fields=['property', 'requirement'], update_fields=list(SCORE_FIELDS),
+    )
+
+
+def trim_matches(requirement_ids: Iterable[int], limit: Optional[int]) -> List[int]:
+    """
+    Delete all but the best ``limit`` stored matches of each requirement;
+    returns the requirements that had matches deleted.
+    """
+    if not limit:
+        return []
+    over = list(
+        PropertyMatch.objects.filter(requirement_id__in=list(requirement_ids))
+        .values('requirement_id').annotate(count=Count('id')).filter(count__gt=limit)
+        .values_list('requirement_id', flat=True)
+    )
+    for requirement_id in over:
+        surplus = PropertyMatch.objects.filter(requirement_id=requirement_id) \
+            .order_by(*MATCH_ORDER).values_list('id', flat=True)[limit:]
+        PropertyMatch.objects.filter(id__in=list(surplus)).delete()
+    return over
+
+
+def replace_matches(stale: QuerySet, matches: List[PropertyMatch],
+                    batch_size: int = WRITE_BATCH_SIZE) -> int:
+    """
+    Delete the ``stale`` matches and store ``matches`` in one transaction,
+    keeping at most ``retention_limit()`` of them per requirement; returns
+    the number of rows written.
+    """
+    matches = best_matches(matches, retention_limit())
+    with transaction.atomic():
+        # Rows written concurrently by another run are updated instead of
+        # failing the unique constraint
+        stale.delete()
+        upsert_matches(matches, batch_size)
+    return len(matches)
+
+
+def encode_cursor(match_bp: int, property_id: int) -> str:
+    """Opaque cursor resuming a match listing after this (score, property) key."""
+    return base64.urlsafe_b64encode(f'{match_bp}:{property_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Key encoded by ``encode_cursor``; raises ValueError for anything else."""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        match_bp, property_id = (int(part) for part in text.split(':'))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    return match_bp, property_id
+
+
+def match_page(requirement_id: int, limit: int,
+               after: Optional[Tuple[int, int]] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    The stored matches of a requirement that follow the key ``after``, best
+    first, with the property's hot fields; returns them and the cursor of
+    the next page (None on the last page).
+
+    Seeks on the (requirement, -match_bp, property) index instead of using
+    OFFSET, so every page costs the same however deep it is. Properties
+    are read with one ``id__in`` query rather than a join; one deleted
+    between the two queries is left out of the page.
+    """
+    matches = PropertyMatch.objects.filter(requirement_id=requirement_id)
+    if after is not None:
+        match_bp, property_id = after
+        matches = matches.filter(
+            Q(match_bp__lt=match_bp) | Q(match_bp=match_bp, property_id__gt=property_id)
+        )
+    rows = list(
+        matches.order_by(*MATCH_ORDER).values_list('property_id', *SCORE_FIELDS)[:limit + 1]
+    )
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) \
+        if len(rows) > limit else None
+    rows = rows[:limit]
+
+    listings = {
+        row[0]: row for row in
+        Property.objects.filter(id__in=[row[0] for row in rows]).values_list(*PROPERTY_FIELDS)
+    }
+    page = []
+    for property_id, match_bp, distance_bp, budget_bp, bedroom_bp, bathroom_bp in rows:
+        if property_id not in listings:
+            continue
+        _, latitude, longitude, price, bedrooms, bathrooms = listings[property_id]
+        page.append({
+            'id': property_id,
+            'lat': _number(latitude),
+            'lon': _number(longitude),
+            'price': _number(price),
+            'bedrooms': bedrooms,
+            'bathrooms': bathrooms,
+            'match': match_bp / 100,
+            'distance_score': _points(distance_bp),
+            'budget_score': _points(budget_bp),
+            'bedroom_score': _points(bedroom_bp),
+            'bathroom_score': _points(bathroom_bp),
+        })
+    return page, next_cursor
+
+
+def _points(value):
+    return None if value is None else value / 100
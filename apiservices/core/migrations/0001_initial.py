@@ -0,0 +1,72 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:17
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.DecimalField(decimal_places=8, help_text='Search center latitude coordinate', max_digits=10)),
+                ('longitude', models.DecimalField(decimal_places=8, help_text='Search center longitude coordinate', max_digits=11)),
+                ('min_budget', models.DecimalField(blank=True, decimal_places=2, help_text='Minimum budget in USD', max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('max_budget', models.DecimalField(blank=True, decimal_places=2, help_text='Maximum budget in USD', max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('min_bedrooms', models.PositiveIntegerField(blank=True, help_text='Minimum number of bedrooms', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('max_bedrooms', models.PositiveIntegerField(blank=True, help_text='Maximum number of bedrooms', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('min_bathrooms', models.PositiveIntegerField(blank=True, help_text='Minimum number of bathrooms', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('max_bathrooms', models.PositiveIntegerField(blank=True, help_text='Maximum number of bathrooms', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Property',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.DecimalField(decimal_places=8, help_text='Property latitude coordinate', max_digits=10)),
+                ('longitude', models.DecimalField(decimal_places=8, help_text='Property longitude coordinate', max_digits=11)),
+                ('price', models.DecimalField(decimal_places=2, help_text='Property price in USD', max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('bedrooms', models.PositiveIntegerField(help_text='Number of bedrooms', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('bathrooms', models.PositiveIntegerField(help_text='Number of bathrooms', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['latitude', 'longitude'], name='core_proper_latitud_67d4ff_idx'), models.Index(fields=['price'], name='core_proper_price_652b7d_idx'), models.Index(fields=['bedrooms'], name='core_proper_bedroom_cf366a_idx'), models.Index(fields=['bathrooms'], name='core_proper_bathroo_4f5abe_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PropertyMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_percentage', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('distance_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('budget_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('bedroom_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('bathroom_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.property')),
+                ('requirement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.propertyrequirement')),
+            ],
+            options={
+                'ordering': ['-match_percentage', '-created_at'],
+                'indexes': [models.Index(fields=['match_percentage'], name='core_proper_match_p_d0ea7c_idx'), models.Index(fields=['requirement', '-match_percentage'], name='core_proper_require_ba72dd_idx')],
+                'unique_together': {('property', 'requirement')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Identifier of the listing in the feed it was loaded from', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Cast, Round
+
+SCORES = [
+    ('match_percentage', 'match_bp'),
+    ('distance_score', 'distance_bp'),
+    ('budget_score', 'budget_bp'),
+    ('bedroom_score', 'bedroom_bp'),
+    ('bathroom_score', 'bathroom_bp'),
+]
+
+
+def to_basis_points(apps, schema_editor):
+    PropertyMatch = apps.get_model('core', 'PropertyMatch')
+    PropertyMatch.objects.update(**{
+        points: Cast(Round(F(percentage) * 100), models.PositiveSmallIntegerField())
+        for percentage, points in SCORES
+    })
+
+
+def to_percentages(apps, schema_editor):
+    PropertyMatch = apps.get_model('core', 'PropertyMatch')
+    PropertyMatch.objects.update(**{
+        percentage: ExpressionWrapper(
+            F(points) * Decimal('0.01'),
+            output_field=models.DecimalField(max_digits=5, decimal_places=2),
+        )
+        for percentage, points in SCORES
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_property_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertymatch',
+            name='match_bp',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Overall match in basis points', validators=[django.core.validators.MaxValueValidator(10000)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='propertymatch',
+            name='distance_bp',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='propertymatch',
+            name='budget_bp',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='propertymatch',
+            name='bedroom_bp',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='propertymatch',
+            name='bathroom_bp',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # Nullable while it is dropped, so the migration can be reversed
+        migrations.AlterField(
+            model_name='propertymatch',
+            name='match_percentage',
+            field=models.DecimalField(decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.RunPython(to_basis_points, to_percentages),
+        migrations.RemoveIndex(
+            model_name='propertymatch',
+            name='core_proper_match_p_d0ea7c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='propertymatch',
+            name='core_proper_require_ba72dd_idx',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='match_percentage',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='distance_score',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='budget_score',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='bedroom_score',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='bathroom_score',
+        ),
+        migrations.RemoveField(
+            model_name='propertymatch',
+            name='created_at',
+        ),
+        migrations.AlterModelOptions(
+            name='propertymatch',
+            options={'ordering': ['-match_bp', 'property']},
+        ),
+        migrations.AddIndex(
+            model_name='propertymatch',
+            index=models.Index(fields=['requirement', '-match_bp', 'property'], name='core_proper_require_bc8ae7_idx'),
+        ),
+    ]
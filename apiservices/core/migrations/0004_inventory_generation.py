@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_compact_property_match'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
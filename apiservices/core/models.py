@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -5,6 +7,13 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 class Property(models.Model):
     """Model representing a property listing."""
     
+    external_id = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Identifier of the listing in the feed it was loaded from"
+    )
     latitude = models.DecimalField(
         max_digits=10, 
         decimal_places=8,
@@ -126,30 +135,71 @@ class PropertyRequirement(models.Model):
         return f"Requirement {self.id}: ${self.min_budget}-${self.max_budget}"
 
 
+def basis_points(score: float) -> int:
+    """Score in hundredths of a percent, as ``PropertyMatch`` stores it."""
+    # Rounded to two decimals first, like the scores find_matches reports
+    return int(round(round(score, 2) * 100))
+
+
+class _Percentage:
+    """Read-only attribute giving a basis point field as a Decimal percentage."""
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        points = getattr(instance, self.field)
+        return None if points is None else Decimal(points).scaleb(-2)
+
+
 class PropertyMatch(models.Model):
-    """Model representing a property match result."""
+    """
+    Model representing a property match result.
+
+    Scores are stored as integer basis points (8250 for 82.50%), which
+    keeps rows and the per-requirement score index small; the
+    ``*_percentage``/``*_score`` properties read them back as Decimals.
+    """
     
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
     requirement = models.ForeignKey(PropertyRequirement, on_delete=models.CASCADE)
-    match_percentage = models.DecimalField(
-        max_digits=5, 
-        decimal_places=2,
-        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    match_bp = models.PositiveSmallIntegerField(
+        validators=[MaxValueValidator(10000)],
+        help_text="Overall match in basis points"
     )
-    distance_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
-    budget_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
-    bedroom_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
-    bathroom_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
-    
-    created_at = models.DateTimeField(auto_now_add=True)
+    distance_bp = models.PositiveSmallIntegerField(null=True)
+    budget_bp = models.PositiveSmallIntegerField(null=True)
+    bedroom_bp = models.PositiveSmallIntegerField(null=True)
+    bathroom_bp = models.PositiveSmallIntegerField(null=True)
     
     class Meta:
-        ordering = ['-match_percentage', '-created_at']
+        ordering = ['-match_bp', 'property']
         unique_together = ['property', 'requirement']
         indexes = [
-            models.Index(fields=['match_percentage']),
-            models.Index(fields=['requirement', '-match_percentage']),
+            # Top matches of a requirement, in listing order
+            models.Index(fields=['requirement', '-match_bp', 'property']),
         ]
+
+    match_percentage = _Percentage('match_bp')
+    distance_score = _Percentage('distance_bp')
+    budget_score = _Percentage('budget_bp')
+    bedroom_score = _Percentage('bedroom_bp')
+    bathroom_score = _Percentage('bathroom_bp')
     
     def __str__(self):
-        return f"Match {self.id}: {self.match_percentage}% - Property {self.property.id}"
\ No newline at end of file
+        return f"Match {self.id}: {self.match_percentage}% - Property {self.property_id}"
+
+
+class InventoryGeneration(models.Model):
+    """
+    Counter bumped whenever the Property inventory changes, so anything
+    derived from it can tell whether it is stale; row 2 counts changes to
+    PropertyRequirement the same way.
+    """
+
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Inventory generation {self.value}"
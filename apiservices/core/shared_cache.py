@@ -0,0 +1,69 @@
+"""
+The cache shared by all workers (``CACHES['default']``, Redis in
+production), degrading to "no cache" when its backend is unreachable.
+
+A failed call is treated as a miss (reads) or dropped (writes), and the
+backend is left alone for ``CACHE_RETRY_SECONDS`` before being tried
+again, so an outage costs one connection timeout per interval instead of
+one per request.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+CACHE_RETRY_SECONDS = 30.0
+
+
+class SharedCache:
+    """Failure-tolerant wrapper around one Django cache alias."""
+
+    def __init__(self, alias: str = 'default', retry_after: float = CACHE_RETRY_SECONDS):
+        self.alias = alias
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """False while backing off after a failure."""
+        return time.monotonic() >= self._down_until
+
+    def _call(self, method: str, *args, default=None, **kwargs):
+        if not self.available:
+            return default
+        try:
+            return getattr(caches[self.alias], method)(*args, **kwargs)
+        except ValueError:
+            # Raised by incr() for a missing key, not by an outage
+            raise
+        except Exception:
+            # Any backend error (connection refused, timeout, ...) means the
+            # cache is unusable for now; callers carry on without it
+            with self._lock:
+                self._down_until = time.monotonic() + self.retry_after
+            return default
+
+    def get(self, key: str, default=None) -> Any:
+        return self._call('get', key, default, default=default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return self._call('get_many', list(keys), default={})
+
+    def set(self, key: str, value, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self._call('set', key, value, timeout)
+
+    def add(self, key: str, value, timeout: Optional[float] = DEFAULT_TIMEOUT) -> bool:
+        return self._call('add', key, value, timeout, default=False)
+
+    def incr(self, key: str, delta: int = 1) -> Optional[int]:
+        """New value, None if the cache is down; ValueError if ``key`` is missing."""
+        return self._call('incr', key, delta)
+
+    def delete(self, key: str):
+        self._call('delete', key)
+
+
+shared_cache = SharedCache()
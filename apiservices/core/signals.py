@@ -0,0 +1,9 @@
+"""
+Signals sent by the matching data pipeline.
+"""
+from django.dispatch import Signal
+
+# Sent after properties were written in bulk (bulk_create sends no post_save),
+# so anything derived from the inventory can be refreshed. ``property_ids``
+# lists the rows written, when known.
+inventory_changed = Signal()
@@ -0,0 +1,60 @@
+"""
+Coalescing of identical concurrent calls within a process.
+
+``SingleFlight.do(key, function)`` runs ``function`` unless a call for
+the same key is already running, in which case it waits for that call
+and shares its result (or its exception). Only calls that overlap are
+coalesced; nothing is kept once a call returns.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; overlapping callers share it."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Result of ``function()``, or of the identical call already running,
+        and whether this caller ran it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Unregister before waking the waiters: a call arriving from now
+            # on starts afresh instead of taking a finished result
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+    def in_flight(self) -> int:
+        """Number of calls running now."""
+        with self._lock:
+            return len(self._calls)
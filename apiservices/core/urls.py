@@ -2,10 +2,13 @@
 Custom user routes and endpoints
 """
 from django.urls import path
-from .views import home, home_view
+from .views import home, home_view, match_cache_stats, requirement_matches
 
 urlpatterns = [
     path("", home_view, name="home_view"),
     path("home/", home, name="home"),
+    path("requirements/<int:requirement_id>/matches/", requirement_matches,
+         name="requirement_matches"),
+    path("match-cache/stats/", match_cache_stats, name="match_cache_stats"),
     # path("blog/", blog, name="blog"),
 ]
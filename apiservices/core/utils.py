@@ -1,4 +1,4 @@
-from apiservices.core.RealState.driver import getTopMatches
+from apiservices.core.matching import find_inventory_matches
 
 
 # input1 = {
@@ -46,7 +46,7 @@ def processInputDataAndGiveMatches(input):
         }
         # print("req_obj")
         # print(req_obj)
-        list_of_properties = getTopMatches(req_obj)
+        list_of_properties = find_inventory_matches(req_obj)
         # print("list_of_properties")
         # print(list_of_properties)
         return list_of_properties, req_obj
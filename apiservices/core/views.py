@@ -1,7 +1,10 @@
 from rest_framework.decorators import api_view
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from rest_framework.response import Response
 from apiservices.core.constants import BLOG
+from apiservices.core.match_cache import cache_stats
+from apiservices.core.matching import decode_cursor, match_page
+from apiservices.core.models import PropertyRequirement
 from django.shortcuts import render
 from .forms import InputForm
 from .utils import processInputDataAndGiveMatches
@@ -28,6 +31,44 @@ def blog(request):
     return Response(BLOG, status=HTTP_200_OK)
 
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+@api_view(["GET"])
+def requirement_matches(request, requirement_id):
+    """
+    Stored matches of a requirement, best first, one page at a time.
+
+    :param request: ``limit`` (page size, at most MAX_PAGE_SIZE) and
+        ``cursor`` (the ``next`` value of the previous page)
+    :return: JSON response with ``results`` and the ``next`` cursor
+    """
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+        after = decode_cursor(request.GET["cursor"]) if "cursor" in request.GET else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return Response({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"},
+                        status=HTTP_400_BAD_REQUEST)
+    if not PropertyRequirement.objects.filter(id=requirement_id).exists():
+        return Response({"error": "Requirement not found"}, status=HTTP_404_NOT_FOUND)
+
+    results, next_cursor = match_page(requirement_id, limit, after)
+    return Response({"results": results, "next": next_cursor}, status=HTTP_200_OK)
+
+
+@api_view(["GET"])
+def match_cache_stats(request):
+    """
+    Hit, miss and eviction counters of this worker's match caches.
+    :param request:
+    :return: JSON response
+    """
+    return Response(cache_stats(), status=HTTP_200_OK)
+
+
 def home_view(request):
     username = "not logged in"
     if request.method == "POST":
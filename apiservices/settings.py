@@ -184,6 +184,43 @@ CACHES = {
     }
 }
 
+# Property inventory searched by the matching views: 'database' (active
+# Property rows), 'snapshot' (a file written by manage.py build_snapshot,
+# memory-mapped and shared by all workers) or 'mock' (the bundled demo data).
+# It is loaded on first use, or at app startup with INVENTORY_WARMUP; set that
+# for server processes only, as management commands load the app too. Workers
+# reload it in a background thread once the inventory generation (or the
+# snapshot file) changes, searching the one they hold until it is read.
+INVENTORY_SOURCE = config('INVENTORY_SOURCE', default='database')
+INVENTORY_SNAPSHOT_PATH = config('INVENTORY_SNAPSHOT_PATH',
+                                 default=os.path.join(BASE_DIR, 'inventory.snapshot'))
+INVENTORY_WARMUP = config('INVENTORY_WARMUP', default=False, cast=bool)
+
+# Seconds a find_matches result stays in the shared cache; 0 disables it
+MATCH_CACHE_TIMEOUT = config('MATCH_CACHE_TIMEOUT', default=300, cast=int)
+# Seconds a worker computing a search holds a lock in the shared cache, while
+# other workers running the same search wait for its result; 0 only coalesces
+# searches within a worker
+MATCH_LOCK_TIMEOUT = config('MATCH_LOCK_TIMEOUT', default=0, cast=float)
+# Per-worker copy of recent results (and compiled requirements) kept in front
+# of the shared cache: memory budget in bytes (0 disables it) and entry age
+MATCH_LOCAL_CACHE_BYTES = config('MATCH_LOCAL_CACHE_BYTES', default=32 * 2 ** 20, cast=int)
+MATCH_LOCAL_CACHE_TIMEOUT = config('MATCH_LOCAL_CACHE_TIMEOUT', default=60, cast=int)
+# Per-worker memory budget in bytes for the component score vectors of recent
+# requirements searched through rescoring_matcher, re-ranked without a scan
+# under other weights or match percentages (68 bytes per property per
+# requirement; inventories too large for the budget are scanned); 0 disables them
+MATCH_SCORE_VECTOR_BYTES = config('MATCH_SCORE_VECTOR_BYTES', default=64 * 2 ** 20, cast=int)
+# Seconds a worker trusts its last reading of the inventory generation; other
+# workers' changes take up to this long to be noticed
+INVENTORY_GENERATION_POLL = config('INVENTORY_GENERATION_POLL', default=1.0, cast=float)
+
+# Keep PropertyMatch up to date as properties and requirements are saved
+INCREMENTAL_MATCHING = config('INCREMENTAL_MATCHING', default=True, cast=bool)
+
+# Best matches stored per requirement; 0 stores every match above the threshold
+MATCH_RETENTION_LIMIT = config('MATCH_RETENTION_LIMIT', default=0, cast=int)
+
 # Admin credentials from environment
 ADMIN_USERNAME = config('ADMIN_USERNAME', default='admin@example.com')
 ADMIN_PASSWORD = config('ADMIN_PASSWORD', default='changeme')
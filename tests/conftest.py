@@ -0,0 +1,30 @@
+"""
+Shared pytest configuration.
+"""
+import os
+
+import django
+import pytest
+from django.conf import settings
+
+# Settings read SECRET_KEY through python-decouple; tests don't need a real one
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apiservices.settings')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+# Nor a Redis server: tests that need a failing cache configure one
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+django.setup()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Every test starts with empty caches, as database ids and generations repeat."""
+    from django.core.cache import cache
+    from apiservices.core import generation, inventory, match_cache, match_updates
+    cache.clear()
+    inventory.reset_inventory()
+    generation.inventory.last_read = None
+    generation.requirements.last_read = None
+    match_updates.reset_requirement_index()
+    match_cache.local_results.clear()
+    match_cache.local_requirements.clear()
+    match_cache.score_vectors.clear()
@@ -0,0 +1,96 @@
+"""
+Data builders shared by the test modules.
+"""
+import numpy as np
+
+from apiservices.core import inventory
+from apiservices.core.matching import active_property_store, requirement_record
+from apiservices.core.models import Property, PropertyMatch, PropertyRequirement
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.store import PropertyStore
+
+REQUIREMENT = {
+    'lat': 40.7, 'lon': -74.0,
+    'minBudget': '3000', 'maxBudget': '5000',
+    'minBedrooms': 2, 'maxBedrooms': 3,
+}
+
+
+def create_inventory(properties=300, requirements=40, seed=0):
+    """Listings and requirements around two cities."""
+    rng = np.random.default_rng(seed)
+    centers = np.array([[40.7, -74.0], [34.0, -118.2]])
+
+    picked = centers[rng.integers(0, 2, properties)]
+    Property.objects.bulk_create([
+        Property(
+            latitude=round(lat + rng.normal(0, 0.05), 8),
+            longitude=round(lon + rng.normal(0, 0.05), 8),
+            price=round(rng.uniform(1000, 9000), 2),
+            bedrooms=int(rng.integers(1, 7)),
+            bathrooms=int(rng.integers(1, 7)),
+        )
+        for lat, lon in picked
+    ])
+
+    picked = centers[rng.integers(0, 2, requirements)]
+    PropertyRequirement.objects.bulk_create([
+        PropertyRequirement(
+            latitude=round(lat + rng.normal(0, 0.05), 8),
+            longitude=round(lon + rng.normal(0, 0.05), 8),
+            min_budget=round(budget, 2),
+            max_budget=round(budget * 1.2, 2) if i % 3 else None,
+            min_bedrooms=int(rng.integers(1, 4)),
+            max_bedrooms=None if i % 2 else 4,
+            max_bathrooms=int(rng.integers(1, 5)),
+            is_active=i != 0,
+        )
+        for i, ((lat, lon), budget) in enumerate(zip(picked, rng.uniform(1000, 8000, requirements)))
+    ])
+
+
+def expected_matches():
+    """Every qualifying pair, found one requirement at a time with find_matches."""
+    store = active_property_store()
+    matcher = PropertyMatcher()
+    expected = set()
+    for row in PropertyRequirement.objects.filter(is_active=True).values_list(
+            'id', 'latitude', 'longitude', 'min_budget', 'max_budget',
+            'min_bedrooms', 'max_bedrooms', 'min_bathrooms', 'max_bathrooms'):
+        record = requirement_record(row)
+        for match in matcher.find_matches(record, store, limit=None):
+            expected.add((match['id'], record['id'], match['match']))
+    return expected
+
+
+def stored_matches():
+    return {
+        (property_id, requirement_id, match_bp / 100)
+        for property_id, requirement_id, match_bp in
+        PropertyMatch.objects.values_list('property_id', 'requirement_id', 'match_bp')
+    }
+
+
+def make_store(size=5000, seed=0):
+    """Clustered synthetic inventory, including listings on both sides of the antimeridian."""
+    rng = np.random.default_rng(seed)
+    centers = np.array([[40.7, -74.0], [51.5, -0.1], [-33.9, 151.2], [65.0, 179.9], [65.0, -179.9]])
+    picked = centers[rng.integers(0, len(centers), size)]
+    lat = np.clip(picked[:, 0] + rng.normal(0, 0.1, size), -90, 90)
+    lon = (picked[:, 1] + rng.normal(0, 0.1, size) + 180) % 360 - 180
+    return PropertyStore(
+        ids=np.arange(1, size + 1),
+        lat=lat,
+        lon=lon,
+        price=np.round(rng.uniform(1000, 10000, size), 2),
+        bedrooms=rng.integers(1, 7, size),
+        bathrooms=rng.integers(1, 7, size),
+    )
+
+
+def reloaded_inventory():
+    """The loaded store once the reload ``get_inventory()`` may start is done."""
+    inventory.get_inventory()
+    if inventory._reloader is not None:
+        inventory._reloader.join()
+    return inventory._inventory.store
@@ -0,0 +1,111 @@
+"""
+Tests for the inventory generation counter.
+"""
+import time
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+
+from apiservices.core import generation
+from apiservices.core.generation import bump_generation, current_generation
+from apiservices.core.models import InventoryGeneration, Property, PropertyRequirement
+from apiservices.core.RealState.snapshot import read_header
+from apiservices.core.shared_cache import SharedCache
+from tests.helpers import create_inventory
+
+
+@pytest.mark.django_db(transaction=True)
+class TestGeneration:
+    """Every committed change to the inventory advances the generation once."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory(properties=20, requirements=0)
+        self.start = current_generation()
+
+    def test_save_and_delete(self):
+        """Saving and deleting a listing each bump the generation."""
+        listing = Property.objects.first()
+        listing.price = Decimal('1234.00')
+        listing.save()
+        assert current_generation() == self.start + 1
+
+        listing.delete()
+        assert current_generation() == self.start + 2
+
+    def test_once_per_transaction(self):
+        """A transaction changing many rows bumps once, after it commits."""
+        with transaction.atomic():
+            for listing in Property.objects.all():
+                listing.price += 1
+                listing.save()
+            assert current_generation() == self.start
+
+        assert current_generation() == self.start + 1
+
+    def test_rolled_back_changes(self):
+        """A rolled back transaction leaves the generation alone."""
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                Property.objects.first().delete()
+                raise RuntimeError
+
+        assert current_generation() == self.start
+
+    def test_bulk_load(self, tmp_path):
+        """load_properties bumps the generation once, however many batches it writes."""
+        path = tmp_path / 'listings.csv'
+        path.write_text(
+            'latitude,longitude,price,bedrooms,bathrooms\n'
+            '18.5,73.8,1500,2,1\n'
+            '18.6,73.9,2500,3,2\n'
+            '18.7,73.9,3500,3,2\n'
+        )
+        call_command('load_properties', str(path), '--batch-size', '1', stdout=StringIO())
+
+        assert current_generation() == self.start + 1
+
+    def test_requirements_have_their_own_generation(self):
+        """Requirement changes bump the requirement generation, not the inventory's."""
+        start = generation.requirements.current()
+        requirement = PropertyRequirement.objects.create(latitude=Decimal('40.7'),
+                                                         longitude=Decimal('-74.0'))
+        requirement.delete()
+
+        assert generation.requirements.current() == start + 2
+        assert current_generation() == self.start
+
+    def test_bumps_are_stored(self):
+        """The database holds the counter the cache copies."""
+        assert bump_generation() == self.start + 1
+        assert bump_generation() == self.start + 2
+        assert InventoryGeneration.objects.get(pk=1).value == self.start + 2
+
+    def test_cache_unavailable(self, settings, monkeypatch):
+        """Without the shared cache the generation is read from the database."""
+        settings.INVENTORY_GENERATION_POLL = 0
+        settings.CACHES = {**settings.CACHES, 'unreachable': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+        }}
+        unreachable = SharedCache('unreachable')
+        monkeypatch.setattr(generation, 'shared_cache', unreachable)
+
+        assert current_generation() == self.start
+        assert not unreachable.available
+        Property.objects.first().delete()
+        assert current_generation() == self.start + 1
+
+    def test_snapshot_records_generation(self, tmp_path):
+        """build_snapshot stamps the file with the generation it read."""
+        path = str(tmp_path / 'inventory.snapshot')
+        Property.objects.first().delete()
+        before = time.time()
+        call_command('build_snapshot', path, stdout=StringIO())
+
+        header = read_header(path)
+        assert header.generation == self.start + 1
+        assert header.created_at >= before
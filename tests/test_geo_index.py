@@ -0,0 +1,76 @@
+"""
+Tests for the grid geo index.
+"""
+import numpy as np
+import pytest
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.geo_index import GeoIndex
+from apiservices.core.RealState.utils import distances_from_vectors, unit_vectors
+from apiservices.core.RealState.vectorized import property_columns, score_columns
+
+
+class TestGeoIndex:
+    """radius_search must never miss a point inside the radius."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        rng = np.random.default_rng(0)
+        self.lat = np.concatenate([
+            rng.uniform(-90, 90, 20000),
+            rng.uniform(89.5, 90, 500),        # around the north pole
+            rng.uniform(-90, -89.5, 500),      # around the south pole
+            rng.uniform(-10, 10, 2000),
+        ])
+        self.lon = np.concatenate([
+            rng.uniform(-180, 180, 21000),
+            rng.choice([-1, 1], 2000) * rng.uniform(179.5, 180, 2000),  # antimeridian
+        ])
+        self.index = GeoIndex(self.lat, self.lon)
+
+    @pytest.mark.parametrize('center', [
+        (40.7, -74.0),
+        (89.99, 12.0),
+        (-89.95, -100.0),
+        (0.0, 179.95),
+        (0.0, -179.95),
+        (60.0, 180.0),
+    ])
+    @pytest.mark.parametrize('miles', [2.0, 10.0, 75.0])
+    def test_radius_search_is_a_superset(self, center, miles):
+        """Every point within the radius is a candidate."""
+        miles_away = distances_from_vectors(*unit_vectors(*np.array(center)),
+                                            *unit_vectors(self.lat, self.lon))
+        within = np.flatnonzero(miles_away <= miles)
+        candidates = self.index.radius_search(center[0], center[1], miles)
+
+        assert np.isin(within, candidates).all()
+        assert len(candidates) < len(self.lat)
+
+    def test_cell_of(self):
+        """Cells wrap at the antimeridian and clamp at the poles."""
+        assert self.index.cell_of(0.0, 180.0) == self.index.cell_of(0.0, -180.0)
+        assert self.index.cell_of(90.0, 0.0) == self.index.cell_of(89.9, 0.0)
+
+
+class TestIndexedScoring:
+    """Scoring through the index agrees with the full scan."""
+
+    def test_distance_component_is_unchanged(self):
+        """Rows outside the searched cells score exactly 0, as before."""
+        rng = np.random.default_rng(2)
+        properties = [
+            {'id': i, 'lat': 40.7 + rng.normal(0, 0.2), 'lon': -74.0 + rng.normal(0, 0.2),
+             'price': '5000', 'bedrooms': 2, 'bathrooms': 2}
+            for i in range(3000)
+        ]
+        columns = property_columns(properties)
+        matcher = PropertyMatcher()
+        compiled = matcher.compile({'lat': 40.7, 'lon': -74.0, 'maxBudget': '5000'})
+
+        indexed = score_columns(
+            columns, compiled, matcher.weights, GeoIndex(columns['lat'], columns['lon'])
+        )
+        full = score_columns(columns, compiled, matcher.weights)
+
+        assert (indexed.distance > 0).any()
+        assert np.array_equal(indexed.distance, full.distance)
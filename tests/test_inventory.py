@@ -0,0 +1,253 @@
+"""
+Tests for the database-backed inventory sources.
+"""
+import os
+import subprocess
+import sys
+from io import StringIO
+
+import numpy as np
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import post_init
+
+from apiservices.core import inventory
+from apiservices.core.generation import bump_generation
+from apiservices.core.inventory import (
+    DatabaseSource, PrefilteredSource, get_inventory, prefilter, reset_inventory, store_from_rows
+)
+from apiservices.core.matching import (
+    active_property_store, find_database_matches, find_inventory_matches
+)
+from apiservices.core.models import Property
+from apiservices.core.signals import inventory_changed
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from tests.helpers import REQUIREMENT, create_inventory, reloaded_inventory
+
+
+@pytest.mark.django_db
+class TestDatabaseSource:
+    """Streaming the Property table chunk by chunk gives the in-memory results."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+        Property.objects.filter(id__in=Property.objects.order_by('id')[:5]).update(is_active=False)
+        self.matcher = PropertyMatcher()
+        self.store = active_property_store()
+
+    @pytest.mark.parametrize('limit', [1, 10, None])
+    def test_matches_in_memory_store(self, limit):
+        """Chunked top-k merging returns the same matches in the same order."""
+        streamed = self.matcher.find_matches(REQUIREMENT, DatabaseSource(chunk_size=7), limit=limit)
+
+        assert [(m['id'], m['match']) for m in streamed] == \
+            [(m['id'], m['match']) for m in self.matcher.find_matches(REQUIREMENT, self.store,
+                                                                      limit=limit)]
+
+    def test_chunks_are_bounded(self):
+        """Chunks hold at most chunk_size active rows and cover the table once."""
+        chunks = list(DatabaseSource(chunk_size=64).chunks())
+
+        assert max(len(chunk) for chunk in chunks) == 64
+        assert sum(len(chunk) for chunk in chunks) == len(self.store)
+        assert chunks[0].price.dtype.kind == 'f'
+
+    def test_store_is_built_from_chunks(self, monkeypatch):
+        """The whole table is never held as tuples to build one store."""
+        sizes = []
+        row_columns = inventory._row_columns
+        monkeypatch.setattr(inventory, '_row_columns',
+                            lambda rows: sizes.append(len(rows)) or row_columns(rows))
+        source = DatabaseSource(chunk_size=16)
+        store = source.store()
+        expected = store_from_rows(list(source.rows()))
+
+        assert max(sizes[:-1]) == 16
+        for name in ('ids', 'lat', 'lon', 'price', 'bedrooms', 'bathrooms', 'x'):
+            assert np.array_equal(getattr(store, name), getattr(expected, name))
+
+    def test_no_model_instances(self):
+        """Rows are read as tuples; no Property instance is created."""
+        created = []
+
+        def count(sender, **kwargs):
+            created.append(sender)
+
+        post_init.connect(count, sender=Property)
+        try:
+            PropertyMatcher(inventory=DatabaseSource(chunk_size=50)).find_matches(REQUIREMENT)
+        finally:
+            post_init.disconnect(count, sender=Property)
+
+        assert created == []
+
+    def test_scan_limit(self):
+        """scan_limit stops reading after that many rows."""
+        streamed = self.matcher.find_matches(
+            REQUIREMENT, DatabaseSource(chunk_size=7), limit=None, scan_limit=100
+        )
+        expected = self.matcher.find_matches(REQUIREMENT, self.store, limit=None, scan_limit=100)
+
+        assert [m['id'] for m in streamed] == [m['id'] for m in expected]
+
+
+@pytest.mark.django_db
+class TestPrefilteredSource:
+    """Reading only prefiltered rows must not change any result."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory(properties=600, seed=3)
+        self.rng = np.random.default_rng(4)
+
+    def random_requirement(self):
+        requirement = {}
+        if self.rng.random() < 0.8:
+            requirement.update(lat=40.7 + self.rng.normal(0, 0.1), lon=-74.0)
+        if self.rng.random() < 0.8:
+            requirement['minBudget'] = str(self.rng.integers(1000, 8000))
+        if self.rng.random() < 0.8:
+            requirement['maxBedrooms'] = int(self.rng.integers(1, 6))
+        if self.rng.random() < 0.5:
+            requirement['minBathrooms'] = int(self.rng.integers(1, 6))
+        return requirement
+
+    @pytest.mark.parametrize('min_match', [0.0, 30.0, 40.0, 70.0, 95.0])
+    def test_matches_full_scan(self, min_match):
+        """Same matches as streaming the whole table, for any weights."""
+        for trial in range(6):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            matcher = PropertyMatcher(weights, MatchThresholds(min_match_percentage=min_match))
+            compiled = matcher.compile(self.random_requirement())
+            source = PrefilteredSource(compiled, weights, chunk_size=50, max_fraction=1.0)
+
+            prefiltered = matcher.find_matches(compiled, source, limit=None)
+            full = matcher.find_matches(compiled, DatabaseSource(chunk_size=50), limit=None)
+
+            assert [(m['id'], m['match']) for m in prefiltered] == \
+                [(m['id'], m['match']) for m in full]
+
+    def test_reads_fewer_rows(self):
+        """A selective requirement only reads candidate rows."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=70.0))
+        compiled = matcher.compile(REQUIREMENT)
+        source = PrefilteredSource(compiled, matcher.weights)
+
+        assert source.is_selective()
+        assert 0 < len(list(source.rows())) < Property.objects.count() / 4
+        assert find_database_matches(REQUIREMENT, matcher=matcher) == \
+            matcher.find_matches(REQUIREMENT, active_property_store())
+
+    def test_inverted_ranges(self):
+        """A minimum above the maximum still reads every row that can score."""
+        # Only rows inside the budget support can reach the threshold
+        matcher = PropertyMatcher(MatchWeights(0.1, 0.7, 0.1, 0.1),
+                                  MatchThresholds(min_match_percentage=60.0))
+        requirement = dict(REQUIREMENT, minBudget='7000', maxBudget='3000')
+
+        expected = matcher.find_matches(requirement, active_property_store(), limit=None)
+        assert expected
+        assert find_database_matches(requirement, limit=None, matcher=matcher) == expected
+
+    def test_table_is_not_counted_per_search(self, django_assert_num_queries):
+        """Only the filtered rows are counted, up to the cap, once the size is known."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=70.0))
+        compiled = matcher.compile(REQUIREMENT)
+        PrefilteredSource(compiled, matcher.weights).is_selective()
+
+        with django_assert_num_queries(1) as queries:
+            assert PrefilteredSource(compiled, matcher.weights).is_selective()
+        assert 'LIMIT' in queries.captured_queries[0]['sql']
+
+    def test_falls_back_to_full_scan(self):
+        """Without a useful condition every row is read."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=0.0))
+        source = PrefilteredSource(matcher.compile(REQUIREMENT), matcher.weights)
+
+        assert prefilter(matcher.compile(REQUIREMENT), matcher.weights) is None
+        assert not source.is_selective()
+        assert len(list(source.rows())) == Property.objects.filter(is_active=True).count()
+
+
+@pytest.mark.django_db
+class TestConfiguredInventory:
+    """INVENTORY_SOURCE selects the inventory, loaded on first access and after changes."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+        reset_inventory()
+
+    def teardown_method(self):
+        reset_inventory()
+
+    def test_database_is_loaded_once(self, settings, django_assert_num_queries):
+        """The first access reads the table; later ones reuse the store."""
+        settings.INVENTORY_SOURCE = 'database'
+
+        inventory = get_inventory()
+        # The generation check is answered by the cache
+        with django_assert_num_queries(0):
+            assert get_inventory() is inventory
+        np.testing.assert_array_equal(inventory.ids, active_property_store().ids)
+
+    def test_snapshot(self, settings, tmp_path):
+        """The snapshot source maps the file written by build_snapshot."""
+        settings.INVENTORY_SOURCE = 'snapshot'
+        settings.INVENTORY_SNAPSHOT_PATH = str(tmp_path / 'inventory.snapshot')
+        call_command('build_snapshot', settings.INVENTORY_SNAPSHOT_PATH, stdout=StringIO())
+
+        assert find_inventory_matches(REQUIREMENT) == \
+            PropertyMatcher().find_matches(REQUIREMENT, active_property_store())
+        assert isinstance(get_inventory().price.base, np.memmap)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_inventory_changed_reloads(self, settings):
+        """A bulk load is read in the background, serving the old store until it is in."""
+        settings.INVENTORY_SOURCE = 'database'
+        before = get_inventory()
+
+        with transaction.atomic():
+            Property.objects.filter(id__in=Property.objects.order_by('id')[:5]).delete()
+            inventory_changed.send(sender=Property)
+
+        assert get_inventory() is before
+        assert len(reloaded_inventory()) == len(before) - 5
+
+    @pytest.mark.django_db(transaction=True)
+    def test_failed_reload_keeps_the_inventory(self, settings, monkeypatch):
+        """A reload that fails leaves the old store in use and is tried again."""
+        settings.INVENTORY_SOURCE = 'database'
+        before = get_inventory()
+        load = inventory.load_inventory
+        monkeypatch.setattr(inventory, 'load_inventory', lambda source: 1 / 0)
+        bump_generation()
+
+        assert reloaded_inventory() is before
+        monkeypatch.setattr(inventory, 'load_inventory', load)
+        assert reloaded_inventory() is not before
+
+    def test_unknown_source(self, settings):
+        """A misspelled source is a configuration error."""
+        settings.INVENTORY_SOURCE = 'mongo'
+
+        with pytest.raises(ImproperlyConfigured):
+            get_inventory()
+
+
+def test_startup_does_not_load_matching_data():
+    """Loading the app and its views imports neither the mock data nor an inventory."""
+    code = (
+        'import sys, django; django.setup(); '
+        'import apiservices.urls, apiservices.core.utils; '
+        'from apiservices.core import inventory; '
+        'assert "apiservices.core.RealState.MOCK_DATA" not in sys.modules; '
+        'assert inventory._inventory is None'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True, env={
+        **os.environ, 'DJANGO_SETTINGS_MODULE': 'apiservices.settings',
+        'SECRET_KEY': 'test-secret-key',
+    })
@@ -0,0 +1,109 @@
+"""
+Tests for the load_properties management command.
+"""
+import json
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from apiservices.core.models import Property
+from apiservices.core.RealState import MOCK_DATA
+from apiservices.core.signals import inventory_changed
+
+
+def load(path, *args):
+    out, err = StringIO(), StringIO()
+    call_command('load_properties', str(path), *args, stdout=out, stderr=err)
+    return out.getvalue(), err.getvalue()
+
+
+@pytest.mark.django_db
+class TestLoadProperties:
+    """Feeds are validated, written in batches and upserted by external id."""
+
+    def test_mock_data_jsonl(self, tmp_path):
+        """The MOCK_DATA shape loads as is, using its id as the external id."""
+        path = tmp_path / 'feed.jsonl'
+        path.write_text('\n'.join(json.dumps(row) for row in MOCK_DATA.DATA[:120]))
+
+        out, err = load(path, '--external-id-field', 'id', '--batch-size', '50')
+
+        assert Property.objects.count() == 120
+        listing = Property.objects.get(external_id=str(MOCK_DATA.DATA[0]['id']))
+        assert listing.price == Decimal(MOCK_DATA.DATA[0]['price'])
+        assert listing.bedrooms == MOCK_DATA.DATA[0]['bedrooms']
+        assert 'rows/s' in out and err == ''
+
+    def test_invalid_rows_are_skipped(self, tmp_path):
+        """Rows outside the model's validator ranges are reported, the rest are loaded."""
+        path = tmp_path / 'feed.csv'
+        path.write_text(
+            'external_id,latitude,longitude,price,bedrooms,bathrooms\n'
+            'a,40.7,-74.0,5000.00,2,1\n'
+            'b,40.7,-74.0,5000.00,0,1\n'      # below MinValueValidator(1)
+            'c,40.7,-74.0,-1,2,1\n'           # negative price
+            'd,north,-74.0,5000.00,2,1\n'     # unparseable
+            'e,40.7,-74.0,5000.00,2.5,1\n'    # fractional rooms
+            ',40.7123456789,-74.0,5000.00,21,1\n'   # above MaxValueValidator(20)
+            ',40.7123456789,-74.0,4000.00,20,1\n'
+        )
+
+        out, err = load(path)
+
+        assert sorted(Property.objects.values_list('external_id', flat=True),
+                      key=str) == [None, 'a']
+        assert Property.objects.get(external_id=None).latitude == Decimal('40.71234568')
+        assert 'Loaded 2 of 7 rows' in out
+        assert err.count('invalid property') == 5
+
+    def test_upsert_by_external_id(self, tmp_path):
+        """Reloading a feed updates rows in place, and the last duplicate wins."""
+        path = tmp_path / 'feed.csv'
+        path.write_text('external_id,lat,lon,price,bedrooms,bathrooms\n'
+                        'a,40.7,-74.0,5000,2,1\nb,40.8,-74.1,6000,3,2\n')
+        load(path)
+        first_id = Property.objects.get(external_id='a').id
+
+        path.write_text('external_id,lat,lon,price,bedrooms,bathrooms\n'
+                        'a,40.7,-74.0,5500,2,1\na,40.7,-74.0,5600,2,1\nc,41.0,-73.0,7000,1,1\n')
+        load(path)
+
+        assert Property.objects.count() == 3
+        assert Property.objects.get(external_id='a').id == first_id
+        assert Property.objects.get(external_id='a').price == Decimal('5600.00')
+
+    def test_inventory_changed_is_sent(self, tmp_path):
+        """Caches derived from the inventory are told about the load."""
+        path = tmp_path / 'feed.csv'
+        path.write_text('lat,lon,price,bedrooms,bathrooms\n40.7,-74.0,5000,2,1\n')
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(sender)
+
+        inventory_changed.connect(receiver)
+        try:
+            load(path)
+        finally:
+            inventory_changed.disconnect(receiver)
+
+        assert received == [Property]
+
+    def test_inventory_changed_per_batch(self, tmp_path):
+        """Each batch names its own rows, so no id list spans the feed."""
+        path = tmp_path / 'feed.csv'
+        path.write_text('lat,lon,price,bedrooms,bathrooms\n' + '40.7,-74.0,5000,2,1\n' * 5)
+        received = []
+
+        def receiver(sender, property_ids=None, **kwargs):
+            received.append(len(property_ids))
+
+        inventory_changed.connect(receiver)
+        try:
+            load(path, '--batch-size', '2')
+        finally:
+            inventory_changed.disconnect(receiver)
+
+        assert received == [2, 2, 1]
@@ -0,0 +1,67 @@
+"""
+Tests for the per-process LRU cache.
+"""
+from apiservices.core import local_cache
+from apiservices.core.local_cache import ENTRY_OVERHEAD, LocalCache
+
+
+class TestLocalCache:
+    """Entries are bounded by bytes and age and dropped on a version change."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cache = LocalCache(max_bytes=3 * (100 + ENTRY_OVERHEAD), timeout=60)
+
+    def test_least_recently_used_is_evicted(self):
+        """Going over the byte budget evicts the entries read longest ago."""
+        for key in 'abc':
+            self.cache.set(key, key.upper(), 100)
+        assert self.cache.get('a') == 'A'
+
+        self.cache.set('d', 'D', 100)
+
+        assert self.cache.get('b') is None
+        assert [self.cache.get(key) for key in 'acd'] == ['A', 'C', 'D']
+        stats = self.cache.stats()
+        assert (stats['evictions'], stats['entries']) == (1, 3)
+        assert stats['bytes'] == 3 * (100 + ENTRY_OVERHEAD)
+
+    def test_sizes_not_counts(self):
+        """One large entry can push out several small ones."""
+        for key in 'abc':
+            self.cache.set(key, key, 100)
+        self.cache.set('big', 'BIG', 250)
+
+        assert self.cache.stats()['entries'] == 2
+        assert self.cache.get('big') == 'BIG'
+
+    def test_oversized_entries_are_not_stored(self):
+        """An entry larger than the whole budget leaves the cache untouched."""
+        self.cache.set('a', 'A', 100)
+        self.cache.set('huge', 'HUGE', 10 ** 6)
+
+        assert self.cache.get('huge') is None
+        assert self.cache.get('a') == 'A'
+
+    def test_expiry(self, monkeypatch):
+        """Entries older than the timeout are misses."""
+        now = [1000.0]
+        monkeypatch.setattr(local_cache.time, 'monotonic', lambda: now[0])
+        self.cache.set('a', 'A', 100)
+        now[0] += 61
+
+        assert self.cache.get('a') is None
+        stats = self.cache.stats()
+        assert (stats['expirations'], stats['misses'], stats['bytes']) == (1, 1, 0)
+
+    def test_version_change_empties(self):
+        """Entries made for another version are dropped."""
+        self.cache.check_version(1)
+        self.cache.set('a', 'A', 100)
+        self.cache.check_version(1)
+        assert self.cache.get('a') == 'A'
+
+        self.cache.check_version(2)
+
+        assert self.cache.get('a') is None
+        assert self.cache.stats()['invalidations'] == 1
@@ -0,0 +1,264 @@
+"""
+Tests for the shared match result cache.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+
+from apiservices.core import match_cache
+from apiservices.core.generation import bump_generation
+from apiservices.core.inventory import current_inventory, reset_inventory
+from apiservices.core.local_cache import LocalCache
+from apiservices.core.match_cache import (
+    cache_key, cached_matches, encode_matches, rescoring_matcher
+)
+from apiservices.core.matching import active_property_store
+from apiservices.core.models import Property
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from apiservices.core.shared_cache import SharedCache
+from tests.helpers import REQUIREMENT, create_inventory, reloaded_inventory
+
+
+@pytest.fixture
+def stats(monkeypatch, settings):
+    """Counters of the match cache, starting at zero."""
+    settings.INVENTORY_SOURCE = 'database'
+    settings.MATCH_CACHE_TIMEOUT = 60
+    reset_inventory()
+    counters = match_cache.CacheStats()
+    monkeypatch.setattr(match_cache, 'stats', counters)
+    monkeypatch.setattr(match_cache, 'local_results', LocalCache(2 ** 20, 60))
+    monkeypatch.setattr(match_cache, 'local_requirements', LocalCache(2 ** 20))
+    monkeypatch.setattr(match_cache, 'score_vectors', LocalCache(2 ** 20))
+    yield counters
+    reset_inventory()
+
+
+@pytest.mark.django_db
+class TestMatchCache:
+    """Repeated searches are answered from the cache until the inventory changes."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+
+    def test_repeat_is_a_hit(self, stats):
+        """A repeated search returns the same results from the cache."""
+        first = cached_matches(REQUIREMENT)
+        second = cached_matches(REQUIREMENT)
+
+        assert second == first == \
+            PropertyMatcher().find_matches(REQUIREMENT, active_property_store())
+        assert (stats.hits, stats.misses) == (1, 1)
+
+    def test_normalized_requirement(self, stats):
+        """Requirements that differ only in how values are written share an entry."""
+        cached_matches(REQUIREMENT)
+        cached_matches({**REQUIREMENT, 'minBudget': 3000.0, 'maxBudget': '5000.00',
+                        'maxBedrooms': '3', 'name': 'ignored'})
+
+        assert (stats.hits, stats.misses) == (1, 1)
+
+    def test_settings_are_part_of_the_key(self, stats):
+        """Other weights, thresholds or limits are separate entries."""
+        cached_matches(REQUIREMENT)
+        cached_matches(REQUIREMENT, limit=5)
+        cached_matches(REQUIREMENT, matcher=PropertyMatcher(MatchWeights(0.4, 0.2, 0.2, 0.2)))
+        cached_matches(REQUIREMENT, matcher=PropertyMatcher(
+            thresholds=MatchThresholds(min_match_percentage=60.0)
+        ))
+
+        assert (stats.hits, stats.misses) == (0, 4)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_new_generation_misses(self, stats):
+        """A change to the inventory is never served from an older entry."""
+        best = cached_matches(REQUIREMENT)[0]
+        Property.objects.filter(id=best['id']).update(price=Decimal('99999.00'))
+        bump_generation()
+        reloaded_inventory()
+
+        assert cached_matches(REQUIREMENT) == \
+            PropertyMatcher().find_matches(REQUIREMENT, active_property_store())
+        assert (stats.hits, stats.misses) == (0, 2)
+
+    def test_compact_entries(self, stats):
+        """Entries hold 18 bytes a match and decode to the exact scores."""
+        matches = cached_matches(REQUIREMENT, limit=None)
+
+        assert len(encode_matches(matches)) == 1 + 18 * len(matches)
+        assert cached_matches(REQUIREMENT, limit=None) == matches
+
+    def test_disabled(self, stats, settings):
+        """A timeout of 0 turns the cache off."""
+        settings.MATCH_CACHE_TIMEOUT = 0
+        cached_matches(REQUIREMENT)
+        cached_matches(REQUIREMENT)
+
+        assert (stats.hits, stats.misses) == (0, 0)
+        settings.MATCH_CACHE_TIMEOUT = 60
+        cached_matches(REQUIREMENT)
+        assert (stats.hits, stats.misses) == (0, 1)
+
+    def test_cache_unavailable(self, stats, settings, monkeypatch):
+        """Without a reachable shared cache searches are computed and kept locally."""
+        settings.CACHES = {**settings.CACHES, 'unreachable': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+        }}
+        unreachable = SharedCache('unreachable')
+        monkeypatch.setattr(match_cache, 'shared_cache', unreachable)
+
+        assert cached_matches(REQUIREMENT) == cached_matches(REQUIREMENT)
+        assert (stats.hits, stats.misses) == (1, 1)
+        assert not unreachable.available
+
+
+@pytest.mark.django_db
+class TestLocalTier:
+    """Hot searches are answered from the worker's memory."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+
+    def test_no_round_trip(self, stats, monkeypatch):
+        """A repeated search makes no call to the shared cache."""
+        cached_matches(REQUIREMENT)
+        calls = []
+        monkeypatch.setattr(SharedCache, '_call', lambda self, *args, **kwargs: calls.append(args))
+
+        cached_matches(REQUIREMENT)
+
+        assert calls == []
+        assert match_cache.local_results.stats()['hits'] == 1
+
+    def test_filled_from_shared_cache(self, stats):
+        """A worker without the entry takes it from the shared cache once."""
+        cached_matches(REQUIREMENT)
+        match_cache.local_results.clear()
+
+        cached_matches(REQUIREMENT)
+        cached_matches(REQUIREMENT)
+
+        assert (stats.hits, stats.misses) == (2, 1)
+        assert match_cache.local_results.stats()['hits'] == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_new_generation_empties(self, stats):
+        """Local entries go once the inventory version changes."""
+        cached_matches(REQUIREMENT)
+        bump_generation()
+        reloaded_inventory()
+        cached_matches(REQUIREMENT)
+
+        local = match_cache.local_results.stats()
+        assert (local['invalidations'], local['entries']) == (1, 1)
+        assert (stats.hits, stats.misses) == (0, 2)
+
+    def test_compiled_requirements_are_reused(self, stats):
+        """Equal requirements are compiled once, whatever the limit."""
+        cached_matches(REQUIREMENT, limit=5)
+        cached_matches({**REQUIREMENT, 'minBudget': 3000.0}, limit=20)
+
+        assert match_cache.local_requirements.stats()['hits'] == 1
+
+    def test_reranking_reuses_vectors(self, stats):
+        """A search under other weights re-ranks the vectors of the first one."""
+        weights = MatchWeights(0.1, 0.5, 0.2, 0.2)
+        cached_matches(REQUIREMENT, matcher=rescoring_matcher())
+        matches = cached_matches(REQUIREMENT, matcher=rescoring_matcher(weights))
+
+        assert matches == PropertyMatcher(weights).find_matches(
+            REQUIREMENT, active_property_store())
+        vectors = match_cache.score_vectors.stats()
+        assert (vectors['entries'], vectors['hits']) == (1, 1)
+        assert (stats.hits, stats.misses) == (0, 2)
+
+    def test_plain_searches_keep_no_vectors(self, stats):
+        """Searches that never re-rank leave the vector cache alone."""
+        cached_matches(REQUIREMENT)
+
+        assert match_cache.score_vectors.stats()['entries'] == 0
+
+    def test_stats_endpoint(self, stats, client):
+        """The counters of every tier are served as JSON."""
+        cached_matches(REQUIREMENT)
+        cached_matches(REQUIREMENT)
+
+        body = client.get('/match-cache/stats/').json()
+        assert body['matches']['hits'] == 1
+        assert body['local_results']['entries'] == 1
+
+
+class SlowMatcher(PropertyMatcher):
+    """Matcher whose searches take a while, counting how many run."""
+
+    def __init__(self):
+        super().__init__()
+        self.searches = 0
+
+    def find_matches(self, *args, **kwargs):
+        self.searches += 1
+        time.sleep(0.2)
+        return super().find_matches(*args, **kwargs)
+
+
+class TestCoalescing:
+    """Identical searches that miss together are computed once."""
+
+    @pytest.fixture(autouse=True)
+    def mock_inventory(self, stats, settings):
+        """The bundled inventory, which needs no database connection per thread."""
+        settings.INVENTORY_SOURCE = 'mock'
+        self.stats = stats
+        self.matcher = SlowMatcher()
+        self.requirement = {'lat': 18.37, 'lon': 121.51, 'minBudget': '8000',
+                            'maxBudget': '9000', 'minBedrooms': 1, 'maxBedrooms': 2}
+
+    def search(self):
+        return cached_matches(self.requirement, matcher=self.matcher)
+
+    def test_threads_share_one_search(self):
+        """Concurrent threads of a worker wait for the search in flight."""
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: self.search(), range(8)))
+
+        assert self.matcher.searches == 1
+        assert all(result == results[0] for result in results)
+        assert results[0] is not results[1]
+        assert (self.stats.misses, self.stats.coalesced) == (1, 7)
+
+    def test_waits_for_another_worker(self, settings):
+        """A search locked by another worker is taken from the cache once stored."""
+        settings.MATCH_LOCK_TIMEOUT = 5
+        expected = PropertyMatcher().find_matches(self.requirement, limit=10)
+        key = cache_key(self.requirement, self.matcher, 10, current_inventory())
+        cache.add(match_cache.LOCK_PREFIX + key, 'other worker')
+        threading.Timer(0.1, cache.set, (key, encode_matches(expected))).start()
+
+        assert self.search() == expected
+        assert self.matcher.searches == 0
+        assert self.stats.coalesced == 1
+
+    def test_lock_timeout(self, settings):
+        """A worker whose lock holder never stores a result computes it itself."""
+        settings.MATCH_LOCK_TIMEOUT = 0.1
+        key = cache_key(self.requirement, self.matcher, 10, current_inventory())
+        cache.add(match_cache.LOCK_PREFIX + key, 'other worker')
+
+        assert self.search() == PropertyMatcher().find_matches(self.requirement, limit=10)
+        assert self.matcher.searches == 1
+
+    def test_lock_is_released(self, settings):
+        """The worker holding the lock drops it once the result is stored."""
+        settings.MATCH_LOCK_TIMEOUT = 5
+        self.search()
+
+        key = cache_key(self.requirement, self.matcher, 10, current_inventory())
+        assert cache.get(match_cache.LOCK_PREFIX + key) is None
+        assert cache.get(key) is not None
@@ -0,0 +1,98 @@
+"""
+Tests for the keyset-paginated match listing endpoint.
+"""
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apiservices.core.models import Property, PropertyMatch, PropertyRequirement
+from tests.helpers import create_inventory
+
+
+@pytest.mark.django_db
+class TestRequirementMatches:
+    """Pages follow the stored order and cost the same at any depth."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+        call_command('match_all', stdout=StringIO())
+        counts = {}
+        for requirement_id in PropertyMatch.objects.values_list('requirement_id', flat=True):
+            counts[requirement_id] = counts.get(requirement_id, 0) + 1
+        self.requirement_id = max(counts, key=counts.get)
+        self.url = reverse('requirement_matches', args=[self.requirement_id])
+
+    def test_pages_cover_every_match_in_order(self, client):
+        """Following next cursors lists each match once, best first, ties by property id."""
+        listed, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+            body = client.get(self.url, params).json()
+            listed += [(result['id'], result['match']) for result in body['results']]
+            pages += 1
+            cursor = body['next']
+            if cursor is None:
+                break
+
+        stored = sorted(
+            PropertyMatch.objects.filter(requirement_id=self.requirement_id)
+            .values_list('match_bp', 'property_id'),
+            key=lambda row: (-row[0], row[1]),
+        )
+        assert listed == [(property_id, match_bp / 100) for match_bp, property_id in stored]
+        assert pages == -(-len(stored) // 7)
+
+    def test_results_carry_property_fields(self, client):
+        """Each result has the listing's hot fields and its component scores."""
+        result = client.get(self.url, {'limit': 1}).json()['results'][0]
+        listing = Property.objects.get(id=result['id'])
+        match = PropertyMatch.objects.get(property=listing, requirement_id=self.requirement_id)
+
+        assert result['price'] == float(listing.price)
+        assert result['lat'] == float(listing.latitude)
+        assert result['bedrooms'] == listing.bedrooms
+        assert result['budget_score'] == float(match.budget_score)
+
+    def test_deleted_listing_is_skipped(self, client):
+        """A listing deleted after its match was read is left out, not an error."""
+        best, second = client.get(self.url, {'limit': 2}).json()['results']
+        # Deletes the row alone, as a concurrent delete would between the two queries
+        Property.objects.filter(id=best['id'])._raw_delete(connection.alias)
+
+        response = client.get(self.url, {'limit': 2})
+        PropertyMatch.objects.filter(property_id=best['id']).delete()
+
+        assert response.status_code == 200
+        assert [result['id'] for result in response.json()['results']] == [second['id']]
+
+    def test_deep_pages_seek_instead_of_offset(self, client):
+        """The last page runs the same queries as the first, without OFFSET."""
+        first = client.get(self.url, {'limit': 2}).json()
+        cursor = first['next']
+        while True:
+            body = client.get(self.url, {'limit': 2, 'cursor': cursor}).json()
+            if body['next'] is None:
+                break
+            cursor = body['next']
+
+        with CaptureQueriesContext(connection) as first_page:
+            client.get(self.url, {'limit': 2})
+        with CaptureQueriesContext(connection) as last_page:
+            client.get(self.url, {'limit': 2, 'cursor': cursor})
+
+        assert len(first_page) == len(last_page) == 3
+        assert not any('OFFSET' in query['sql'] for query in last_page.captured_queries)
+        assert not any('JOIN' in query['sql'] for query in last_page.captured_queries)
+
+    def test_invalid_requests(self, client):
+        """Bad cursors and limits are rejected; unknown requirements are 404."""
+        assert client.get(self.url, {'cursor': 'not-a-cursor'}).status_code == 400
+        assert client.get(self.url, {'limit': 0}).status_code == 400
+        assert client.get(self.url, {'limit': 'ten'}).status_code == 400
+        missing = PropertyRequirement.objects.order_by('id').last().id + 1
+        assert client.get(reverse('requirement_matches', args=[missing])).status_code == 404
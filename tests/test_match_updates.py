@@ -0,0 +1,251 @@
+"""
+Tests for incremental PropertyMatch maintenance.
+"""
+import threading
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+
+from apiservices.core import match_updates
+from apiservices.core.match_updates import deferred_match_updates
+from apiservices.core.models import Property, PropertyMatch, PropertyRequirement
+from tests.helpers import create_inventory, expected_matches, stored_matches
+
+
+@pytest.fixture
+def flushes(monkeypatch):
+    """Batches passed to each recompute, by kind."""
+    # Rows marked by earlier tests whose transactions were rolled back
+    monkeypatch.setattr(match_updates, '_state', threading.local())
+    calls = {'properties': [], 'requirements': []}
+    update_properties = match_updates.update_property_matches
+    update_requirements = match_updates.update_requirement_matches
+
+    def properties(ids, matcher):
+        calls['properties'].append(ids)
+        return update_properties(ids, matcher)
+
+    def requirements(ids, matcher):
+        calls['requirements'].append(ids)
+        update_requirements(ids, matcher)
+
+    monkeypatch.setattr(match_updates, 'update_property_matches', properties)
+    monkeypatch.setattr(match_updates, 'update_requirement_matches', requirements)
+    return calls
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMatchUpdates:
+    """Stored matches stay equal to a full recompute as rows change."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+        call_command('match_all', stdout=StringIO())
+
+    def test_property_changes(self, flushes):
+        """Repricing, moving and deactivating listings only recompute those listings."""
+        listings = list(Property.objects.order_by('id')[:3])
+        listings[0].price = Decimal('2500.00')
+        listings[0].save()
+        listings[1].latitude += Decimal('0.2')
+        listings[1].save()
+        listings[2].is_active = False
+        listings[2].save()
+
+        assert stored_matches() == expected_matches()
+        assert not PropertyMatch.objects.filter(property=listings[2]).exists()
+        assert flushes['properties'] == [[listing.id] for listing in listings]
+
+    def test_requirement_changes(self, flushes):
+        """Edited, new and deactivated requirements only recompute themselves."""
+        requirement = PropertyRequirement.objects.filter(is_active=True).first()
+        requirement.max_budget = None
+        requirement.min_bedrooms = 5
+        requirement.save()
+        created = PropertyRequirement.objects.create(
+            latitude=Decimal('40.70000000'), longitude=Decimal('-74.00000000'),
+            min_budget=Decimal('3000.00'), max_budget=Decimal('5000.00'),
+        )
+        PropertyRequirement.objects.filter(id=requirement.id).update(is_active=False)
+        requirement.refresh_from_db()
+        requirement.save()
+
+        assert stored_matches() == expected_matches()
+        assert PropertyMatch.objects.filter(requirement=created).exists()
+        assert flushes['requirements'] == [[requirement.id], [created.id], [requirement.id]]
+
+    def test_changes_in_a_transaction_are_coalesced(self, flushes):
+        """Saving many rows in one transaction is one recompute at commit."""
+        listings = list(Property.objects.order_by('id')[:50])
+        requirements = list(PropertyRequirement.objects.order_by('id')[:40])
+        with transaction.atomic():
+            for listing in listings:
+                listing.price += 300
+                listing.save()
+                listing.save()
+            for requirement in requirements:
+                requirement.min_bathrooms = 2
+                requirement.save()
+            assert flushes['properties'] == []
+
+        assert stored_matches() == expected_matches()
+        assert flushes['properties'] == [sorted(listing.id for listing in listings)]
+        # More than PREFILTER_MAX_REQUIREMENTS: scored against one inventory read
+        assert flushes['requirements'] == [sorted(req.id for req in requirements)]
+
+    def test_deferred_block(self, flushes, monkeypatch):
+        """Autocommit saves inside deferred_match_updates flush once, in batches."""
+        monkeypatch.setattr(match_updates, 'FLUSH_BATCH_SIZE', 8)
+        listings = list(Property.objects.order_by('id')[:20])
+        with deferred_match_updates():
+            for listing in listings:
+                listing.bedrooms = 1
+                listing.save()
+
+        assert stored_matches() == expected_matches()
+        assert len(flushes['properties']) == 1
+
+    def test_failed_flush_is_retried(self, flushes, monkeypatch):
+        """A failing recompute doesn't fail the save, and its rows are recomputed later."""
+        update = match_updates.update_property_matches
+        monkeypatch.setattr(match_updates, 'update_property_matches',
+                            lambda ids, matcher: 1 / 0)
+        listings = list(Property.objects.order_by('id')[:3])
+        listings[0].price = Decimal('2500.00')
+        listings[0].save()
+        with deferred_match_updates():
+            listings[1].bedrooms = 1
+            listings[1].save()
+        assert match_updates._dirty().properties == {listings[0].id, listings[1].id}
+
+        monkeypatch.setattr(match_updates, 'update_property_matches', update)
+        listings[2].bathrooms = 1
+        listings[2].save()
+
+        assert stored_matches() == expected_matches()
+        assert flushes['properties'] == [[listing.id for listing in listings]]
+
+    def test_requirement_index_is_kept(self, flushes, monkeypatch):
+        """Property saves reuse one index until a requirement changes."""
+        builds = []
+        build = match_updates.active_requirement_index
+        monkeypatch.setattr(match_updates, 'active_requirement_index',
+                            lambda matcher: builds.append(1) or build(matcher))
+        listings = list(Property.objects.order_by('id')[:3])
+        for listing in listings[:2]:
+            listing.bedrooms = 1
+            listing.save()
+        assert len(builds) == 1
+
+        PropertyRequirement.objects.create(
+            latitude=Decimal('40.70000000'), longitude=Decimal('-74.00000000'),
+            min_budget=Decimal('3000.00'), max_budget=Decimal('5000.00'),
+        )
+        listings[2].bedrooms = 1
+        listings[2].save()
+
+        assert len(builds) == 2
+        assert stored_matches() == expected_matches()
+
+    def test_bulk_load(self, flushes, tmp_path):
+        """Rows written by load_properties are matched one batch at a time."""
+        path = tmp_path / 'feed.csv'
+        path.write_text('lat,lon,price,bedrooms,bathrooms\n'
+                        + '40.71,-74.01,4000,2,1\n' * 30)
+
+        call_command('load_properties', str(path), '--batch-size', '7', stdout=StringIO())
+
+        assert stored_matches() == expected_matches()
+        assert [len(ids) for ids in flushes['properties']] == [7, 7, 7, 7, 2]
+
+
+def best_expected(limit):
+    """expected_matches() cut to the best ``limit`` of each requirement."""
+    by_requirement = {}
+    for property_id, requirement_id, match in expected_matches():
+        by_requirement.setdefault(requirement_id, []).append((-match, property_id))
+    return {
+        (property_id, requirement_id, -negated)
+        for requirement_id, matches in by_requirement.items()
+        for negated, property_id in sorted(matches)[:limit]
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRetention:
+    """With MATCH_RETENTION_LIMIT, each requirement keeps exactly its best matches."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        create_inventory()
+
+    def test_match_all_and_updates(self, settings, flushes):
+        """Full runs and property updates keep the same top N as a recompute."""
+        settings.MATCH_RETENTION_LIMIT = 3
+        call_command('match_all', stdout=StringIO())
+        assert stored_matches() == best_expected(3)
+
+        # Push some listings out of their requirements' top 3, and others in
+        best = PropertyMatch.objects.order_by('-match_bp', 'property_id')[:10]
+        for match in best:
+            listing = match.property
+            listing.latitude += Decimal('1')
+            listing.save()
+        listing = Property.objects.order_by('id').last()
+        listing.bedrooms, listing.bathrooms = 2, 1
+        listing.save()
+
+        assert stored_matches() == best_expected(3)
+        assert flushes['requirements']
+
+
+@pytest.mark.django_db
+def test_scores_read_as_percentages():
+    """Basis point columns read back as two-decimal percentages."""
+    create_inventory(properties=1, requirements=1)
+    match = PropertyMatch(property=Property.objects.get(), match_bp=8250, distance_bp=10000,
+                          budget_bp=5, bedroom_bp=None,
+                          requirement=PropertyRequirement.objects.get())
+
+    assert match.match_percentage == Decimal('82.50')
+    assert match.distance_score == Decimal('100.00')
+    assert match.budget_score == Decimal('0.05')
+    assert match.bedroom_score is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migration_converts_scores():
+    """Existing decimal scores become basis points, and back when reverting."""
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([('core', '0002_property_external_id')])
+    apps = executor.loader.project_state([('core', '0002_property_external_id')]).apps
+    listing = apps.get_model('core', 'Property').objects.create(
+        latitude=40.7, longitude=-74.0, price=5000, bedrooms=2, bathrooms=1)
+    requirement = apps.get_model('core', 'PropertyRequirement').objects.create(
+        latitude=40.7, longitude=-74.0)
+    apps.get_model('core', 'PropertyMatch').objects.create(
+        property_id=listing.id, requirement_id=requirement.id, match_percentage=Decimal('82.57'),
+        distance_score=Decimal('100.00'), budget_score=Decimal('64.35'))
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([('core', '0003_compact_property_match')])
+    match = PropertyMatch.objects.get()
+    assert (match.match_bp, match.distance_bp, match.budget_bp, match.bedroom_bp) == \
+        (8257, 10000, 6435, None)
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([('core', '0002_property_external_id')])
+    apps = executor.loader.project_state([('core', '0002_property_external_id')]).apps
+    reverted = apps.get_model('core', 'PropertyMatch').objects.get()
+    assert reverted.match_percentage == Decimal('82.57')
+    assert reverted.budget_score == Decimal('64.35')
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
@@ -0,0 +1,88 @@
+"""
+Tests for the exact branch-and-bound search.
+"""
+import numpy as np
+import pytest
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from tests.helpers import make_store
+
+
+class TestPrunedSearch:
+    """Pruned searches must return exactly what a full scan returns."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = make_store()
+        self.rng = np.random.default_rng(1)
+
+    def random_requirement(self):
+        row = self.rng.integers(len(self.store))
+        return {
+            'lat': float(self.store.lat[row]) + self.rng.normal(0, 0.05),
+            'lon': float(self.store.lon[row]),
+            'minBudget': str(self.rng.integers(1000, 8000)),
+            'maxBudget': self.rng.choice([None, '9000']),
+            'minBedrooms': int(self.rng.integers(1, 5)),
+            'maxBathrooms': int(self.rng.integers(2, 6)),
+        }
+
+    @pytest.mark.parametrize('limit', [1, 10, None])
+    @pytest.mark.parametrize('min_match', [20.0, 40.0, 75.0])
+    def test_matches_full_scan(self, limit, min_match):
+        """Results are identical for any weights, thresholds and limits."""
+        for trial in range(5):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            matcher = PropertyMatcher(weights, MatchThresholds(min_match_percentage=min_match))
+            requirement = self.random_requirement()
+
+            full = matcher.find_matches(requirement, self.store, limit=limit)
+            pruned = matcher.find_matches(requirement, self.store, limit=limit, prune=True)
+
+            assert [(m['id'], m['match']) for m in pruned] == \
+                [(m['id'], m['match']) for m in full]
+
+    def inverted_requirement(self):
+        requirement = self.random_requirement()
+        budget = int(self.rng.integers(2000, 9000))
+        requirement.update(minBudget=str(budget), maxBudget=str(budget - 1500),
+                           minBedrooms=5, maxBedrooms=int(self.rng.integers(1, 4)))
+        return requirement
+
+    @pytest.mark.parametrize('min_match', [0.0, 20.0, 40.0])
+    def test_inverted_ranges(self, min_match):
+        """Minimums above maximums score in two pieces, and the bounds cover both."""
+        for trial in range(8):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            matcher = PropertyMatcher(weights, MatchThresholds(min_match_percentage=min_match))
+            compiled = matcher.compile(self.inverted_requirement())
+
+            full = matcher.find_matches(compiled, self.store, limit=10)
+            pruned = matcher.find_matches(compiled, self.store, limit=10, prune=True)
+
+            assert [(m['id'], m['match']) for m in pruned] == \
+                [(m['id'], m['match']) for m in full]
+
+    def test_antimeridian(self):
+        """Listings across the antimeridian are not pruned away."""
+        matcher = PropertyMatcher()
+        requirement = {'lat': 65.0, 'lon': 180.0, 'minBudget': '1000', 'maxBudget': '10000'}
+
+        full = matcher.find_matches(requirement, self.store, limit=50)
+        pruned = matcher.find_matches(requirement, self.store, limit=50, prune=True)
+
+        assert [m['id'] for m in pruned] == [m['id'] for m in full]
+        assert {m['lon'] > 0 for m in full} == {True, False}
+
+    def test_bounds_never_underestimate(self):
+        """Every row scores at most its partition's bound."""
+        matcher = PropertyMatcher()
+        index = self.store.partitions()
+
+        for requirement in (self.random_requirement(), self.inverted_requirement()):
+            compiled = matcher.compile(requirement)
+            bounds = index.upper_bounds(compiled, matcher.weights)
+            scores = matcher.score_batch(compiled, self.store).overall
+
+            for partition in range(len(index)):
+                rows = index.rows[index.starts[partition]:index.ends[partition]]
+                assert scores[rows].max() <= bounds[partition] + 1e-9
@@ -4,6 +4,7 @@ Tests for the property matching algorithm.
 import pytest
 from decimal import Decimal
 from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from apiservices.core.RealState.requirement import RangeScore
 
 
 class TestPropertyMatcher:
@@ -241,4 +242,81 @@ class TestPropertyMatcherEdgeCases:
         
         # Should handle gracefully
         assert isinstance(result, dict)
-        assert 'overall_score' in result
\ No newline at end of file
+        assert 'overall_score' in result
+
+class TestCompiledRequirement:
+    """Test cases for PropertyMatcher.compile."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.matcher = PropertyMatcher()
+        self.requirement = {
+            'lat': 18.3721392,
+            'lon': 121.5111211,
+            'maxBudget': '10000',
+            'minBedrooms': '2',
+            'maxBedrooms': '3',
+        }
+        self.property = {
+            'id': 1,
+            'lat': 18.40,
+            'lon': 121.5111211,
+            'price': '10500',
+            'bedrooms': '4',
+            'bathrooms': '2'
+        }
+
+    def test_compiled_requirement_is_immutable(self):
+        """Compiled requirements can be shared safely between queries."""
+        compiled = self.matcher.compile(self.requirement)
+
+        with pytest.raises(AttributeError):
+            compiled.lat = 0.0
+
+    def test_missing_bounds_are_normalized(self):
+        """A single budget bound is used for both ends; missing rooms score 0."""
+        compiled = self.matcher.compile(self.requirement)
+
+        assert compiled.budget.perfect_max == pytest.approx(11000.0)
+        assert compiled.budget.perfect_min == pytest.approx(9000.0)
+        assert compiled.bathrooms is None
+
+    def test_compiled_and_raw_requirements_score_alike(self):
+        """Every scoring path accepts the compiled form."""
+        compiled = self.matcher.compile(self.requirement)
+
+        assert self.matcher.calculate_overall_match(compiled, self.property) == \
+            self.matcher.calculate_overall_match(self.requirement, self.property)
+        assert self.matcher.find_matches(compiled) == \
+            self.matcher.find_matches(self.requirement)
+
+    def test_thresholds_must_match(self):
+        """A requirement compiled for other thresholds is rejected."""
+        other = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=50.0))
+
+        with pytest.raises(ValueError):
+            self.matcher.find_matches(other.compile(self.requirement))
+
+    def test_room_tables_follow_the_range_rules(self):
+        """Table lookups agree with the range arithmetic, inside and outside the table."""
+        thresholds = MatchThresholds(rooms_perfect=1, rooms_max=3)
+        compiled = PropertyMatcher(thresholds=thresholds).compile(
+            {'minBedrooms': '4', 'maxBedrooms': 6}
+        )
+        rooms = compiled.bedrooms
+
+        for count in list(range(-3, 100)) + [10 ** 6]:
+            assert rooms.score(count) == RangeScore.score(rooms, count)
+        assert rooms.table[5] == 100.0
+        assert rooms.table[8] > rooms.table[9] > 0
+        assert rooms.table[10] == 0.0
+
+    def test_scalar_scoring_skips_room_tables(self):
+        """Scoring one property builds no room table."""
+        compiled = self.matcher.compile(self.requirement)
+
+        self.matcher.calculate_overall_match(compiled, {'lat': 40.7, 'lon': -74.0,
+                                                        'price': '4000', 'bedrooms': 2,
+                                                        'bathrooms': 1})
+
+        assert 'table' not in vars(compiled.bedrooms)
@@ -0,0 +1,158 @@
+"""
+Tests for reverse matching through the requirement index.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from apiservices.core.RealState.requirement_index import RequirementIndex
+
+
+def make_requirements(size=3000, seed=0):
+    """Requirements around one city with every kind of missing bound."""
+    rng = np.random.default_rng(seed)
+    requirements = []
+    for i in range(1, size + 1):
+        requirement = {'id': i}
+        if rng.random() < 0.9:
+            requirement['lat'] = 40.7 + rng.normal(0, 0.2)
+            requirement['lon'] = -74.0 + rng.normal(0, 0.2)
+        budget = round(rng.uniform(1000, 9000), 2)
+        kind = rng.integers(0, 4)
+        if kind == 0:
+            requirement.update(minBudget=str(budget), maxBudget=str(round(budget * 1.3, 2)))
+        elif kind == 1:
+            requirement['maxBudget'] = budget
+        elif kind == 2:
+            requirement['minBudget'] = str(budget)
+        if rng.random() < 0.8:
+            requirement['minBedrooms'] = int(rng.integers(1, 5))
+            requirement['maxBedrooms'] = requirement['minBedrooms'] + int(rng.integers(0, 3))
+        if rng.random() < 0.5:
+            requirement['maxBathrooms'] = int(rng.integers(1, 6))
+        requirements.append(requirement)
+    # Ranges the posting lists and budget buckets don't cover
+    requirements.append({'id': size + 1, 'minBudget': '1', 'maxBudget': '900000',
+                         'minBedrooms': 60, 'maxBedrooms': 70})
+    return requirements
+
+
+def scan(matcher, requirements, property_data):
+    """Brute-force reverse match with the scalar scorer."""
+    matches = []
+    for requirement in requirements:
+        score = matcher.calculate_overall_match(requirement, property_data)
+        if score['overall_score'] >= matcher.thresholds.min_match_percentage:
+            matches.append((requirement['id'], score['overall_score']))
+    return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+
+class TestRequirementIndex:
+    """match_property must return exactly what a scan over requirements returns."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.requirements = make_requirements()
+        self.rng = np.random.default_rng(1)
+
+    def random_property(self):
+        return {
+            'id': 1,
+            'lat': 40.7 + self.rng.normal(0, 0.2),
+            'lon': -74.0 + self.rng.normal(0, 0.2),
+            'price': str(round(self.rng.uniform(800, 12000), 2)),
+            'bedrooms': int(self.rng.integers(1, 8)),
+            'bathrooms': int(self.rng.integers(1, 8)),
+        }
+
+    @pytest.mark.parametrize('min_match', [0.0, 40.0, 60.0])
+    def test_matches_scan(self, min_match):
+        """Same requirements and scores for any weights and thresholds."""
+        for trial in range(3):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            matcher = PropertyMatcher(weights, MatchThresholds(min_match_percentage=min_match))
+            index = RequirementIndex.from_records(self.requirements, matcher)
+            property_data = self.random_property()
+
+            matches = index.match_property(property_data)
+
+            assert [(m['id'], m['match']) for m in matches] == \
+                scan(matcher, self.requirements, property_data)
+
+    def test_unusual_properties(self):
+        """Far away, unparseable and oversized listings are handled like the scan does."""
+        matcher = PropertyMatcher()
+        index = RequirementIndex.from_records(self.requirements, matcher)
+
+        for property_data in [
+            {'id': 1, 'lat': -33.9, 'lon': 151.2, 'price': '5000', 'bedrooms': 3, 'bathrooms': 2},
+            {'id': 2, 'lat': 'n/a', 'lon': None, 'price': '5000', 'bedrooms': 3, 'bathrooms': 2},
+            {'id': 3, 'lat': 40.7, 'lon': -74.0, 'price': '750000', 'bedrooms': 66,
+             'bathrooms': 'two'},
+        ]:
+            assert [(m['id'], m['match']) for m in index.match_property(property_data)] == \
+                scan(matcher, self.requirements, property_data)
+
+    def test_inverted_ranges(self):
+        """Minimums above maximums (never validated on save) are indexed and scored as scanned."""
+        requirements = [
+            {'id': 1, 'lat': 40.7, 'lon': -74.0, 'minBudget': '9000', 'maxBudget': '2000'},
+            {'id': 2, 'minBudget': '6000', 'maxBudget': '5500', 'minBedrooms': 5,
+             'maxBedrooms': 2},
+            {'id': 3, 'lat': 40.7, 'lon': -74.0, 'minBathrooms': 4, 'maxBathrooms': 1},
+        ]
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=10.0))
+        index = RequirementIndex.from_records(requirements, matcher)
+
+        for price in ('2300', '5000', '5800', '8700'):
+            for rooms in (1, 3, 5):
+                property_data = {'id': 1, 'lat': 40.7, 'lon': -74.0, 'price': price,
+                                 'bedrooms': rooms, 'bathrooms': rooms}
+                assert [(m['id'], m['match']) for m in index.match_property(property_data)] == \
+                    scan(matcher, requirements, property_data)
+
+    def test_component_scores(self):
+        """Each match carries the same component scores as calculate_overall_match."""
+        matcher = PropertyMatcher()
+        index = RequirementIndex.from_records(self.requirements, matcher)
+        property_data = self.random_property()
+        by_id = {requirement['id']: requirement for requirement in self.requirements}
+
+        matches = index.match_property(property_data)
+
+        assert matches
+        for match in matches[:50]:
+            score = matcher.calculate_overall_match(by_id[match['id']], property_data)
+            assert match['distance_score'] == score['distance_score']
+            assert match['budget_score'] == score['budget_score']
+            assert match['bedroom_score'] == score['bedroom_score']
+            assert match['bathroom_score'] == score['bathroom_score']
+
+
+@pytest.mark.django_db
+class TestActiveRequirementIndex:
+    """The index is built from active PropertyRequirement rows."""
+
+    def test_inactive_requirements_are_skipped(self):
+        """Only active requirements are matched, with Decimal fields converted."""
+        from apiservices.core.matching import active_requirement_index
+        from apiservices.core.models import PropertyRequirement
+
+        active = PropertyRequirement.objects.create(
+            latitude=Decimal('40.71280000'), longitude=Decimal('-74.00600000'),
+            min_budget=Decimal('4000.00'), max_budget=Decimal('6000.00'),
+            min_bedrooms=2, max_bedrooms=3,
+        )
+        PropertyRequirement.objects.create(
+            latitude=Decimal('40.71280000'), longitude=Decimal('-74.00600000'),
+            max_budget=Decimal('5000.00'), is_active=False,
+        )
+
+        matches = active_requirement_index().match_property(
+            {'id': 1, 'lat': 40.7128, 'lon': -74.006, 'price': 5000, 'bedrooms': 2,
+             'bathrooms': 1}
+        )
+
+        assert [match['id'] for match in matches] == [active.id]
+        assert matches[0]['match'] == 80.0
@@ -0,0 +1,121 @@
+"""
+Tests for re-ranking from cached component score vectors.
+"""
+import numpy as np
+import pytest
+from apiservices.core.local_cache import LocalCache
+from apiservices.core.RealState import rescoring
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from apiservices.core.RealState.rescoring import ComponentVectors, vector_key
+from tests.helpers import make_store
+
+
+class TestRescoring:
+    """Scores from component vectors must be exactly those of a fresh scan."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = make_store(size=5000)
+        self.cache = LocalCache(2 ** 26)
+        self.rng = np.random.default_rng(5)
+
+    def random_requirement(self):
+        row = self.rng.integers(len(self.store))
+        return {
+            'lat': float(self.store.lat[row]) + self.rng.normal(0, 0.05),
+            'lon': float(self.store.lon[row]),
+            'minBudget': str(self.rng.integers(1000, 8000)),
+            'maxBudget': self.rng.choice([None, '9000']),
+            'minBedrooms': int(self.rng.integers(1, 5)),
+            'maxBathrooms': int(self.rng.integers(2, 6)),
+        }
+
+    def random_matchers(self, count):
+        for trial in range(count):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            thresholds = MatchThresholds(
+                min_match_percentage=float(self.rng.choice([0.0, 20.0, 40.0, 75.0])),
+                max_match_percentage=float(self.rng.choice([60.0, 80.0, 100.0])),
+            )
+            yield weights, thresholds
+
+    @pytest.mark.parametrize('limit', [1, 10, None])
+    def test_matches_full_scan(self, limit):
+        """Re-rankings under any weights and percentages equal a fresh search."""
+        requirement = self.random_requirement()
+        for weights, thresholds in self.random_matchers(6):
+            cached = PropertyMatcher(weights, thresholds, vector_cache=self.cache)
+
+            assert cached.find_matches(requirement, self.store, limit=limit) == \
+                PropertyMatcher(weights, thresholds).find_matches(
+                    requirement, self.store, limit=limit)
+
+    def test_component_scores_are_identical(self):
+        """Every component and the weighted sum match score_batch bit for bit."""
+        for weights, thresholds in self.random_matchers(4):
+            matcher = PropertyMatcher(weights, thresholds)
+            compiled = matcher.compile(self.random_requirement())
+            expected = matcher.score_batch(compiled, self.store)
+            scores = ComponentVectors.build(self.store, compiled).scores(weights, thresholds)
+
+            for name in ('distance', 'budget', 'bedrooms', 'bathrooms', 'overall'):
+                assert np.array_equal(getattr(scores, name), getattr(expected, name)), name
+
+    def test_rerank_skips_distances(self, monkeypatch):
+        """New weights or match percentages reuse the vectors of the first search."""
+        calls = []
+        original = rescoring.distances_from_vectors
+        monkeypatch.setattr(rescoring, 'distances_from_vectors',
+                            lambda *args: calls.append(1) or original(*args))
+        requirement = self.random_requirement()
+
+        for weights, thresholds in self.random_matchers(5):
+            PropertyMatcher(weights, thresholds, vector_cache=self.cache) \
+                .find_matches(requirement, self.store)
+
+        stats = self.cache.stats()
+        assert len(calls) == 1
+        assert (stats['entries'], stats['hits'], stats['misses']) == (1, 4, 1)
+
+    def test_least_recent_vectors_are_evicted(self):
+        """The cache holds as many requirements' vectors as its bytes allow."""
+        matcher = PropertyMatcher(vector_cache=self.cache)
+        nbytes = matcher.component_vectors(self.random_requirement(), self.store).nbytes
+        self.cache = LocalCache(3 * nbytes + 1000)
+        matcher = PropertyMatcher(vector_cache=self.cache)
+
+        for _ in range(5):
+            matcher.find_matches(self.random_requirement(), self.store)
+
+        stats = self.cache.stats()
+        assert (stats['entries'], stats['evictions']) == (3, 2)
+
+    def test_store_over_budget_is_scanned(self, monkeypatch):
+        """Vectors too large for the cache are not built just to be dropped."""
+        monkeypatch.setattr(ComponentVectors, 'build', None)
+        self.cache = LocalCache(ComponentVectors.estimate_nbytes(len(self.store)))
+        requirement = self.random_requirement()
+
+        assert PropertyMatcher(vector_cache=self.cache).find_matches(requirement, self.store) == \
+            PropertyMatcher().find_matches(requirement, self.store)
+        assert self.cache.stats()['entries'] == 0
+
+    def test_estimated_size(self):
+        """The estimate the budget is checked against is the size of built vectors."""
+        vectors = PropertyMatcher(vector_cache=self.cache).component_vectors(
+            self.random_requirement(), self.store)
+
+        assert vectors.nbytes == ComponentVectors.estimate_nbytes(len(self.store))
+
+    def test_key_depends_on_store_and_ranges(self):
+        """Other stores, distances or budgets get their own vectors."""
+        matcher = PropertyMatcher()
+        requirement = self.random_requirement()
+        key = vector_key(self.store, matcher.compile(requirement))
+        nearer = PropertyMatcher(thresholds=MatchThresholds(distance_max=5.0))
+        cheaper = dict(requirement, minBudget='500')
+
+        assert vector_key(self.store, matcher.compile(dict(requirement))) == key
+        assert vector_key(make_store(size=5000), matcher.compile(requirement)) != key
+        assert vector_key(self.store, nearer.compile(requirement)) != key
+        assert vector_key(self.store, matcher.compile(cheaper)) != key
@@ -0,0 +1,131 @@
+"""
+Tests for geographically sharded inventories.
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from apiservices.core.RealState.driver import PropertyMatcher, MatchWeights, MatchThresholds
+from apiservices.core.RealState.shards import ShardedInventory
+from tests.helpers import make_store
+
+
+def ranking(matches):
+    return [(m['id'], m['match']) for m in matches]
+
+
+class TestShardedSearch:
+    """Sharded searches must return exactly what a full scan returns."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = make_store(size=8000)
+        self.sharded = ShardedInventory.from_store(self.store, shard_rows=500)
+        self.rng = np.random.default_rng(2)
+
+    def random_requirement(self):
+        row = self.rng.integers(len(self.store))
+        return {
+            'lat': float(self.store.lat[row]) + self.rng.normal(0, 0.05),
+            'lon': float(self.store.lon[row]),
+            'minBudget': str(self.rng.integers(1000, 8000)),
+            'maxBudget': self.rng.choice([None, '9000']),
+            'minBedrooms': int(self.rng.integers(1, 5)),
+            'maxBathrooms': int(self.rng.integers(2, 6)),
+        }
+
+    @pytest.mark.parametrize('limit', [1, 10, None])
+    @pytest.mark.parametrize('min_match', [20.0, 40.0, 75.0])
+    def test_matches_full_scan(self, limit, min_match):
+        """Results are identical for any weights, thresholds and limits."""
+        for trial in range(4):
+            weights = MatchWeights(*self.rng.dirichlet([1, 1, 1, 1])) if trial else MatchWeights()
+            matcher = PropertyMatcher(weights, MatchThresholds(min_match_percentage=min_match))
+            requirement = self.random_requirement()
+
+            assert ranking(matcher.find_matches(requirement, self.sharded, limit=limit)) == \
+                ranking(matcher.find_matches(requirement, self.store, limit=limit))
+
+    def test_inverted_ranges(self):
+        """Shard bounds hold for a minimum budget above the maximum."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=20.0))
+        for budget in (3000, 5000, 8000):
+            requirement = dict(self.random_requirement(), minBudget=str(budget),
+                               maxBudget=str(budget - 1500))
+
+            assert ranking(matcher.find_matches(requirement, self.sharded, limit=10)) == \
+                ranking(matcher.find_matches(requirement, self.store, limit=10))
+
+    def test_ties_keep_inventory_order(self):
+        """Equal scores from different shards come back in inventory order."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=0.0))
+        requirement = {'minBudget': '1000', 'maxBudget': '10000'}
+
+        assert ranking(matcher.find_matches(requirement, self.sharded, limit=30)) == \
+            ranking(matcher.find_matches(requirement, self.store, limit=30))
+
+    def test_shards_are_compact(self):
+        """Every shard covers one of the clusters, not the whole map."""
+        spans = [shard.stats.lat_max - shard.stats.lat_min for shard in self.sharded.shards]
+        assert len(self.sharded) == len(self.store)
+        assert max(spans) < 5.0
+
+    def test_bounds_never_underestimate(self):
+        """Every row scores at most its shard's bound."""
+        matcher = PropertyMatcher()
+        compiled = matcher.compile(self.random_requirement())
+        bounds = self.sharded.upper_bounds(compiled, matcher.weights)
+
+        for bound, shard in zip(bounds, self.sharded.shards):
+            scores = matcher.score_batch(compiled, shard.store).overall
+            assert scores.max() <= bound + 1e-9
+
+    def test_thread_pool(self):
+        """Shards ranked on a thread pool merge to the same results."""
+        matcher = PropertyMatcher()
+        requirement = self.random_requirement()
+        with ThreadPoolExecutor(4) as executor:
+            self.sharded.executor = executor
+            parallel = matcher.find_matches(requirement, self.sharded, limit=20)
+
+        assert ranking(parallel) == ranking(matcher.find_matches(requirement, self.store, limit=20))
+
+
+class TestSavedShards:
+    """A saved sharded inventory is opened without reading its shards."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = make_store(size=4000)
+        self.requirement = {'lat': 40.7, 'lon': -74.0, 'minBudget': '3000', 'maxBudget': '5000'}
+
+    def test_only_needed_shards_are_read(self, tmp_path):
+        """Shards that cannot qualify are never mapped."""
+        ShardedInventory.from_store(self.store, shard_rows=250).save(str(tmp_path), generation=3)
+        opened = ShardedInventory.open(str(tmp_path))
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=60.0))
+
+        assert not any(shard.loaded for shard in opened.shards)
+        assert ranking(matcher.find_matches(self.requirement, opened, limit=10)) == \
+            ranking(matcher.find_matches(self.requirement, self.store, limit=10))
+        assert 0 < sum(shard.loaded for shard in opened.shards) < len(opened.shards)
+
+    def test_process_pool(self, tmp_path):
+        """Worker processes map the shards themselves."""
+        ShardedInventory.from_store(self.store, shard_rows=1000).save(str(tmp_path))
+        matcher = PropertyMatcher()
+
+        with ProcessPoolExecutor(2) as executor:
+            opened = ShardedInventory.open(str(tmp_path), executor=executor)
+            assert ranking(matcher.find_matches(self.requirement, opened, limit=10)) == \
+                ranking(matcher.find_matches(self.requirement, self.store, limit=10))
+        assert len(pickle.dumps(opened.shards[0])) < 1000
+
+    def test_directory_is_not_overwritten(self, tmp_path):
+        """Saving twice to one directory fails instead of replacing open shards."""
+        sharded = ShardedInventory.from_store(self.store)
+        sharded.save(str(tmp_path))
+
+        with pytest.raises(FileExistsError):
+            sharded.save(str(tmp_path))
@@ -0,0 +1,63 @@
+"""
+Tests for coalescing identical concurrent calls.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from apiservices.core.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Overlapping calls for one key run once and share the outcome."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.flights = SingleFlight()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def slow(self, value='result'):
+        self.calls += 1
+        self.release.wait(5)
+        return value
+
+    def run_together(self, function, callers=8):
+        with ThreadPoolExecutor(callers) as executor:
+            futures = [executor.submit(self.flights.do, 'key', function) for _ in range(callers)]
+            while self.flights.in_flight() == 0:
+                time.sleep(0.001)
+            # Give every caller time to join the call before it finishes
+            time.sleep(0.05)
+            self.release.set()
+            return futures
+
+    def test_shared_result(self):
+        """Concurrent callers get the leader's result; only one ran it."""
+        results = [future.result() for future in self.run_together(self.slow)]
+
+        assert self.calls == 1
+        assert sorted(leader for _, leader in results) == [False] * 7 + [True]
+        assert {result for result, _ in results} == {'result'}
+
+    def test_shared_error(self):
+        """Every waiting caller sees the leader's exception."""
+        def failing():
+            self.slow()
+            raise RuntimeError('scan failed')
+
+        for future in self.run_together(failing):
+            with pytest.raises(RuntimeError):
+                future.result()
+        assert self.calls == 1
+
+    def test_sequential_calls_run_again(self):
+        """Nothing is remembered once a call has returned."""
+        self.release.set()
+
+        assert self.flights.do('key', self.slow) == ('result', True)
+        assert self.flights.do('key', lambda: self.slow('again')) == ('again', True)
+        assert self.calls == 2
+        assert self.flights.in_flight() == 0
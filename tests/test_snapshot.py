@@ -0,0 +1,139 @@
+"""
+Tests for memory-mapped inventory snapshots.
+"""
+import os
+from io import StringIO
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from apiservices.core.matching import active_property_store
+from apiservices.core.RealState import MOCK_DATA, snapshot
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.snapshot import load_snapshot, read_header, write_snapshot
+from apiservices.core.RealState.store import PropertyStore
+from tests.helpers import create_inventory
+
+REQUIREMENT = {
+    'lat': 40.7, 'lon': -74.0,
+    'minBudget': '3000', 'maxBudget': '5000',
+    'minBedrooms': 2, 'maxBedrooms': 3,
+}
+
+
+class TestSnapshot:
+    """A loaded snapshot is the same store, backed by the mapped file."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = PropertyStore.from_records(MOCK_DATA.DATA)
+
+    def test_round_trip(self, tmp_path):
+        """Columns, id lookups and matches survive a write and a load."""
+        path = str(tmp_path / 'inventory.snapshot')
+        write_snapshot(self.store, path)
+
+        loaded = load_snapshot(path, verify=True)
+
+        for name in ('ids', 'lat', 'lon', 'price', 'bedrooms', 'bathrooms', 'x', 'y', 'z'):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(self.store, name))
+        property_id = int(self.store.ids[17])
+        assert loaded.row_of(property_id) == 17
+        matcher = PropertyMatcher()
+        assert [(m['id'], m['match']) for m in matcher.find_matches(REQUIREMENT, loaded)] == \
+            [(m['id'], m['match']) for m in matcher.find_matches(REQUIREMENT, self.store)]
+
+    def test_columns_are_read_only_views_of_the_file(self, tmp_path):
+        """Nothing is copied or parsed: columns point into the shared mapping."""
+        path = str(tmp_path / 'inventory.snapshot')
+        write_snapshot(self.store, path)
+
+        loaded = load_snapshot(path)
+
+        assert not loaded.price.flags.writeable
+        assert isinstance(loaded.price.base, np.memmap)
+        assert isinstance(loaded.x.base, np.memmap)
+        with pytest.raises(ValueError):
+            loaded.price[0] = 1.0
+
+    def test_header(self, tmp_path):
+        """The header describes the file without mapping it."""
+        path = str(tmp_path / 'inventory.snapshot')
+        written = write_snapshot(self.store, path)
+
+        header = read_header(path)
+
+        assert header.rows == len(self.store)
+        assert header.columns == written.columns
+        assert header.nbytes == written.nbytes
+        assert all(column.offset % 64 == 0 for column in header.columns.values())
+
+    def test_corruption_is_detected(self, tmp_path):
+        """Damaged headers always fail to load, damaged columns with verify."""
+        path = tmp_path / 'inventory.snapshot'
+        header = write_snapshot(self.store, str(path))
+        data = bytearray(path.read_bytes())
+
+        price = header.columns['price']
+        data[price.offset] ^= 0xFF
+        path.write_bytes(bytes(data))
+        load_snapshot(str(path))
+        with pytest.raises(ValueError, match='corrupt'):
+            load_snapshot(str(path), verify=True)
+
+        data[20] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with pytest.raises(ValueError, match='corrupt header'):
+            load_snapshot(str(path))
+
+        path.write_bytes(bytes(data[:price.offset]))
+        with pytest.raises(ValueError):
+            load_snapshot(str(path))
+
+        path.write_bytes(b'id,lat,lon\n')
+        with pytest.raises(ValueError, match='not a property snapshot'):
+            load_snapshot(str(path))
+
+    def test_empty_store(self, tmp_path):
+        """An empty inventory round-trips too."""
+        path = str(tmp_path / 'inventory.snapshot')
+        write_snapshot(self.store.take(slice(0, 0)), path)
+
+        assert len(load_snapshot(path, verify=True)) == 0
+
+
+@pytest.mark.django_db
+def test_build_snapshot_command(tmp_path):
+    """build_snapshot writes the active properties read from the database."""
+    create_inventory()
+    path = str(tmp_path / 'inventory.snapshot')
+    out = StringIO()
+
+    call_command('build_snapshot', path, stdout=out)
+
+    store = active_property_store()
+    loaded = load_snapshot(path, verify=True)
+    np.testing.assert_array_equal(loaded.ids, store.ids)
+    np.testing.assert_array_equal(loaded.price, store.price)
+    assert f'Wrote {len(store)} properties' in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_build_snapshot_verifies_before_replacing(tmp_path, monkeypatch):
+    """A snapshot failing its read-back never replaces the one workers map."""
+    create_inventory()
+    path = tmp_path / 'inventory.snapshot'
+    call_command('build_snapshot', str(path), stdout=StringIO())
+    before = path.read_bytes()
+
+    def corrupt(snapshot_path, verify=False):
+        raise ValueError(f'{snapshot_path} has a corrupt column')
+
+    monkeypatch.setattr(snapshot, 'map_snapshot', corrupt)
+    with pytest.raises(CommandError):
+        call_command('build_snapshot', str(path), stdout=StringIO())
+
+    assert path.read_bytes() == before
+    assert os.listdir(tmp_path) == ['inventory.snapshot']
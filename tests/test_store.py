@@ -0,0 +1,84 @@
+"""
+Tests for the columnar property store.
+"""
+import pytest
+from django.template.loader import render_to_string
+from apiservices.core.RealState import MOCK_DATA
+from apiservices.core.RealState.driver import PropertyMatcher
+from apiservices.core.RealState.store import PropertyStore
+
+
+class TestPropertyStore:
+    """Test cases for PropertyStore."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.store = PropertyStore.from_records(MOCK_DATA.DATA)
+
+    def test_columns_are_parsed_once(self):
+        """Prices arrive as strings and are stored as floats."""
+        assert len(self.store) == len(MOCK_DATA.DATA)
+        assert self.store.price.dtype.kind == 'f'
+        assert self.store.bedrooms.dtype.kind == 'i'
+        assert self.store.price[0] == float(MOCK_DATA.DATA[0]['price'])
+
+    def test_cold_fields_are_kept_apart(self):
+        """Name and email stay out of the hot columns but survive a round trip."""
+        assert 'name' not in self.store.columns()
+        record = self.store.record(0)
+        assert record['name'] == MOCK_DATA.DATA[0]['name']
+        assert record['email'] == MOCK_DATA.DATA[0]['email']
+        assert record['price'] == float(MOCK_DATA.DATA[0]['price'])
+
+    def test_row_of(self):
+        """The id→row map finds every property and rejects unknown ids."""
+        assert self.store.row_of(MOCK_DATA.DATA[42]['id']) == 42
+        assert self.store.row_of(-1) is None
+
+    def test_nbytes(self):
+        """Memory accounting adds up every column and the id index."""
+        store = self.store
+        rows = len(store)
+        # int64 ids, float64 lat/lon/price/x/y/z, the id order and sorted ids
+        expected = store.ids.nbytes + 6 * 8 * rows + store.bedrooms.nbytes + \
+            store.bathrooms.nbytes + store.id_index()[0].nbytes + store.id_index()[1].nbytes
+
+        assert store.nbytes == expected
+        assert store.nbytes >= (8 + 6 * 8) * rows
+
+    def test_invalid_records_are_rejected(self):
+        """Validation happens at load time, naming the offending row."""
+        records = [
+            {'id': 1, 'lat': 1.0, 'lon': 1.0, 'price': '10', 'bedrooms': 1, 'bathrooms': 1},
+            {'id': 2, 'lat': 1.0, 'lon': 1.0, 'price': 'n/a', 'bedrooms': 1, 'bathrooms': 1},
+        ]
+        with pytest.raises(ValueError, match='row 1'):
+            PropertyStore.from_records(records)
+
+    def test_duplicate_ids_are_rejected(self):
+        """Property ids must be unique."""
+        record = {'id': 1, 'lat': 1.0, 'lon': 1.0, 'price': '10', 'bedrooms': 1, 'bathrooms': 1}
+        with pytest.raises(ValueError, match='unique'):
+            PropertyStore.from_records([record, dict(record)])
+
+    def test_matches_agree_with_record_list(self):
+        """Matching against the store gives the same results as the dicts."""
+        matcher = PropertyMatcher()
+        requirement = {
+            'lat': 18.3721392, 'lon': 121.5111211,
+            'minBudget': '8000', 'maxBudget': '10000',
+            'minBedrooms': '2', 'maxBedrooms': '3',
+        }
+        from_store = matcher.find_matches(requirement, self.store, limit=None)
+        from_list = matcher.find_matches(requirement, MOCK_DATA.DATA, limit=None)
+
+        assert [(m['id'], m['match']) for m in from_store] == \
+            [(m['id'], m['match']) for m in from_list]
+
+    def test_prices_render_with_cents(self):
+        """Float prices from the store show two decimals, like the cold strings did."""
+        record = dict(self.store.record(0), price=7171.2, match=80.0)
+
+        html = render_to_string('loggedin.html', {'properties': [record], 'req_data': {}})
+
+        assert '$ 7171.20<' in html
@@ -0,0 +1,154 @@
+"""
+Tests for the vectorized scoring engine.
+"""
+import numpy as np
+import pytest
+from apiservices.core.RealState import MOCK_DATA
+from apiservices.core.RealState.driver import PropertyMatcher, MatchThresholds
+from apiservices.core.RealState.utils import (
+    distance, distance_from_vectors, distances_from_vectors, unit_vectors
+)
+from apiservices.core.RealState.vectorized import SCORE_TOLERANCE, room_scores, top_k
+
+
+REQUIREMENTS = [
+    {
+        'lat': 18.3721392, 'lon': 121.5111211,
+        'minBudget': '8000', 'maxBudget': '10000',
+        'minBedrooms': '2', 'maxBedrooms': '3',
+        'minBathrooms': '1', 'maxBathrooms': '2',
+    },
+    {
+        'lat': 45.2625083, 'lon': 17.427272,
+        'maxBudget': 6000,
+        'minBedrooms': 4,
+        'minBathrooms': 1, 'maxBathrooms': 6,
+    },
+    {
+        'lat': -7.3, 'lon': 108.2,
+        'minBudget': '1500', 'maxBudget': 'invalid',
+    },
+]
+
+
+class TestVectorizedScoring:
+    """The batch engine must agree with the scalar methods."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.matcher = PropertyMatcher()
+        # Include properties near the first requirement so the distance
+        # interpolation branch is exercised as well.
+        self.properties = MOCK_DATA.DATA + [
+            {'id': 9001, 'lat': 18.45, 'lon': 121.52, 'price': '10500',
+             'bedrooms': 5, 'bathrooms': 3},
+            {'id': 9002, 'lat': 18.37, 'lon': 121.60, 'price': 'n/a',
+             'bedrooms': 'many', 'bathrooms': 2},
+        ]
+
+    @pytest.mark.parametrize('requirement', REQUIREMENTS)
+    def test_components_match_scalar(self, requirement):
+        """Every component agrees with its scalar counterpart."""
+        scores = self.matcher.score_batch(requirement, self.properties)
+
+        for row, property_data in enumerate(self.properties):
+            assert scores.distance[row] == pytest.approx(
+                self.matcher.calculate_distance_match(requirement, property_data),
+                abs=SCORE_TOLERANCE)
+            assert scores.budget[row] == pytest.approx(
+                self.matcher.calculate_budget_match(requirement, property_data),
+                abs=SCORE_TOLERANCE)
+            assert scores.bedrooms[row] == pytest.approx(
+                self.matcher.calculate_bedroom_match(requirement, property_data),
+                abs=SCORE_TOLERANCE)
+            assert scores.bathrooms[row] == pytest.approx(
+                self.matcher.calculate_bathroom_match(requirement, property_data),
+                abs=SCORE_TOLERANCE)
+
+    def test_find_matches_matches_scalar_scan(self):
+        """find_matches returns what a scalar scan and sort would."""
+        matcher = PropertyMatcher(thresholds=MatchThresholds(min_match_percentage=30.0))
+        requirement = REQUIREMENTS[0]
+
+        expected = []
+        for property_data in self.properties:
+            result = matcher.calculate_overall_match(requirement, property_data)
+            if result['overall_score'] >= 30.0:
+                expected.append((property_data['id'], result['overall_score']))
+        expected.sort(key=lambda x: x[1], reverse=True)
+
+        matches = matcher.find_matches(requirement, self.properties, limit=None)
+
+        assert [(m['id'], m['match']) for m in matches] == expected
+
+    def test_limit_selects_best_of_whole_inventory(self):
+        """limit caps the results, not the number of properties scanned."""
+        requirement = REQUIREMENTS[0]
+        everything = self.matcher.find_matches(requirement, self.properties, limit=None)
+
+        best = self.matcher.find_matches(requirement, self.properties, limit=3)
+
+        assert len(everything) > 3
+        assert [m['id'] for m in best] == [m['id'] for m in everything[:3]]
+
+    def test_scan_limit_truncates_inventory(self):
+        """scan_limit keeps the old "first N properties" behaviour available."""
+        requirement = REQUIREMENTS[0]
+        matches = self.matcher.find_matches(
+            requirement, self.properties, limit=None, scan_limit=10
+        )
+
+        assert {m['id'] for m in matches} <= {p['id'] for p in self.properties[:10]}
+
+
+class TestTopK:
+    """Test cases for partial top-k selection."""
+
+    def test_ties_keep_inventory_order(self):
+        """Equal scores are returned in row order, like a stable sort."""
+        scores = np.array([50.0, 90.0, 70.0, 90.0, 70.0, 30.0])
+
+        assert top_k(scores, 3, 40.0).tolist() == [1, 3, 2]
+        assert top_k(scores, None, 40.0).tolist() == [1, 3, 2, 4, 0]
+
+    def test_threshold_applies_before_limit(self):
+        """Rows below the minimum are never returned."""
+        scores = np.array([10.0, 20.0, 45.0])
+
+        assert top_k(scores, 2, 40.0).tolist() == [2]
+
+
+class TestRoomScores:
+    """Room components are gathered from the compiled tables."""
+
+    def test_values_outside_the_table(self):
+        """Unparseable, negative and huge counts score like the scalar path."""
+        matcher = PropertyMatcher()
+        compiled = matcher.compile({'minBathrooms': 2, 'maxBathrooms': 70})
+        values = np.array([np.nan, -1, 0, 1, 2, 63, 64, 72, 73, 10 ** 6])
+
+        expected = [0.0] + [compiled.bathrooms.score(int(v)) for v in values[1:]]
+        assert room_scores(values, compiled.bathrooms).tolist() == expected
+        assert room_scores(values[2:6].astype(np.int16), compiled.bathrooms).tolist() == \
+            expected[2:6]
+
+
+class TestUnitVectors:
+    """Distances from precomputed unit vectors agree with ``distance``."""
+
+    def test_matches_distance(self):
+        """Random pairs, identical points and antipodes give the same miles."""
+        rng = np.random.default_rng(3)
+        lat1, lat2 = rng.uniform(-90, 90, (2, 1000))
+        lon1, lon2 = rng.uniform(-180, 180, (2, 1000))
+        lat1[:2], lon1[:2] = lat2[:2], lon2[:2]
+        lat1[2], lon1[2], lat2[2], lon2[2] = 10.0, 20.0, -10.0, -160.0
+
+        for point in range(len(lat1)):
+            expected = distance(lat1[point], lon1[point], lat2[point], lon2[point])
+            vectors = unit_vectors(lat1[point], lon1[point]) + unit_vectors(lat2[point], lon2[point])
+            assert distance_from_vectors(*vectors) == pytest.approx(expected, abs=1e-6)
+
+        batch = distances_from_vectors(*unit_vectors(lat1[0], lon1[0]), *unit_vectors(lat2, lon2))
+        assert batch[0] == 0.0
+        assert not np.isnan(batch).any()
@@ -0,0 +1,95 @@
+"""
+Tests for the warm_match_cache management command.
+"""
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from apiservices.core import match_cache
+from apiservices.core.inventory import reset_inventory
+from apiservices.core.management.commands import warm_match_cache
+from apiservices.core.matching import REQUIREMENT_FIELDS, requirement_record
+from apiservices.core.models import PropertyRequirement
+from apiservices.core.shared_cache import SharedCache
+from tests.helpers import create_inventory
+
+
+def warm(*args):
+    out = StringIO()
+    call_command('warm_match_cache', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestWarmMatchCache:
+    """Active requirements are searched ahead of traffic."""
+
+    @pytest.fixture(autouse=True)
+    def configured(self, settings, monkeypatch):
+        """The database inventory and fresh counters."""
+        settings.INVENTORY_SOURCE = 'database'
+        settings.MATCH_CACHE_TIMEOUT = 60
+        reset_inventory()
+        self.stats = match_cache.CacheStats()
+        monkeypatch.setattr(match_cache, 'stats', self.stats)
+        create_inventory()
+        yield
+        reset_inventory()
+
+    def records(self):
+        rows = PropertyRequirement.objects.filter(is_active=True).values_list(*REQUIREMENT_FIELDS)
+        return [requirement_record(row) for row in rows]
+
+    def test_searches_become_hits(self):
+        """After warming, every active requirement's search is a cache hit."""
+        output = warm('--batch-size', '8', '--workers', '2')
+
+        match_cache.local_results.clear()
+        for record in self.records():
+            match_cache.cached_matches(record)
+        assert self.stats.hits == len(self.records())
+        assert f'Warmed {len(self.records())} requirements' in output
+        assert 'entries/s' in output
+
+    def test_second_run_computes_nothing(self):
+        """Entries already cached are not computed again."""
+        warm()
+
+        assert f'Warmed 0 requirements ({len(self.records())} already cached)' in warm()
+
+    def test_newest_first(self, monkeypatch):
+        """Requirements are warmed from the most recently created."""
+        batches = []
+        monkeypatch.setattr(warm_match_cache, 'warm_matches',
+                            lambda batch, *args: batches.append(batch) or (len(batch), 0))
+        warm('--batch-size', '5', '--workers', '1')
+
+        ids = [record['id'] for batch in batches for record in batch]
+        assert ids == list(PropertyRequirement.objects.filter(is_active=True)
+                           .order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_time_budget(self):
+        """No batch is started once the budget is spent."""
+        output = warm('--time-budget', '1e-9')
+
+        assert 'Warmed 0 requirements (0 already cached)' in output
+        assert 'stopped at the time budget' in output
+
+    def test_cache_disabled(self, settings):
+        """Warming a disabled cache is an error."""
+        settings.MATCH_CACHE_TIMEOUT = 0
+
+        with pytest.raises(CommandError):
+            warm()
+
+    def test_cache_unreachable(self, settings, monkeypatch):
+        """Warming without a reachable cache is an error."""
+        settings.CACHES = {**settings.CACHES, 'unreachable': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+        }}
+        monkeypatch.setattr(warm_match_cache, 'shared_cache', SharedCache('unreachable'))
+
+        with pytest.raises(CommandError):
+            warm()